@@ -1,14 +1,33 @@
 from flask import Flask, jsonify, request
+from functools import wraps
 from flask_cors import CORS
 from store_manager import StoreManager
+import atexit
+import hashlib
+import json
 import os
 
+import clusters
+import config
 import database
+import image_cache
+import images
+import plans
+import slo_report
+from background import run_in_background, run_periodically
+from garbage_collector import GarbageCollector, SweepInProgress
+from hibernation import Hibernator, WAKING_PAGE, store_id_from_host
+from backups import BackupManager
+from metrics import init_metrics, render_latest
+from tracing import init_tracing
+from structured_logging import configure_logging
 from models import db, bcrypt, User
 from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
 
+configure_logging()
+
 app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///store_factory.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///store_factory.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['JWT_SECRET_KEY'] = 'super-secret-key-change-this-in-production'
 
@@ -21,6 +40,68 @@ jwt = JWTManager(app)
 database.init_db(app, use_seed_data=True)
 
 store_manager = StoreManager()
+garbage_collector = GarbageCollector(store_manager)
+hibernator = Hibernator(store_manager)
+backup_manager = BackupManager(store_manager)
+init_metrics(app, scheduler=store_manager.scheduler)
+init_tracing(app)
+
+def start_background_tasks():
+    """Start work that runs alongside the API (once per serving process)"""
+    images.warn_unpinned()
+    if config.RESUME_INTERRUPTED_ON_STARTUP:
+        run_in_background(app, store_manager.resume_interrupted_stores)
+    run_periodically(app, database.flush_store_events, config.EVENT_FLUSH_INTERVAL_SECONDS)
+    run_periodically(app, slo_report.compact_events, config.EVENT_COMPACTION_INTERVAL_SECONDS)
+    if config.PREPULL_ENABLED:
+        for name, k8s in store_manager.clusters.items():
+            run_in_background(app, image_cache.ensure_prepull_daemonset, k8s, name=f"prepull-{name}")
+    if config.GC_ENABLED:
+        run_periodically(app, garbage_collector.run_periodic_sweep, config.GC_INTERVAL_SECONDS)
+    if config.HIBERNATION_ENABLED:
+        run_periodically(app, hibernator.run_periodic_sweep, config.HIBERNATION_CHECK_INTERVAL_SECONDS)
+    with app.app_context():
+        if config.INGRESS_MODE == "consolidated" or database.get_consolidated_routes():
+            store_manager.router.resync()
+    run_periodically(app, store_manager.router.flush, config.INGRESS_FLUSH_INTERVAL_SECONDS)
+    if backup_manager.is_available():
+        run_periodically(app, backup_manager.run_periodic, config.BACKUP_DISPATCH_INTERVAL_SECONDS)
+    if config.CAPACITY_ADMISSION_ENABLED:
+        run_periodically(app, store_manager.capacity.refresh, config.CAPACITY_REFRESH_SECONDS)
+    if config.STORE_QUOTAS_ENABLED:
+        run_periodically(app, store_manager.refresh_quota_usage, config.QUOTA_USAGE_INTERVAL_SECONDS)
+
+@atexit.register
+def _flush_on_exit():
+    with app.app_context():
+        database.flush_store_events()
+
+@app.before_request
+def activate_hibernated_store():
+    """Store hosts only reach the backend through the activator route of a hibernated store"""
+    store_id = store_id_from_host(request.host)
+    if store_id is None:
+        return None
+    status = hibernator.request_wake(store_id)
+    if status is None:
+        return "Store not found", 404
+    if status == "failed":
+        return "This store is unavailable", 503
+    if status not in ("hibernated", "waking"):
+        # Not hibernated (e.g. ready while ingress switches back): waiting here would never end
+        return "Store is not served here", 502, {"Retry-After": "5", "Cache-Control": "no-store"}
+    return WAKING_PAGE, 503, {"Retry-After": "5", "Content-Type": "text/html; charset=utf-8",
+                              "Cache-Control": "no-store"}
+
+def admin_required(fn):
+    """Restrict a JWT-protected route to the users listed in ADMIN_USERNAMES"""
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        user = database.get_user(int(get_jwt_identity()))
+        if not user or user['username'] not in config.ADMIN_USERNAMES:
+            return jsonify({"error": "Admin access required"}), 403
+        return fn(*args, **kwargs)
+    return wrapper
 
 @app.route('/api/auth/login', methods=['POST'])
 def login():
@@ -40,6 +121,12 @@ def health():
     """Health check"""
     return jsonify({"status": "healthy"})
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus scrape endpoint"""
+    body, content_type = render_latest(store_manager.scheduler)
+    return app.response_class(body, mimetype=content_type)
+
 @app.route('/api/users/me', methods=['GET'])
 @jwt_required()
 def get_current_user_quota():
@@ -56,11 +143,19 @@ def get_current_user_quota():
             "max_stores": user['max_stores'],
             "max_storage": user['max_storage_gi'],
             "current_stores": usage['store_count'] or 0,
-            "current_storage": usage['total_storage'] or 0
+            "current_storage": usage['total_storage'] or 0,
+            "max_plan_units": user['max_plan_units'],
+            "current_plan_units": usage['plan_units']
         })
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/plans', methods=['GET'])
+@jwt_required()
+def list_plans():
+    """Store plans selectable on create, with their quota cost"""
+    return jsonify({"plans": plans.list_plans()})
+
 @app.route('/api/stores', methods=['GET'])
 @jwt_required()
 def list_stores():
@@ -72,30 +167,84 @@ def list_stores():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+def _request_fingerprint(data):
+    """Stable hash of a request body, to detect an Idempotency-Key reused for a different request"""
+    return hashlib.sha256(json.dumps(data, sort_keys=True, separators=(',', ':')).encode('utf-8')).hexdigest()
+
+def _replay_idempotent_request(user_id, key, fingerprint):
+    """
+    Claim an Idempotency-Key, or build the response for a key that was seen before.
+    Returns None when the caller should process the request.
+    """
+    record = database.claim_idempotency_key(user_id, key, fingerprint, config.IDEMPOTENCY_KEY_TTL_SECONDS)
+    if record is None:
+        return None
+    if record['fingerprint'] != fingerprint:
+        return jsonify({"error": "Idempotency-Key was already used with a different request body"}), 422
+    if record['status'] == 'completed':
+        return app.response_class(record['response_body'], status=record['response_code'], mimetype='application/json')
+
+    # Original request is still running: report where it got to without touching Kubernetes
+    store = database.get_store(record['store_id']) if record['store_id'] else None
+    return jsonify({
+        "error": "A request with this Idempotency-Key is still in progress",
+        "id": record['store_id'],
+        "status": store['status'] if store else "in_progress"
+    }), 409
+
 @app.route('/api/stores', methods=['POST'])
 @jwt_required()
 def create_store():
     """Create a new store"""
+    idempotency_key = request.headers.get('Idempotency-Key')
+    current_user_id = None
     try:
         current_user_id = int(get_jwt_identity())
         data = request.get_json() or {}
+
+        if idempotency_key:
+            if len(idempotency_key) > 255:
+                return jsonify({"error": "Idempotency-Key must be at most 255 characters"}), 400
+            replay = _replay_idempotent_request(current_user_id, idempotency_key, _request_fingerprint(data))
+            if replay is not None:
+                return replay
+
         sample_products = data.get('sample_products', "Sample Product 1|299|This is a sample product\nSample Product 2|599|Another sample product")
         # Always use environment variable for store URL suffix
         store_url_suffix = os.environ.get('STORE_URL_SUFFIX', None)
         admin_password = data.get('admin_password', None)
         storage_size = int(data.get('storage_size_gi', 2))
+        plan = data.get('plan', None)
+        db_mode = data.get('db_mode', None)
+        cache_mode = data.get('object_cache', None)
+        runtime = data.get('runtime', None)
+        autoscaling = data.get('autoscaling', None)
 
         result = store_manager.create_store(
             user_id=current_user_id,
             sample_products=sample_products,
             store_url_suffix=store_url_suffix,
             admin_password=admin_password,
-            storage_size_gi=storage_size
+            storage_size_gi=storage_size,
+            idempotency_key=idempotency_key,
+            plan=plan,
+            db_mode=db_mode,
+            cache_mode=cache_mode,
+            runtime=runtime,
+            autoscaling=autoscaling
         )
-        if "error" in result:
-            return jsonify(result), 500 # Should use 400 for logic errors but following existing pattern
-        return jsonify(result), 201
+        if "error" not in result:
+            status_code = 202  # Queued; provisioning continues in the background
+        elif result.get("reason") == "no_cluster":
+            status_code = 503
+        else:
+            status_code = 500 # Should use 400 for logic errors but following existing pattern
+        if idempotency_key:
+            database.complete_idempotency_key(current_user_id, idempotency_key, status_code, json.dumps(result))
+        return jsonify(result), status_code
     except Exception as e:
+        if idempotency_key and current_user_id is not None:
+            database.release_idempotency_key(current_user_id, idempotency_key)
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/stores/<store_id>', methods=['DELETE'])
@@ -112,5 +261,458 @@ def delete_store(store_id):
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/stores/<store_id>/clone', methods=['POST'])
+@jwt_required()
+def clone_store(store_id):
+    """Create a new store from snapshots of an existing store's volumes"""
+    try:
+        current_user_id = int(get_jwt_identity())
+        data = request.get_json(silent=True) or {}
+        result = store_manager.clone_store(
+            store_id,
+            current_user_id,
+            store_url_suffix=os.environ.get('STORE_URL_SUFFIX', None),
+            admin_password=data.get('admin_password', None)
+        )
+        if "error" not in result:
+            status_code = 202
+        elif "Unauthorized" in result["error"]:
+            status_code = 403
+        elif result["error"] == "Store not found":
+            status_code = 404
+        elif "cannot be cloned" in result["error"] or "can be cloned" in result["error"]:
+            status_code = 409
+        else:
+            status_code = 500
+        return jsonify(result), status_code
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/stores/<store_id>/resume', methods=['POST'])
+@jwt_required()
+def resume_store(store_id):
+    """Resume a failed or interrupted store from its first incomplete step"""
+    try:
+        current_user_id = int(get_jwt_identity())
+        result = store_manager.resume_store(store_id, user_id=current_user_id)
+        if "error" in result:
+            error = result.get("error", "")
+            if "Unauthorized" in error:
+                status_code = 403
+            elif "not found" in error:
+                status_code = 404
+            else:
+                status_code = 409
+            return jsonify(result), status_code
+        return jsonify(result), 202
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/stores/<store_id>/provisioning', methods=['GET'])
+@jwt_required()
+def get_provisioning_steps(store_id):
+    """Get the provisioning step journal of a store"""
+    try:
+        current_user_id = int(get_jwt_identity())
+        result = store_manager.get_provisioning_steps(store_id, user_id=current_user_id)
+        if "error" in result:
+            status_code = 403 if "Unauthorized" in result.get("error", "") else 404
+            return jsonify(result), status_code
+        return jsonify(result), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/stores/<store_id>/cache', methods=['GET'])
+@jwt_required()
+def get_cache_stats(store_id):
+    """Object cache hit rate, evictions and memory of a store"""
+    try:
+        current_user_id = int(get_jwt_identity())
+        result = store_manager.get_cache_stats(store_id, user_id=current_user_id)
+        if "error" in result:
+            error = result.get("error", "")
+            if "Unauthorized" in error:
+                status_code = 403
+            elif "unavailable" in error:
+                status_code = 503
+            else:
+                status_code = 404
+            return jsonify(result), status_code
+        return jsonify(result), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/stores/<store_id>/storage', methods=['GET'])
+@jwt_required()
+def get_store_storage(store_id):
+    """Volume sizes, storage classes and resize progress of a store"""
+    try:
+        current_user_id = int(get_jwt_identity())
+        result = store_manager.get_storage(store_id, user_id=current_user_id)
+        if "error" in result:
+            status_code = 403 if "Unauthorized" in result.get("error", "") else 404
+            return jsonify(result), status_code
+        return jsonify(result), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/stores/<store_id>/storage', methods=['POST'])
+@jwt_required()
+def resize_store_storage(store_id):
+    """Expand a store's WordPress and/or MySQL volume online"""
+    try:
+        current_user_id = int(get_jwt_identity())
+        data = request.get_json(silent=True) or {}
+        wordpress_gi = data.get('wordpress_gi')
+        mysql_gi = data.get('mysql_gi')
+        result = store_manager.resize_storage(
+            store_id,
+            user_id=current_user_id,
+            wordpress_gi=int(wordpress_gi) if wordpress_gi is not None else None,
+            mysql_gi=int(mysql_gi) if mysql_gi is not None else None,
+        )
+        if "error" in result:
+            error = result.get("error", "")
+            if "Unauthorized" in error:
+                status_code = 403
+            elif "not found" in error:
+                status_code = 404
+            elif "quota exceeded" in error or "only ready" in error:
+                status_code = 409
+            elif "Failed" in error:
+                status_code = 500
+            else:
+                status_code = 400
+            return jsonify(result), status_code
+        return jsonify(result), 202
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/stores/<store_id>/benchmark', methods=['POST'])
+@jwt_required()
+def start_benchmark(store_id):
+    """Run an in-cluster load test against a ready store"""
+    try:
+        current_user_id = int(get_jwt_identity())
+        data = request.get_json(silent=True) or {}
+        result = store_manager.start_benchmark(
+            store_id,
+            user_id=current_user_id,
+            requests=min(int(data.get('requests', 500)), 20000),
+            concurrency=min(int(data.get('concurrency', 10)), 200),
+            path=data.get('path', '/')
+        )
+        if "error" in result:
+            error = result.get("error", "")
+            if "Unauthorized" in error:
+                status_code = 403
+            elif "not found" in error:
+                status_code = 404
+            elif "only ready" in error:
+                status_code = 409
+            else:
+                status_code = 500
+            return jsonify(result), status_code
+        return jsonify(result), 202
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/stores/<store_id>/benchmark', methods=['GET'])
+@jwt_required()
+def get_benchmark(store_id):
+    """Requests/sec and latency of the store's latest benchmark"""
+    try:
+        current_user_id = int(get_jwt_identity())
+        result = store_manager.get_benchmark(store_id, user_id=current_user_id)
+        if "error" in result:
+            status_code = 403 if "Unauthorized" in result.get("error", "") else 404
+            return jsonify(result), status_code
+        return jsonify(result), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/admin/benchmarks', methods=['GET'])
+@jwt_required()
+@admin_required
+def compare_benchmarks():
+    """Compare the latest benchmarks of stores, e.g. ?store_ids=a1b2c3d4,e5f6a7b8"""
+    store_ids = [s.strip() for s in request.args.get('store_ids', '').split(',') if s.strip()]
+    if not store_ids:
+        return jsonify({"error": "store_ids is required"}), 400
+    return jsonify(store_manager.compare_benchmarks(store_ids))
+
+@app.route('/api/admin/provisioning/queue', methods=['GET'])
+@jwt_required()
+@admin_required
+def get_provisioning_queue():
+    """Admission control state: in-flight and queued provisions, wait times"""
+    return jsonify(store_manager.scheduler.stats())
+
+@app.route('/api/admin/slo', methods=['GET'])
+@jwt_required()
+@admin_required
+def get_slo_report():
+    """p50/p95/p99 provisioning and deletion durations, e.g. ?windows=24h,7d,30d"""
+    try:
+        windows = [w for w in request.args.get('windows', '24h,7d,30d').split(',') if w.strip()]
+        return jsonify(slo_report.build_report(windows))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/admin/gc', methods=['GET'])
+@jwt_required()
+@admin_required
+def get_gc_report():
+    """Report of the last garbage collection sweep that changed anything"""
+    return jsonify({"last_report": garbage_collector.last_report})
+
+@app.route('/api/admin/gc', methods=['POST'])
+@jwt_required()
+@admin_required
+def run_gc():
+    """Run a garbage collection sweep now; ?dry_run=true only reports what would be done"""
+    try:
+        dry_run = request.args.get('dry_run', 'false').lower() in ('1', 'true', 'yes')
+        return jsonify(garbage_collector.sweep(dry_run=dry_run))
+    except SweepInProgress as e:
+        return jsonify({"error": str(e)}), 409
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/stores/<store_id>/hibernate', methods=['POST'])
+@jwt_required()
+def hibernate_store(store_id):
+    """Scale a ready store to zero now; it wakes on its next request"""
+    try:
+        current_user_id = int(get_jwt_identity())
+        result = hibernator.hibernate(store_id, user_id=current_user_id)
+        if "error" in result:
+            error = result.get("error", "")
+            if "Unauthorized" in error:
+                status_code = 403
+            elif "not found" in error:
+                status_code = 404
+            elif "not configured" in error:
+                status_code = 503
+            elif "only ready" in error or "already" in error:
+                status_code = 409
+            else:
+                status_code = 500
+            return jsonify(result), status_code
+        return jsonify(result), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/stores/<store_id>/wake', methods=['POST'])
+@jwt_required()
+def wake_store(store_id):
+    """Start waking a hibernated store without waiting for a visitor"""
+    try:
+        current_user_id = int(get_jwt_identity())
+        result = hibernator.wake(store_id, user_id=current_user_id)
+        if "error" in result:
+            error = result.get("error", "")
+            if "Unauthorized" in error:
+                status_code = 403
+            elif "not found" in error:
+                status_code = 404
+            else:
+                status_code = 409
+            return jsonify(result), status_code
+        return jsonify(result), 202
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/stores/<store_id>/backups', methods=['POST'])
+@jwt_required()
+def create_backup(store_id):
+    """Queue an on-demand backup of a store"""
+    try:
+        current_user_id = int(get_jwt_identity())
+        result = backup_manager.request_backup(store_id, user_id=current_user_id)
+        if "error" in result:
+            error = result.get("error", "")
+            if "Unauthorized" in error:
+                status_code = 403
+            elif "not found" in error:
+                status_code = 404
+            elif "not configured" in error:
+                status_code = 503
+            else:
+                status_code = 409
+            return jsonify(result), status_code
+        return jsonify(result), 202
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/stores/<store_id>/backups', methods=['GET'])
+@jwt_required()
+def list_backups(store_id):
+    """Backups of a store, including stores that have since been deleted"""
+    try:
+        current_user_id = int(get_jwt_identity())
+        result = backup_manager.list_backups(store_id, user_id=current_user_id)
+        if "error" in result:
+            status_code = 403 if "Unauthorized" in result.get("error", "") else 404
+            return jsonify(result), status_code
+        return jsonify(result), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/backups/<int:backup_id>/restore', methods=['POST'])
+@jwt_required()
+def restore_backup(backup_id):
+    """Restore a backup into an existing store (target_store_id) or into a new store"""
+    try:
+        current_user_id = int(get_jwt_identity())
+        data = request.get_json(silent=True) or {}
+        result = backup_manager.restore(
+            backup_id,
+            user_id=current_user_id,
+            target_store_id=data.get('target_store_id'),
+            store_url_suffix=os.environ.get('STORE_URL_SUFFIX', None)
+        )
+        if "error" in result:
+            error = result.get("error", "")
+            if "Unauthorized" in error:
+                status_code = 403
+            elif "not found" in error:
+                status_code = 404
+            elif "not configured" in error or result.get("reason") in ("admission_timeout", "no_cluster", "capacity"):
+                status_code = 503
+            elif "only" in error or "already running" in error:
+                status_code = 409
+            else:
+                status_code = 500
+            return jsonify(result), status_code
+        return jsonify(result), 202
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/admin/backups', methods=['GET'])
+@jwt_required()
+@admin_required
+def get_backup_report():
+    """Backups per status, the fleet-wide concurrency limit and the last dispatch"""
+    try:
+        return jsonify(backup_manager.status())
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/admin/hibernation', methods=['GET'])
+@jwt_required()
+@admin_required
+def get_hibernation_report():
+    """Result of the last idle sweep"""
+    return jsonify({"enabled": config.HIBERNATION_ENABLED, "last_sweep": hibernator.last_sweep})
+
+@app.route('/api/admin/hibernation', methods=['POST'])
+@jwt_required()
+@admin_required
+def run_hibernation_sweep():
+    """Run an idle sweep now"""
+    try:
+        report = hibernator.sweep()
+        if report is None:
+            return jsonify({"error": "Hibernation needs ACTIVATOR_HOST and readable INGRESS_METRICS_URL"}), 503
+        return jsonify(report)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/admin/images', methods=['GET'])
+@jwt_required()
+@admin_required
+def get_image_cache():
+    """Pinned store images, pre-pull rollout and per-node cache warmth (?cluster=, default cluster if omitted)"""
+    try:
+        k8s = store_manager.clusters.get(request.args.get('cluster'))
+    except clusters.ClusterError as e:
+        return jsonify({"error": str(e)}), 404
+    result = image_cache.cache_warmth_report(k8s)
+    if "error" in result:
+        return jsonify(result), 502
+    return jsonify(result)
+
+@app.route('/api/admin/images/prepull', methods=['POST'])
+@jwt_required()
+@admin_required
+def prepull_images():
+    """Create or roll the pre-pull DaemonSet for the current image set (?cluster=, default cluster if omitted)"""
+    try:
+        k8s = store_manager.clusters.get(request.args.get('cluster'))
+    except clusters.ClusterError as e:
+        return jsonify({"error": str(e)}), 404
+    result = image_cache.ensure_prepull_daemonset(k8s)
+    if "error" in result:
+        return jsonify(result), 502
+    return jsonify(result)
+
+@app.route('/api/admin/clusters', methods=['GET'])
+@jwt_required()
+@admin_required
+def get_clusters():
+    """Configured clusters, their store counts and the placement policy"""
+    try:
+        return jsonify(clusters.status())
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/admin/capacity', methods=['GET'])
+@jwt_required()
+@admin_required
+def get_capacity():
+    """Free node and storage capacity per cluster as seen by capacity admission; ?refresh=1 re-reads it"""
+    try:
+        if request.args.get('refresh') in ('1', 'true'):
+            store_manager.capacity.refresh()
+        return jsonify(store_manager.capacity.status())
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/admin/quotas', methods=['GET'])
+@jwt_required()
+@admin_required
+def get_stores_near_quota():
+    """Stores using at least ?threshold (0-1, default QUOTA_NEAR_LIMIT_PERCENT) of any ResourceQuota resource"""
+    try:
+        threshold = float(request.args.get('threshold', config.QUOTA_NEAR_LIMIT_PERCENT / 100))
+        stores = database.get_stores_near_quota(threshold, limit=min(int(request.args.get('limit', 100)), 1000))
+        return jsonify({
+            "threshold": threshold,
+            "stores": [
+                {key: store[key] for key in ("id", "user_id", "plan", "status", "quota_utilization", "quota_usage",
+                                             "quota_checked_at")}
+                for store in stores
+            ],
+        })
+    except ValueError:
+        return jsonify({"error": "threshold and limit must be numbers"}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/admin/routes', methods=['GET'])
+@jwt_required()
+@admin_required
+def get_routes():
+    """Consolidated ingress shards: routes per shard, pending shards and the last flush"""
+    return jsonify(store_manager.router.status())
+
+@app.route('/api/admin/routes/resync', methods=['POST'])
+@jwt_required()
+@admin_required
+def resync_routes():
+    """Rewrite every consolidated ingress shard from the stores table now"""
+    try:
+        store_manager.router.resync()
+        return jsonify(store_manager.router.flush())
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=8000, debug=True)
\ No newline at end of file
+    debug = True
+    # With the reloader, only the child process serves requests
+    if not debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_background_tasks()
+    app.run(host='0.0.0.0', port=8000, debug=debug)
\ No newline at end of file
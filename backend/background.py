@@ -0,0 +1,42 @@
+"""
+Background work that runs alongside request handling
+Each task gets its own daemon thread with a Flask app context, so it can use
+the same database helpers as the route handlers.
+"""
+import contextvars
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+def run_in_background(app, fn, *args, name=None):
+    """Run fn(*args) once in a daemon thread, in a copy of the caller's context (trace and log context)"""
+    def target():
+        with app.app_context():
+            try:
+                fn(*args)
+            except Exception as e:
+                logger.exception(f"Background task {name or fn.__name__} failed: {e}")
+
+    context = contextvars.copy_context()
+    thread = threading.Thread(target=context.run, args=(target,), name=name or fn.__name__, daemon=True)
+    thread.start()
+    return thread
+
+
+def run_periodically(app, fn, interval_seconds, *args, name=None):
+    """Run fn(*args) every interval_seconds in a daemon thread; failures are logged and retried next tick"""
+    stop = threading.Event()
+
+    def target():
+        while not stop.wait(interval_seconds):
+            with app.app_context():
+                try:
+                    fn(*args)
+                except Exception as e:
+                    logger.exception(f"Periodic task {name or fn.__name__} failed: {e}")
+
+    thread = threading.Thread(target=target, name=name or fn.__name__, daemon=True)
+    thread.start()
+    return stop
@@ -0,0 +1,365 @@
+"""
+Store backups and restores
+Backups run as Jobs in the store's namespace and stream straight into an
+S3-compatible bucket (BACKUP_S3_*), so no dump passes through the backend:
+
+    stores/<id>/backups/<backup>/db.sql.gz           mysqldump, gzipped on the fly
+    stores/<id>/backups/<backup>/wp-content.tar.gz   wp-content without uploads
+    stores/<id>/uploads/                             media library, synced incrementally
+    stores/<id>/uploads-history/<backup>/            uploads that backup replaced or removed
+
+Backups are queued as rows. The dispatcher keeps at most BACKUP_MAX_CONCURRENT
+backup Jobs running across all stores and records how each one ended, and
+every ready store gets a scheduled backup every BACKUP_INTERVAL_SECONDS.
+
+A restore imports the dump while wp-content and the uploads download in
+parallel, into an existing store or into a new store created for it, with
+WordPress scaled down meanwhile. A store restored from another store's backup
+gets its URLs rewritten to its own host.
+"""
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+import config
+import database
+import plans
+import shared_mysql
+from background import run_in_background
+from metrics import BACKUP_SECONDS, BACKUPS, RESTORES
+from structured_logging import log_context
+from templates.backup import (
+    backup_prefix,
+    get_backup_credentials_secret,
+    get_backup_job,
+    get_restore_job,
+    get_url_rewrite_job,
+)
+from tracing import start_span
+
+logger = logging.getLogger(__name__)
+
+_JOB_POLL_SECONDS = 5
+# Stores queued per schedule pass; the rest are picked up on the next one
+_SCHEDULE_BATCH = 100
+
+
+class BackupManager:
+    def __init__(self, store_manager):
+        self.store_manager = store_manager
+        # Stores with a restore running in this process
+        self._restoring = set()
+        self._restoring_lock = threading.Lock()
+        self._dispatch_lock = threading.Lock()
+        self.last_dispatch = None
+
+    def is_available(self):
+        return bool(config.BACKUP_S3_BUCKET)
+
+    def _s3(self):
+        return {
+            "endpoint": config.BACKUP_S3_ENDPOINT,
+            "region": config.BACKUP_S3_REGION,
+            "provider": config.BACKUP_S3_PROVIDER,
+        }
+
+    def _claim(self, store_id):
+        with self._restoring_lock:
+            if store_id in self._restoring:
+                return False
+            self._restoring.add(store_id)
+            return True
+
+    def _release(self, store_id):
+        with self._restoring_lock:
+            self._restoring.discard(store_id)
+
+    # --- Backups ---
+
+    def request_backup(self, store_id, user_id=None, kind="manual"):
+        """Queue a backup of a ready store"""
+        if not self.is_available():
+            return {"error": "Backups are not configured (BACKUP_S3_BUCKET)"}
+        store = database.get_store(store_id)
+        if not store:
+            return {"error": "Store not found"}
+        if user_id and str(store["user_id"]) != str(user_id):
+            return {"error": "Unauthorized: You do not own this store"}
+        if store["status"] != "ready":
+            return {"error": f"Store is {store['status']}; only ready stores can be backed up"}
+        active = [b for b in database.list_backups(store_id, limit=5) if b["status"] in ("pending", "running")]
+        if active:
+            return {"error": "A backup of this store is already queued or running", "backup": active[0]}
+        backup = database.create_backup(store, kind=kind)
+        logger.info(f"Queued {kind} backup {backup['id']}", extra={"store_id": store_id})
+        return {"id": store_id, "backup": backup}
+
+    def list_backups(self, store_id, user_id=None):
+        """Backups of a store, newest first; also works after the store was deleted"""
+        backups = database.list_backups(store_id)
+        store = database.get_store(store_id)
+        owner = store["user_id"] if store else (backups[0]["user_id"] if backups else None)
+        if owner is None:
+            return {"error": "Store not found"}
+        if user_id and str(owner) != str(user_id):
+            return {"error": "Unauthorized: You do not own this store"}
+        return {"id": store_id, "backups": backups}
+
+    def run_periodic(self):
+        """Entry point for the background scheduler"""
+        self.schedule()
+        self.dispatch()
+        self._fail_interrupted_restores()
+
+    def schedule(self):
+        """Queue a scheduled backup for every ready store not backed up within the interval"""
+        if not self.is_available() or not config.BACKUP_INTERVAL_SECONDS:
+            return []
+        cutoff = datetime.utcnow() - timedelta(seconds=config.BACKUP_INTERVAL_SECONDS)
+        queued = []
+        for store_id in database.get_stores_due_for_backup(cutoff, _SCHEDULE_BATCH):
+            store = database.get_store(store_id)
+            if store:
+                queued.append(database.create_backup(store, kind="scheduled")["id"])
+        if queued:
+            logger.info(f"Queued {len(queued)} scheduled backups")
+        return queued
+
+    def dispatch(self):
+        """Record finished backup Jobs, then start queued backups while under the fleet-wide limit"""
+        if not self.is_available():
+            return None
+        with self._dispatch_lock, start_span("backup.dispatch"):
+            running = [b for b in database.get_backups_by_status("running") if not self._check_running(b)]
+            slots = max(config.BACKUP_MAX_CONCURRENT - len(running), 0)
+            started, failed = [], []
+            for backup in database.get_backups_by_status("pending", limit=slots) if slots else []:
+                (started if self._start(backup) else failed).append(backup["id"])
+            self.last_dispatch = {
+                "at": datetime.utcnow().isoformat(),
+                "running": len(running) + len(started),
+                "started": started,
+                "failed_to_start": failed,
+            }
+            return self.last_dispatch
+
+    def _start(self, backup):
+        store_id = backup["store_id"]
+        with log_context(store_id=store_id):
+            store = database.get_store(store_id)
+            if not store or store["status"] != "ready":
+                self._finish(backup, "failed", f"Store was {store['status'] if store else 'deleted'} when the backup was due")
+                return False
+            namespace = f"store-{store_id}"
+            job_name = f"backup-{backup['id']}"
+            secret = get_backup_credentials_secret(store_id, config.BACKUP_S3_ACCESS_KEY, config.BACKUP_S3_SECRET_KEY)
+            job = get_backup_job(
+                store_id, backup["id"], job_name, self._s3(), config.BACKUP_S3_BUCKET,
+                db_port=_db_port(store), timeout_seconds=config.BACKUP_TIMEOUT_SECONDS,
+            )
+            k8s = self.store_manager.k8s_for(store)
+            if not (k8s.apply_secret(namespace, secret) and k8s.create_job(namespace, job)):
+                self._finish(backup, "failed", "Failed to start the backup Job")
+                return False
+            database.update_backup(
+                backup["id"], status="running", job_name=job_name, started_at=datetime.utcnow(),
+                location=f"s3://{config.BACKUP_S3_BUCKET}/{backup_prefix(store_id, backup['id'])}",
+            )
+            logger.info(f"Started backup {backup['id']}")
+            return True
+
+    def _check_running(self, backup):
+        """Record the outcome of a running backup's Job; True once it has finished"""
+        namespace = f"store-{backup['store_id']}"
+        store = database.get_store(backup["store_id"])
+        job = None
+        if store:
+            selector = f"app=store-backup,backup-id={backup['id']}"
+            job = self.store_manager.k8s_for(store).get_latest_job(namespace, selector)
+        if job is None:
+            self._finish(backup, "failed", "Backup Job disappeared (store deleted?)")
+            return True
+        if job["state"] == "running":
+            return False
+        error = None
+        if job["state"] == "failed":
+            error = f"Backup Job failed: {(job.get('log') or '')[-1000:]}".strip()
+        self._finish(backup, job["state"], error)
+        return True
+
+    def _finish(self, backup, status, error=None):
+        finished_at = datetime.utcnow()
+        database.update_backup(backup["id"], status=status, error=error, finished_at=finished_at)
+        BACKUPS.labels(backup["kind"], "ok" if status == "succeeded" else "error").inc()
+        if backup.get("started_at"):
+            BACKUP_SECONDS.observe((finished_at - datetime.fromisoformat(backup["started_at"])).total_seconds())
+        logger.log(logging.INFO if status == "succeeded" else logging.WARNING,
+                   f"Backup {backup['id']} {status}", extra={"store_id": backup["store_id"]})
+
+    # --- Restores ---
+
+    def restore(self, backup_id, user_id=None, target_store_id=None, store_url_suffix=None):
+        """
+        Restore a backup into an existing ready store, or into a new store
+        created from the backup's plan and size when no target is given
+        """
+        if not self.is_available():
+            return {"error": "Backups are not configured (BACKUP_S3_BUCKET)"}
+        backup = database.get_backup(backup_id)
+        if not backup:
+            return {"error": "Backup not found"}
+        if user_id and str(backup["user_id"]) != str(user_id):
+            return {"error": "Unauthorized: You do not own this backup"}
+        if backup["status"] != "succeeded":
+            return {"error": f"Backup is {backup['status']}; only succeeded backups can be restored"}
+
+        if target_store_id:
+            target = database.get_store(target_store_id)
+            if not target:
+                return {"error": "Store not found"}
+            if user_id and str(target["user_id"]) != str(user_id):
+                return {"error": "Unauthorized: You do not own this store"}
+            if target["status"] != "ready":
+                return {"error": f"Store is {target['status']}; only ready stores can be restored into"}
+            if not self._claim(target_store_id):
+                return {"error": "A restore into this store is already running"}
+            database.update_store_status(target_store_id, "restoring")
+            result = {"id": target_store_id, "status": "restoring"}
+        else:
+            result = self.store_manager.create_store(
+                backup["user_id"],
+                store_url_suffix=store_url_suffix,
+                storage_size_gi=backup["wordpress_storage_gi"] or 2,
+                plan=backup["plan"],
+                runtime=backup["runtime"],
+            )
+            if "error" in result:
+                return result
+            target_store_id = result["id"]
+            self._claim(target_store_id)
+
+        run_in_background(current_app._get_current_object(), self._restore, backup, target_store_id,
+                          name=f"restore-{target_store_id}")
+        return {**result, "backup_id": backup_id}
+
+    def _restore(self, backup, store_id):
+        target = "existing"
+        try:
+            with log_context(store_id=store_id), start_span("backup.restore", store_id=store_id):
+                store = database.get_store(store_id)
+                if store and store["status"] != "restoring":
+                    target = "new"
+                    store = self._wait_until_ready(store)
+                    if store is None:
+                        RESTORES.labels(target, "error").inc()
+                        return
+                    database.update_store_status(store_id, "restoring")
+
+                error = self._run_restore(backup, store)
+                # Bring WordPress back either way; a failed restore leaves the store as it was or half restored
+                self.store_manager.k8s_for(store).scale_deployment(f"store-{store_id}", "wordpress",
+                                                                   _wordpress_replicas(store))
+                if error:
+                    database.update_store_status(store_id, "failed", reason=f"restore_failed: {error}")
+                    RESTORES.labels(target, "error").inc()
+                    return
+                database.update_store_status(store_id, "ready")
+                RESTORES.labels(target, "ok").inc()
+                logger.info(f"Restored backup {backup['id']}", extra={"status": "ready"})
+        finally:
+            self._release(store_id)
+
+    def _wait_until_ready(self, store):
+        """Wait for a store created for a restore to finish provisioning; None if it does not"""
+        deadline = time.monotonic() + config.BACKUP_TIMEOUT_SECONDS
+        while store and store["status"] in ("initialized", "queued", "provisioning") and time.monotonic() < deadline:
+            if store["status"] == "provisioning":
+                self.store_manager.refresh_provisioning_status(store)
+            time.sleep(_JOB_POLL_SECONDS)
+            store = database.get_store(store["id"])
+        if not store or store["status"] != "ready":
+            logger.error("Store created for the restore did not become ready")
+            return None
+        return store
+
+    def _run_restore(self, backup, store):
+        """Run the restore Job (and the URL rewrite for another store's backup); returns an error or None"""
+        store_id = store["id"]
+        namespace = f"store-{store_id}"
+        db_port = _db_port(store)
+        k8s = self.store_manager.k8s_for(store)
+        if not k8s.scale_deployment(namespace, "wordpress", 0):
+            return "could not scale WordPress down"
+        secret = get_backup_credentials_secret(store_id, config.BACKUP_S3_ACCESS_KEY, config.BACKUP_S3_SECRET_KEY)
+        job = get_restore_job(
+            store_id, backup["store_id"], backup["id"], f"restore-{backup['id']}-{int(time.time())}",
+            self._s3(), config.BACKUP_S3_BUCKET, db_port=db_port, timeout_seconds=config.BACKUP_TIMEOUT_SECONDS,
+        )
+        if not (k8s.apply_secret(namespace, secret) and k8s.create_job(namespace, job)):
+            return "could not start the restore Job"
+        error = self._wait_for_job(k8s, namespace, f"app=store-restore,backup-id={backup['id']}")
+        if error:
+            return error
+
+        source_host = backup.get("store_url") or f"store-{backup['store_id']}.local"
+        target_host = store.get("store_url") or f"store-{store_id}.local"
+        if source_host != target_host:
+            rewrite = get_url_rewrite_job(store_id, f"restore-rewrite-{int(time.time())}", source_host, target_host,
+                                          db_port=db_port)
+            if not k8s.create_job(namespace, rewrite):
+                return "could not start the URL rewrite Job"
+            return self._wait_for_job(k8s, namespace, "app=store-restore-rewrite")
+        return None
+
+    def _wait_for_job(self, k8s, namespace, label_selector):
+        deadline = time.monotonic() + config.BACKUP_TIMEOUT_SECONDS
+        job = k8s.get_latest_job(namespace, label_selector)
+        while job and job["state"] == "running" and time.monotonic() < deadline:
+            time.sleep(_JOB_POLL_SECONDS)
+            job = k8s.get_latest_job(namespace, label_selector)
+        if not job:
+            return f"Job {label_selector} not found"
+        if job["state"] != "succeeded":
+            return f"Job {job['name']} {job['state']}: {(job.get('log') or '')[-500:]}".strip()
+        return None
+
+    def _fail_interrupted_restores(self):
+        """"restoring" without a restore in this process: the backend restarted mid-restore"""
+        for store_id in database.get_store_ids_by_status("restoring"):
+            with self._restoring_lock:
+                if store_id in self._restoring:
+                    continue
+            store = database.get_store(store_id)
+            self.store_manager.k8s_for(store).scale_deployment(f"store-{store_id}", "wordpress",
+                                                               _wordpress_replicas(store))
+            database.update_store_status(store_id, "failed",
+                                         reason="restore_interrupted: the backend restarted during the restore")
+            RESTORES.labels("existing", "error").inc()
+
+    def status(self):
+        """Backups per status, the concurrency limit and the last dispatch"""
+        return {
+            "enabled": self.is_available(),
+            "bucket": config.BACKUP_S3_BUCKET or None,
+            "max_concurrent": config.BACKUP_MAX_CONCURRENT,
+            "interval_seconds": config.BACKUP_INTERVAL_SECONDS,
+            "backups": database.count_backups_by_status(),
+            "restoring": sorted(self._restoring),
+            "last_dispatch": self.last_dispatch,
+        }
+
+
+def _wordpress_replicas(store):
+    """Replicas WordPress runs with outside a restore; the HPA takes over from the plan minimum"""
+    if store.get("autoscaling"):
+        return plans.get_plan(store.get("plan"))["autoscaling"]["min_replicas"]
+    return 1
+
+
+def _db_port(store):
+    if store.get("db_mode") == "shared":
+        return shared_mysql.get_instance(store["db_instance"])["port"]
+    return 3306
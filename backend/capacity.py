@@ -0,0 +1,306 @@
+"""
+Capacity-aware admission
+Before a store's pipeline creates anything, its pods and volumes are
+checked against a cached view of the cluster it is placed on:
+
+    nodes     allocatable CPU, memory and pod slots of schedulable nodes,
+              minus the requests of every pod running or waiting there
+              (unscheduled pods are placed first-fit, as queued demand)
+    storage   largest capacity each storage class's CSI driver publishes
+              (CSIStorageCapacity); classes without it are not checked
+
+The view is refreshed every CAPACITY_REFRESH_SECONDS. A store fits if each
+of its pods fits a node, largest first, on the node with the most free
+memory (the scheduler spreads pods the same way), leaving
+CAPACITY_HEADROOM_PERCENT of every node free, and each volume fits its
+class. What an admitted store needs stays reserved while its pipeline runs
+and for two refreshes after, until its pods are counted by the view, so a
+burst of creates cannot all claim the same free space.
+
+If the view cannot be read, stores are admitted (fail open) and the error
+is shown in GET /api/admin/capacity.
+"""
+import logging
+import threading
+import time
+from datetime import datetime
+
+import config
+import plans
+from k8s_client import pod_requests
+from metrics import CLUSTER_CAPACITY_REMAINING
+from templates.mysql import get_mysql_statefulset
+from templates.redis import get_redis_deployment
+from templates.wordpress import get_wordpress_deployment, get_wordpress_fpm_deployment, get_wp_setup_job
+from tracing import start_span
+
+logger = logging.getLogger(__name__)
+
+_GI = 1024 ** 3
+# Upper bound when estimating how many more stores of a plan fit
+_MAX_ESTIMATE = 200
+
+
+def store_pod_specs(ctx, wordpress_replicas=None):
+    """
+    Pod specs of a store's long-running workloads, built from the same
+    templates as its pipeline: MySQL and Redis when dedicated, and the
+    WordPress Deployment's replicas (its initial count unless given)
+    """
+    plan = ctx["plan"]
+    specs = []
+    if ctx["db_mode"] == "dedicated":
+        specs.append(get_mysql_statefulset(ctx["store_id"], plan, storage_gi=ctx["mysql_storage_gi"]).spec.template.spec)
+    if ctx["object_cache"] == "dedicated":
+        specs.append(get_redis_deployment(ctx["store_id"], plan).spec.template.spec)
+    build = get_wordpress_fpm_deployment if ctx["runtime"] == "fpm" else get_wordpress_deployment
+    wordpress = build(ctx["store_id"], "", ctx["store_url"], plan, autoscaled=bool(ctx["autoscaling"]))
+    specs.extend([wordpress.spec.template.spec] * (wordpress_replicas or wordpress.spec.replicas or 1))
+    return specs
+
+
+def store_demand(ctx):
+    """
+    {"pods": [(cpu, memory)], "volumes": [(storage class or None, bytes)]} a
+    store needs while it is being created
+    """
+    plan = ctx["plan"]
+    pods = [pod_requests(spec) for spec in store_pod_specs(ctx)]
+    volumes = []
+    if ctx["db_mode"] == "dedicated":
+        volumes.append((plan["storage"]["mysql_class"], ctx["mysql_storage_gi"] * _GI))
+    if ctx["autoscaling"]:
+        pods.append(pod_requests(get_wp_setup_job(ctx["store_id"]).spec.template.spec))
+        volumes.append((config.RWX_STORAGE_CLASS, ctx["storage_size_gi"] * _GI))
+    else:
+        volumes.append((plan["storage"]["wordpress_class"], ctx["storage_size_gi"] * _GI))
+    return {"pods": pods, "volumes": volumes}
+
+
+def _plan_demand(plan_name):
+    """Demand of a default store (dedicated MySQL, no cache, default runtime) on a plan"""
+    return store_demand({
+        "store_id": "capacity", "store_url": "capacity.local", "plan": plans.get_plan(plan_name),
+        "db_mode": "dedicated", "mysql_storage_gi": 1, "object_cache": None,
+        "runtime": config.DEFAULT_WORDPRESS_RUNTIME, "autoscaling": None, "storage_size_gi": 2,
+    })
+
+
+def _place(nodes, pods):
+    """
+    Place pods (largest memory first) on the node with the most free memory
+    that fits each; mutates nodes. Returns {node: [cpu, memory, pods]} used,
+    or None if a pod does not fit anywhere.
+    """
+    used = {}
+    for cpu, memory in sorted(pods, key=lambda pod: (pod[1], pod[0]), reverse=True):
+        fitting = [n for n in nodes if n["cpu"] >= cpu and n["memory"] >= memory and n["pods"] >= 1]
+        if not fitting:
+            return None
+        node = max(fitting, key=lambda n: (n["memory"], n["cpu"]))
+        node["cpu"] -= cpu
+        node["memory"] -= memory
+        node["pods"] -= 1
+        usage = used.setdefault(node["name"], [0.0, 0.0, 0])
+        usage[0] += cpu
+        usage[1] += memory
+        usage[2] += 1
+    return used
+
+
+class CapacityTracker:
+    def __init__(self, clients):
+        self.clients = clients
+        self._views = {}  # cluster -> latest view
+        self._reservations = {}  # store id -> reservation
+        self._lock = threading.Lock()
+
+    # --- View ---
+
+    def refresh(self):
+        """Re-read every cluster's nodes, pods and storage capacity"""
+        for cluster, k8s in self.clients.items():
+            with start_span("capacity.refresh", cluster=cluster):
+                view = self._read_view(cluster, k8s)
+            with self._lock:
+                if view["error"] and "nodes" in self._views.get(cluster, {}):
+                    # Keep admitting against the last good view until it is too old
+                    self._views[cluster]["last_error"] = view["error"]
+                else:
+                    self._views[cluster] = view
+                self._expire_reservations()
+            self._export(cluster)
+
+    def _read_view(self, cluster, k8s):
+        nodes = k8s.list_schedulable_nodes()
+        pods = k8s.list_pod_requests() if nodes is not None else None
+        storage = k8s.get_storage_capacity() if pods is not None else None
+        if storage is None:
+            logger.warning(f"Could not read the capacity of cluster {cluster}")
+            return {"error": "Could not read nodes, pods or storage capacity", "at": time.monotonic(),
+                    "read_at": datetime.utcnow().isoformat()}
+
+        headroom = config.CAPACITY_HEADROOM_PERCENT / 100.0
+        free = {
+            n["name"]: {"name": n["name"], "cpu": n["cpu"] * (1 - headroom), "memory": n["memory"] * (1 - headroom),
+                        "pods": n["pods"]}
+            for n in nodes
+        }
+        pending = []
+        for node_name, cpu, memory in pods:
+            if node_name is None:
+                pending.append((cpu, memory))
+            elif node_name in free:
+                node = free[node_name]
+                node["cpu"] -= cpu
+                node["memory"] -= memory
+                node["pods"] -= 1
+        free_nodes = list(free.values())
+        # Unscheduled pods will take space as soon as it frees up; count the ones that fit
+        for pod in pending:
+            _place(free_nodes, [pod])
+
+        by_class, default_class = storage
+        return {
+            "at": time.monotonic(),
+            "read_at": datetime.utcnow().isoformat(),
+            "error": None,
+            "nodes": free_nodes,
+            "pending_pods": len(pending),
+            "storage": by_class,
+            "default_class": default_class,
+        }
+
+    def _view(self, cluster):
+        """Latest usable view of a cluster, refreshing it when missing or stale; None if unreadable"""
+        view = self._views.get(cluster)
+        if view is None or time.monotonic() - view["at"] > config.CAPACITY_MAX_AGE_SECONDS:
+            view = self._read_view(cluster, self.clients.get(cluster))
+            with self._lock:
+                self._views[cluster] = view
+        return None if view["error"] else view
+
+    def _free(self, cluster, view):
+        """Free node and storage capacity left in a view after reservations; call with the lock held"""
+        nodes = {n["name"]: dict(n) for n in view["nodes"]}
+        storage = dict(view["storage"])
+        for reservation in self._reservations.values():
+            if reservation["cluster"] != cluster:
+                continue
+            for name, (cpu, memory, pods) in reservation["nodes"].items():
+                if name in nodes:
+                    nodes[name]["cpu"] -= cpu
+                    nodes[name]["memory"] -= memory
+                    nodes[name]["pods"] -= pods
+            for storage_class, size in reservation["volumes"].items():
+                if storage_class in storage:
+                    storage[storage_class] -= size
+        return {"nodes": list(nodes.values()), "storage": storage, "default_class": view["default_class"]}
+
+    # --- Admission ---
+
+    def reserve(self, store_id, cluster, demand):
+        """
+        Reserve what a store needs on its cluster. Returns None when it fits
+        (or the cluster's capacity is unknown), else why it does not.
+        """
+        view = self._view(cluster)
+        if view is None:
+            logger.warning(f"Capacity of cluster {cluster} is unknown; admitting store {store_id}")
+            return None
+        with self._lock:
+            self._expire_reservations()
+            self._reservations.pop(store_id, None)
+            free = self._free(cluster, view)
+
+            volumes = {}
+            for storage_class, size in demand["volumes"]:
+                storage_class = storage_class or free["default_class"]
+                if storage_class in free["storage"]:
+                    volumes[storage_class] = volumes.get(storage_class, 0) + size
+            for storage_class, size in volumes.items():
+                if size > free["storage"][storage_class]:
+                    return (f"storage class {storage_class} has {free['storage'][storage_class] / _GI:.1f}Gi free, "
+                            f"{size / _GI:.0f}Gi needed")
+
+            placed = _place(free["nodes"], demand["pods"])
+            if placed is None:
+                cpu = sum(cpu for cpu, _ in demand["pods"])
+                memory = sum(memory for _, memory in demand["pods"])
+                return (f"no room on cluster {cluster} for {len(demand['pods'])} pods "
+                        f"({cpu:.2f} CPU, {memory / _GI:.2f}Gi memory)")
+            self._reservations[store_id] = {"cluster": cluster, "nodes": placed, "volumes": volumes, "expires": None}
+            return None
+
+    def settle(self, store_id):
+        """The store's resources exist: keep its reservation until refreshes have counted its pods"""
+        with self._lock:
+            reservation = self._reservations.get(store_id)
+            if reservation:
+                reservation["expires"] = time.monotonic() + 2 * config.CAPACITY_REFRESH_SECONDS
+
+    def release(self, store_id):
+        """Drop a reservation, e.g. for a store whose pipeline failed"""
+        with self._lock:
+            self._reservations.pop(store_id, None)
+
+    def _expire_reservations(self):
+        now = time.monotonic()
+        for store_id in [s for s, r in self._reservations.items() if r["expires"] and r["expires"] < now]:
+            del self._reservations[store_id]
+
+    # --- Reporting ---
+
+    def _estimate(self, free, plan_name):
+        """How many more default stores of a plan fit, up to _MAX_ESTIMATE"""
+        nodes = [dict(n) for n in free["nodes"]]
+        pods = _plan_demand(plan_name)["pods"]
+        count = 0
+        while count < _MAX_ESTIMATE and _place(nodes, pods) is not None:
+            count += 1
+        return count
+
+    def _summary(self, cluster):
+        with self._lock:
+            view = self._views.get(cluster)
+            free = self._free(cluster, view) if view and "nodes" in view else None
+            reserved = sum(1 for r in self._reservations.values() if r["cluster"] == cluster)
+        if free is None:
+            return {"cluster": cluster, "error": (view or {}).get("error") or "not read yet",
+                    "read_at": (view or {}).get("read_at")}
+        return {
+            "cluster": cluster,
+            "read_at": view["read_at"],
+            "error": view.get("last_error"),
+            "nodes": len(free["nodes"]),
+            "pending_pods": view["pending_pods"],
+            "reserved_stores": reserved,
+            "free": {
+                "cpu": round(sum(max(n["cpu"], 0) for n in free["nodes"]), 3),
+                "memory_bytes": int(sum(max(n["memory"], 0) for n in free["nodes"])),
+                "pods": sum(max(n["pods"], 0) for n in free["nodes"]),
+                "storage_bytes": {name: int(max(size, 0)) for name, size in free["storage"].items()},
+            },
+            "stores_that_fit": {name: self._estimate(free, name) for name in plans.PLANS},
+        }
+
+    def _export(self, cluster):
+        summary = self._summary(cluster)
+        if "free" not in summary:
+            return
+        free = summary["free"]
+        CLUSTER_CAPACITY_REMAINING.labels(cluster, "cpu").set(free["cpu"])
+        CLUSTER_CAPACITY_REMAINING.labels(cluster, "memory_bytes").set(free["memory_bytes"])
+        CLUSTER_CAPACITY_REMAINING.labels(cluster, "pods").set(free["pods"])
+        for name, size in free["storage_bytes"].items():
+            CLUSTER_CAPACITY_REMAINING.labels(cluster, f"storage_bytes:{name}").set(size)
+        for name, count in summary["stores_that_fit"].items():
+            CLUSTER_CAPACITY_REMAINING.labels(cluster, f"stores:{name}").set(count)
+
+    def status(self):
+        """Free capacity per cluster after running pods and reservations"""
+        return {
+            "enabled": config.CAPACITY_ADMISSION_ENABLED,
+            "headroom_percent": config.CAPACITY_HEADROOM_PERCENT,
+            "clusters": [self._summary(cluster) for cluster, _ in self.clients.items()],
+        }
@@ -0,0 +1,170 @@
+"""
+Multi-cluster store placement
+The backend can spread stores over several Kubernetes clusters, each with
+its own client. The clusters are configured as JSON:
+
+    CLUSTERS='[
+      {"name": "east", "kubeconfig": "/etc/store-factory/clusters/east", "max_stores": 500},
+      {"name": "west", "context": "kind-west", "max_stores": 300,
+       "activator_host": "store-activator.west.example.com"},
+      {"name": "old", "cordoned": true}
+    ]'
+
+An entry without `kubeconfig` and `context` uses the backend's own cluster
+(in-cluster config, or the local kubeconfig's current context); with only
+`context`, that context of the local kubeconfig. Without CLUSTERS there is
+one cluster, DEFAULT_CLUSTER, which is the backend's own. Two entries that
+resolve to the same API server are rejected at startup: each would see the
+other's namespaces, and garbage collection would treat them as leftovers.
+
+New stores are placed by PLACEMENT_POLICY and keep their cluster for life;
+every operation on a store goes to the cluster recorded on its row. Stores
+without one (created before placement) are on DEFAULT_CLUSTER. Cordoned
+clusters keep serving their stores but get no new ones. Hibernated stores
+are routed to `activator_host`, which must reach the backend's activator
+from that cluster; it defaults to ACTIVATOR_HOST on DEFAULT_CLUSTER only.
+"""
+import json
+import logging
+import os
+import threading
+
+import config
+import database
+from k8s_client import K8sClient
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CLUSTER = os.environ.get("DEFAULT_CLUSTER", "default")
+# "least_stores": fewest stores; "capacity": lowest stores / max_stores;
+# "user_affinity": where the user already has the most stores, else least_stores
+PLACEMENT_POLICY = os.environ.get("PLACEMENT_POLICY", "least_stores")
+
+placement_lock = threading.Lock()
+
+
+class ClusterError(Exception):
+    """Raised for a store on a cluster that is not configured"""
+
+
+def _load_clusters():
+    raw = os.environ.get("CLUSTERS", "").strip()
+    if not raw:
+        return {DEFAULT_CLUSTER: {"name": DEFAULT_CLUSTER, "kubeconfig": None, "context": None,
+                                  "max_stores": None, "cordoned": False, "activator_host": None}}
+    clusters = {}
+    for entry in json.loads(raw):
+        clusters[entry["name"]] = {
+            "name": entry["name"],
+            "kubeconfig": entry.get("kubeconfig"),
+            "context": entry.get("context"),
+            "max_stores": int(entry["max_stores"]) if entry.get("max_stores") else None,
+            "cordoned": bool(entry.get("cordoned", False)),
+            "activator_host": entry.get("activator_host"),
+        }
+    return clusters
+
+
+CLUSTERS = _load_clusters()
+if DEFAULT_CLUSTER not in CLUSTERS:
+    # With CLUSTERS set, stores from before placement belong to the first one unless DEFAULT_CLUSTER names another
+    DEFAULT_CLUSTER = next(iter(CLUSTERS))
+
+
+def cluster_of(store):
+    """Cluster a store (or provisioning context) lives on"""
+    return (store or {}).get("cluster") or DEFAULT_CLUSTER
+
+
+def activator_host(name):
+    """Where a hibernated store on this cluster is routed; empty if hibernation cannot reach it"""
+    cluster = CLUSTERS.get(name) or {}
+    if cluster.get("activator_host"):
+        return cluster["activator_host"]
+    return config.ACTIVATOR_HOST if name == DEFAULT_CLUSTER else ""
+
+
+class ClusterClients:
+    """One K8sClient per configured cluster"""
+
+    def __init__(self):
+        self._clients = {
+            name: K8sClient(kubeconfig=cluster["kubeconfig"], context=cluster["context"])
+            for name, cluster in CLUSTERS.items()
+        }
+        seen = {}
+        for name, k8s in self._clients.items():
+            if k8s.host in seen:
+                raise ClusterError(f"Clusters '{seen[k8s.host]}' and '{name}' both point at {k8s.host} (CLUSTERS)")
+            seen[k8s.host] = name
+        self.default = self._clients[DEFAULT_CLUSTER]
+
+    def get(self, name):
+        client = self._clients.get(name or DEFAULT_CLUSTER)
+        if client is None:
+            raise ClusterError(f"Cluster '{name}' is not configured (CLUSTERS)")
+        return client
+
+    def for_store(self, store):
+        return self.get(cluster_of(store))
+
+    def items(self):
+        return self._clients.items()
+
+
+def choose_cluster(user_id, policy=None):
+    """
+    The cluster a new store of user_id goes to, or None if every cluster is
+    full or cordoned. Call with placement_lock held until the store is
+    registered, so concurrent creates see each other's placements.
+    """
+    policy = policy or PLACEMENT_POLICY
+    counts = _store_counts(database.count_stores_by_cluster())
+    open_clusters = [name for name in CLUSTERS if _is_open(name, counts)]
+    if not open_clusters:
+        return None
+
+    if policy == "user_affinity":
+        owned = _store_counts(database.count_stores_by_cluster(user_id=user_id))
+        # Most of the user's stores first, then the emptier cluster
+        return min(open_clusters, key=lambda name: (-owned.get(name, 0), counts.get(name, 0), name))
+    if policy == "capacity":
+        def fill(name):
+            limit = CLUSTERS[name]["max_stores"]
+            return (counts.get(name, 0) / limit if limit else 0.0, counts.get(name, 0), name)
+        return min(open_clusters, key=fill)
+    return min(open_clusters, key=lambda name: (counts.get(name, 0), name))
+
+
+def accepts_stores(name):
+    """Whether a new store can go to this cluster; call with placement_lock held"""
+    return _is_open(name, _store_counts(database.count_stores_by_cluster()))
+
+
+def _is_open(name, counts):
+    cluster = CLUSTERS.get(name)
+    if cluster is None or cluster["cordoned"]:
+        return False
+    return cluster["max_stores"] is None or counts.get(name, 0) < cluster["max_stores"]
+
+
+def _store_counts(rows):
+    """Fold the rows without a cluster into DEFAULT_CLUSTER"""
+    counts = {}
+    for name, count in rows.items():
+        name = name or DEFAULT_CLUSTER
+        counts[name] = counts.get(name, 0) + count
+    return counts
+
+
+def status():
+    """Configured clusters with their store counts"""
+    counts = _store_counts(database.count_stores_by_cluster())
+    return {
+        "policy": PLACEMENT_POLICY,
+        "default": DEFAULT_CLUSTER,
+        "clusters": [
+            {**{k: v for k, v in cluster.items() if k != "kubeconfig"}, "stores": counts.get(name, 0)}
+            for name, cluster in CLUSTERS.items()
+        ],
+    }
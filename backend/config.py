@@ -0,0 +1,125 @@
+"""
+Backend configuration
+Settings are read from the environment so the Helm chart can override them
+"""
+import os
+
+
+def _env_bool(name, default):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+# Resume stores whose provisioning was interrupted by a backend restart
+RESUME_INTERRUPTED_ON_STARTUP = _env_bool("RESUME_INTERRUPTED_ON_STARTUP", True)
+
+# How long a POST /api/stores Idempotency-Key is remembered
+IDEMPOTENCY_KEY_TTL_SECONDS = int(os.environ.get("IDEMPOTENCY_KEY_TTL_SECONDS", 24 * 60 * 60))
+
+# How long the pipeline waits for the MySQL pod's readiness probe, and how often it checks
+MYSQL_READY_TIMEOUT_SECONDS = float(os.environ.get("MYSQL_READY_TIMEOUT_SECONDS", 600))
+MYSQL_READY_POLL_SECONDS = float(os.environ.get("MYSQL_READY_POLL_SECONDS", 2))
+
+# Provisioning admission control
+PROVISIONING_MAX_IN_FLIGHT = int(os.environ.get("PROVISIONING_MAX_IN_FLIGHT", 4))
+PROVISIONING_MAX_PER_USER = int(os.environ.get("PROVISIONING_MAX_PER_USER", 1))
+PROVISIONING_ADMISSION_TIMEOUT_SECONDS = float(os.environ.get("PROVISIONING_ADMISSION_TIMEOUT_SECONDS", 600))
+
+# Capacity-aware admission: new stores must fit their cluster's free node and storage capacity
+CAPACITY_ADMISSION_ENABLED = _env_bool("CAPACITY_ADMISSION_ENABLED", True)
+CAPACITY_REFRESH_SECONDS = float(os.environ.get("CAPACITY_REFRESH_SECONDS", 30))
+# Admission re-reads a cluster whose view is older than this
+CAPACITY_MAX_AGE_SECONDS = float(os.environ.get("CAPACITY_MAX_AGE_SECONDS", 60))
+# How long a store that does not fit waits for room before failing with reason "capacity"
+CAPACITY_WAIT_SECONDS = float(os.environ.get("CAPACITY_WAIT_SECONDS", 120))
+# Share of every node's allocatable CPU and memory kept free
+CAPACITY_HEADROOM_PERCENT = float(os.environ.get("CAPACITY_HEADROOM_PERCENT", 10))
+
+# Per-store ResourceQuota and LimitRange, and how often their usage is read back
+STORE_QUOTAS_ENABLED = _env_bool("STORE_QUOTAS_ENABLED", True)
+QUOTA_USAGE_INTERVAL_SECONDS = float(os.environ.get("QUOTA_USAGE_INTERVAL_SECONDS", 60))
+# Stores using more than this share of any quota resource count as near their limits
+QUOTA_NEAR_LIMIT_PERCENT = float(os.environ.get("QUOTA_NEAR_LIMIT_PERCENT", 90))
+
+# Users allowed to call /api/admin endpoints
+ADMIN_USERNAMES = {u.strip() for u in os.environ.get("ADMIN_USERNAMES", "admin").split(",") if u.strip()}
+
+# Store lifecycle event history
+EVENT_BATCH_SIZE = int(os.environ.get("EVENT_BATCH_SIZE", 50))
+EVENT_FLUSH_INTERVAL_SECONDS = float(os.environ.get("EVENT_FLUSH_INTERVAL_SECONDS", 5))
+EVENT_RETENTION_DAYS = int(os.environ.get("EVENT_RETENTION_DAYS", 30))
+EVENT_COMPACTION_INTERVAL_SECONDS = float(os.environ.get("EVENT_COMPACTION_INTERVAL_SECONDS", 3600))
+
+# Store health evaluation
+STORE_STALL_DEADLINE_SECONDS = float(os.environ.get("STORE_STALL_DEADLINE_SECONDS", 15 * 60))
+CONTAINER_RESTART_LIMIT = int(os.environ.get("CONTAINER_RESTART_LIMIT", 3))
+
+# Orphan / stuck store garbage collection
+GC_ENABLED = _env_bool("GC_ENABLED", True)
+GC_DRY_RUN = _env_bool("GC_DRY_RUN", False)
+GC_INTERVAL_SECONDS = float(os.environ.get("GC_INTERVAL_SECONDS", 300))
+# Only touch namespaces and rows that have been in their state at least this long
+GC_GRACE_SECONDS = float(os.environ.get("GC_GRACE_SECONDS", 10 * 60))
+GC_MAX_CONCURRENCY = int(os.environ.get("GC_MAX_CONCURRENCY", 4))
+GC_MAX_ACTIONS_PER_SWEEP = int(os.environ.get("GC_MAX_ACTIONS_PER_SWEEP", 50))
+
+# "dedicated" (MySQL StatefulSet per store) or "shared" (database on a SHARED_MYSQL_INSTANCES instance)
+DEFAULT_DB_MODE = os.environ.get("DEFAULT_DB_MODE", "dedicated")
+
+# Store routing: "per_store" (an Ingress in every store namespace) or "consolidated"
+# (wildcard host, routes batched into a few shared Ingress shards in INGRESS_ROUTING_NAMESPACE)
+INGRESS_MODE = os.environ.get("INGRESS_MODE", "per_store")
+INGRESS_ROUTING_NAMESPACE = os.environ.get("INGRESS_ROUTING_NAMESPACE", "store-routing")
+INGRESS_SHARDS = int(os.environ.get("INGRESS_SHARDS", 8))
+# Wildcard certificate for *.STORE_URL_SUFFIX, shared by every shard; empty disables TLS
+INGRESS_WILDCARD_TLS_SECRET = os.environ.get("INGRESS_WILDCARD_TLS_SECRET", "stores-wildcard-tls")
+INGRESS_FLUSH_INTERVAL_SECONDS = float(os.environ.get("INGRESS_FLUSH_INTERVAL_SECONDS", 5))
+
+# Hibernation: scale idle stores to zero, wake them through the activator on the next request
+HIBERNATION_ENABLED = _env_bool("HIBERNATION_ENABLED", False)
+HIBERNATION_IDLE_SECONDS = float(os.environ.get("HIBERNATION_IDLE_SECONDS", 6 * 60 * 60))
+HIBERNATION_CHECK_INTERVAL_SECONDS = float(os.environ.get("HIBERNATION_CHECK_INTERVAL_SECONDS", 300))
+HIBERNATION_MAX_PER_SWEEP = int(os.environ.get("HIBERNATION_MAX_PER_SWEEP", 20))
+HIBERNATION_WAKE_TIMEOUT_SECONDS = float(os.environ.get("HIBERNATION_WAKE_TIMEOUT_SECONDS", 300))
+# Prometheus scraping the ingress-nginx controller; per-host request counts decide what is idle
+INGRESS_METRICS_URL = os.environ.get("INGRESS_METRICS_URL", "")
+# In-cluster host of the backend's activator service (port 80), where hibernated stores are routed
+ACTIVATOR_HOST = os.environ.get("ACTIVATOR_HOST", "")
+
+# Autoscaled stores: ReadWriteMany storage class for the shared WordPress volume (required to
+# enable autoscaling), and the external metric (served by e.g. prometheus-adapter, selected by
+# host label) behind "requests" targets
+RWX_STORAGE_CLASS = os.environ.get("RWX_STORAGE_CLASS", "")
+AUTOSCALING_REQUESTS_METRIC = os.environ.get("AUTOSCALING_REQUESTS_METRIC", "store_requests_per_second")
+
+# Pre-pull DaemonSet keeping store images cached on every node
+PREPULL_ENABLED = _env_bool("PREPULL_ENABLED", True)
+PREPULL_NAMESPACE = os.environ.get("PREPULL_NAMESPACE") or os.environ.get("POD_NAMESPACE", "default")
+PREPULL_IMAGES = [name.strip() for name in os.environ.get(
+    "PREPULL_IMAGES", "mysql,wp_cli,wordpress_apache,wordpress_fpm,nginx,redis"
+).split(",") if name.strip()]
+
+# Store cloning: VolumeSnapshotClass for the source volumes (empty: the cluster default) and
+# how long to wait for the snapshots and the clone's URL/credential rewrite Job
+VOLUME_SNAPSHOT_CLASS = os.environ.get("VOLUME_SNAPSHOT_CLASS", "")
+CLONE_TIMEOUT_SECONDS = float(os.environ.get("CLONE_TIMEOUT_SECONDS", 600))
+
+# Store backups: S3-compatible bucket (an empty bucket disables backups), credentials copied
+# into store namespaces for the backup/restore Jobs, fleet-wide limit on concurrent backup
+# Jobs, and the schedule (0 disables scheduled backups; on-demand ones still work)
+BACKUP_S3_ENDPOINT = os.environ.get("BACKUP_S3_ENDPOINT", "")
+BACKUP_S3_BUCKET = os.environ.get("BACKUP_S3_BUCKET", "")
+BACKUP_S3_REGION = os.environ.get("BACKUP_S3_REGION", "us-east-1")
+# rclone S3 provider, e.g. "AWS", "Minio", "Ceph"; "Other" fits most S3-compatible stores
+BACKUP_S3_PROVIDER = os.environ.get("BACKUP_S3_PROVIDER", "Other")
+BACKUP_S3_ACCESS_KEY = os.environ.get("BACKUP_S3_ACCESS_KEY", "")
+BACKUP_S3_SECRET_KEY = os.environ.get("BACKUP_S3_SECRET_KEY", "")
+BACKUP_MAX_CONCURRENT = int(os.environ.get("BACKUP_MAX_CONCURRENT", 3))
+BACKUP_INTERVAL_SECONDS = float(os.environ.get("BACKUP_INTERVAL_SECONDS", 24 * 60 * 60))
+BACKUP_DISPATCH_INTERVAL_SECONDS = float(os.environ.get("BACKUP_DISPATCH_INTERVAL_SECONDS", 30))
+BACKUP_TIMEOUT_SECONDS = int(os.environ.get("BACKUP_TIMEOUT_SECONDS", 60 * 60))
+
+# WordPress runtime for new stores: "apache" (mod_php) or "fpm" (PHP-FPM behind nginx)
+DEFAULT_WORDPRESS_RUNTIME = os.environ.get("DEFAULT_WORDPRESS_RUNTIME", "apache")
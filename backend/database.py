@@ -1,6 +1,30 @@
-from models import db, User, Store
-from sqlalchemy import func
+from models import db, User, Store, ProvisioningStep, IdempotencyKey, StoreEvent, StoreEventRollup, Backup
+from sqlalchemy import func, inspect, insert, or_, text
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime, timedelta
+from tracing import current_trace_id, traced
+import config
+import json
+import plans
+import logging
+import threading
 
+logger = logging.getLogger(__name__)
+
+# Lifecycle events waiting for the next batched insert
+_event_buffer = []
+_event_lock = threading.Lock()
+
+# Status transitions each lifecycle duration is measured between
+LIFECYCLE_SPANS = {
+    'provisioning': ('initialized', 'ready'),
+    'deletion': ('deleted', 'removed'),
+}
+
+# A store coming back to ready from hibernation or a restore has not been provisioned again
+_RESUMED_FROM = ('waking', 'restoring')
+
+@traced()
 def init_db(app, use_seed_data=False):
     """
     Initialize the database
@@ -12,6 +36,7 @@ def init_db(app, use_seed_data=False):
     """
     with app.app_context():
         db.create_all()
+        _add_missing_columns()
 
         # Create default users if none exist
         if User.query.count() == 0:
@@ -27,6 +52,26 @@ def init_db(app, use_seed_data=False):
                 print("Initializing default users...")
                 _create_basic_users()
 
+def _add_missing_columns():
+    """
+    Add columns introduced after a table was first created.
+    db.create_all() only creates missing tables, so existing SQLite files
+    would otherwise fail on every query touching a new column.
+    """
+    inspector = inspect(db.engine)
+    existing_tables = inspector.get_table_names()
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = {c['name'] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            column_type = column.type.compile(dialect=db.engine.dialect)
+            db.session.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+            logger.info(f"Added column {table.name}.{column.name}")
+    db.session.commit()
+
 def _create_basic_users():
     """Create basic admin and demo users"""
     admin = User(username='admin', max_stores=6, max_storage_gi=12)
@@ -38,24 +83,40 @@ def _create_basic_users():
     db.session.add_all([admin, demo])
     db.session.commit()
 
+@traced()
 def get_user(user_id):
     user = db.session.get(User, user_id)
     if user:
         return user.to_dict()
     return None
 
+@traced()
 def get_user_usage(user_id):
     result = db.session.query(
         func.count(Store.id).label('store_count'),
         func.sum(Store.storage_size_gi).label('total_storage')
     ).filter(Store.user_id == user_id).first()
     
+    plan_counts = db.session.query(Store.plan, func.count(Store.id)).filter(Store.user_id == user_id).group_by(Store.plan)
+
     return {
         'store_count': result.store_count or 0,
-        'total_storage': result.total_storage or 0
+        'total_storage': result.total_storage or 0,
+        'plan_units': sum(plans.plan_units(plan) * count for plan, count in plan_counts)
     }
 
-def register_store(store_id, user_id, storage_size_gi, name="", status="initialized", store_url=None, admin_password=None):
+@traced()
+def get_store(store_id):
+    store = db.session.get(Store, store_id)
+    if store:
+        return store.to_dict()
+    return None
+
+@traced()
+def register_store(store_id, user_id, storage_size_gi, name="", status="initialized", store_url=None, admin_password=None,
+                   sample_products=None, wordpress_storage_gi=None, plan=None, db_mode=None, db_instance=None,
+                   db_password=None, object_cache=None, runtime=None, ingress_mode=None, autoscaling=None,
+                   cloned_from=None, cluster=None):
     """Register a new store in the database"""
     store = Store(
         id=store_id,
@@ -64,30 +125,440 @@ def register_store(store_id, user_id, storage_size_gi, name="", status="initiali
         name=name,
         status=status,
         store_url=store_url,
-        admin_password=admin_password
+        admin_password=admin_password,
+        sample_products=sample_products,
+        wordpress_storage_gi=wordpress_storage_gi,
+        plan=plan,
+        db_mode=db_mode,
+        db_instance=db_instance,
+        db_password=db_password,
+        object_cache=object_cache,
+        runtime=runtime,
+        ingress_mode=ingress_mode,
+        autoscaling=autoscaling,
+        cloned_from=cloned_from,
+        cluster=cluster,
+        trace_id=current_trace_id(),
+        status_changed_at=datetime.utcnow()
     )
     db.session.add(store)
     db.session.commit()
+    _record_store_event(store_id, user_id, None, status)
+
+@traced()
+def update_store_storage(store_id, storage_size_gi, wordpress_storage_gi):
+    """Record resized volumes; storage_size_gi is what counts against max_storage_gi"""
+    store = db.session.get(Store, store_id)
+    if store:
+        store.storage_size_gi = storage_size_gi
+        store.wordpress_storage_gi = wordpress_storage_gi
+        db.session.commit()
 
-def update_store_status(store_id, status):
-    """Update the status of a store"""
+@traced()
+def update_store_status(store_id, status, reason=None):
+    """Update the status of a store; reason explains a failure and is cleared otherwise"""
     store = db.session.get(Store, store_id)
     if store:
+        previous = store.status
         store.status = status
+        store.failure_reason = reason
+        if previous != status:
+            store.status_changed_at = datetime.utcnow()
         db.session.commit()
+        if previous != status:
+            _record_store_event(store_id, store.user_id, previous, status)
         return True
     return False
 
+@traced()
 def deregister_store(store_id):
     store = db.session.get(Store, store_id)
     if store:
+        previous, user_id = store.status, store.user_id
         db.session.delete(store)
         db.session.commit()
+        _record_store_event(store_id, user_id, previous, 'removed')
+
+@traced()
+def init_provisioning_steps(store_id, steps):
+    """Journal every provisioning step of a store as pending"""
+    existing = {row.step for row in ProvisioningStep.query.filter_by(store_id=store_id)}
+    for position, step in enumerate(steps):
+        if step not in existing:
+            db.session.add(ProvisioningStep(store_id=store_id, step=step, position=position))
+    db.session.commit()
+
+@traced()
+def get_provisioning_steps(store_id):
+    """Get the provisioning journal of a store, in pipeline order"""
+    rows = ProvisioningStep.query.filter_by(store_id=store_id).order_by(ProvisioningStep.position).all()
+    return [row.to_dict() for row in rows]
+
+@traced()
+def start_provisioning_step(store_id, step):
+    """Mark a journaled step as running"""
+    row = ProvisioningStep.query.filter_by(store_id=store_id, step=step).first()
+    if not row:
+        row = ProvisioningStep(store_id=store_id, step=step)
+        db.session.add(row)
+    row.state = 'running'
+    row.attempts = (row.attempts or 0) + 1
+    row.error = None
+    row.started_at = datetime.utcnow()
+    row.finished_at = None
+    db.session.commit()
+
+@traced()
+def finish_provisioning_step(store_id, step, state, error=None):
+    """Record the outcome (done or failed) of a journaled step"""
+    row = ProvisioningStep.query.filter_by(store_id=store_id, step=step).first()
+    if row:
+        row.state = state
+        row.error = error
+        row.finished_at = datetime.utcnow()
+        db.session.commit()
+
+@traced()
+def get_interrupted_store_ids():
+    """Stores still initializing/queued/provisioning whose journal has unfinished steps"""
+    stores = Store.query.filter(
+        Store.status.in_(['initialized', 'queued', 'provisioning']),
+        Store.steps.any(ProvisioningStep.state != 'done')
+    ).all()
+    return [s.id for s in stores]
+
+@traced()
+def claim_idempotency_key(user_id, key, fingerprint, ttl_seconds):
+    """
+    Claim an idempotency key for a new request.
+    Returns None if the key was free (and is now in progress), otherwise the
+    existing record as a dict.
+    """
+    now = datetime.utcnow()
+    IdempotencyKey.query.filter(IdempotencyKey.expires_at < now).delete(synchronize_session=False)
+    db.session.commit()
+
+    existing = IdempotencyKey.query.filter_by(user_id=user_id, key=key).first()
+    if existing:
+        return existing.to_dict()
+
+    db.session.add(IdempotencyKey(
+        user_id=user_id,
+        key=key,
+        fingerprint=fingerprint,
+        status='in_progress',
+        created_at=now,
+        expires_at=now + timedelta(seconds=ttl_seconds)
+    ))
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # A concurrent request claimed the same key first
+        db.session.rollback()
+        return IdempotencyKey.query.filter_by(user_id=user_id, key=key).first().to_dict()
+    return None
+
+@traced()
+def attach_idempotency_store(user_id, key, store_id):
+    """Link an in-progress key to the store it is creating"""
+    record = IdempotencyKey.query.filter_by(user_id=user_id, key=key).first()
+    if record:
+        record.store_id = store_id
+        db.session.commit()
+
+@traced()
+def complete_idempotency_key(user_id, key, response_code, response_body):
+    """Store the final response for replay"""
+    record = IdempotencyKey.query.filter_by(user_id=user_id, key=key).first()
+    if record:
+        record.status = 'completed'
+        record.response_code = response_code
+        record.response_body = response_body
+        db.session.commit()
+
+@traced()
+def release_idempotency_key(user_id, key):
+    """Forget a key whose request never produced a response, so it can be retried"""
+    IdempotencyKey.query.filter_by(user_id=user_id, key=key).delete(synchronize_session=False)
+    db.session.commit()
+
+@traced()
+def count_stores_by_status():
+    rows = db.session.query(Store.status, func.count(Store.id)).group_by(Store.status).all()
+    return {status: count for status, count in rows}
+
+@traced()
+def count_stores_by_db_instance():
+    """Number of stores placed on each shared MySQL instance"""
+    rows = db.session.query(Store.db_instance, func.count(Store.id)).filter(
+        Store.db_instance.isnot(None)
+    ).group_by(Store.db_instance).all()
+    return dict(rows)
+
+@traced()
+def count_stores_by_cluster(user_id=None):
+    """Number of stores on each cluster (None for stores from before placement), optionally of one user"""
+    query = db.session.query(Store.cluster, func.count(Store.id))
+    if user_id is not None:
+        query = query.filter(Store.user_id == user_id)
+    return dict(query.group_by(Store.cluster).all())
+
+@traced()
+def get_consolidated_routes():
+    """(store id, host) of every live store routed through the shared ingress shards"""
+    rows = db.session.query(Store.id, Store.store_url).filter(
+        Store.ingress_mode == 'consolidated', Store.status != 'deleted'
+    ).all()
+    return [(store_id, store_url or f"store-{store_id}.local") for store_id, store_url in rows]
+
+@traced()
+def touch_stores_by_host(hosts, at=None):
+    """Record traffic for the stores serving these hosts"""
+    if not hosts:
+        return 0
+    updated = Store.query.filter(Store.store_url.in_(list(hosts))).update(
+        {Store.last_request_at: at or datetime.utcnow()}, synchronize_session=False
+    )
+    db.session.commit()
+    return updated
+
+@traced()
+def touch_store(store_id, at=None):
+    store = db.session.get(Store, store_id)
+    if store:
+        store.last_request_at = at or datetime.utcnow()
+        db.session.commit()
+
+@traced()
+def set_store_admission_wait(store_id, seconds):
+    store = db.session.get(Store, store_id)
+    if store:
+        store.admission_wait_seconds = seconds
+        db.session.commit()
+
+@traced()
+def set_store_hibernated_at(store_id, at):
+    store = db.session.get(Store, store_id)
+    if store:
+        store.hibernated_at = at
+        db.session.commit()
+
+@traced()
+def get_idle_store_ids(cutoff, limit, exclude_clusters=()):
+    """Ready stores without traffic (or, never visited, without a status change) since cutoff, idlest first"""
+    last_seen = func.coalesce(Store.last_request_at, Store.status_changed_at, Store.created_at)
+    query = db.session.query(Store.id).filter(Store.status == 'ready', last_seen < cutoff)
+    if exclude_clusters:
+        # NULL is the default cluster, which is never excluded
+        query = query.filter(or_(Store.cluster.is_(None), Store.cluster.notin_(exclude_clusters)))
+    rows = query.order_by(last_seen).limit(limit).all()
+    return [store_id for store_id, in rows]
+
+@traced()
+def create_backup(store, kind='manual'):
+    """Queue a backup of a store; the dispatcher starts it when a slot is free"""
+    backup = Backup(
+        store_id=store['id'],
+        user_id=store['user_id'],
+        kind=kind,
+        status='pending',
+        store_url=store.get('store_url'),
+        plan=store.get('plan'),
+        runtime=store.get('runtime'),
+        wordpress_storage_gi=store.get('wordpress_storage_gi'),
+    )
+    db.session.add(backup)
+    db.session.commit()
+    return backup.to_dict()
+
+@traced()
+def get_backup(backup_id):
+    backup = db.session.get(Backup, backup_id)
+    return backup.to_dict() if backup else None
+
+@traced()
+def list_backups(store_id, limit=50):
+    rows = Backup.query.filter_by(store_id=store_id).order_by(Backup.created_at.desc()).limit(limit).all()
+    return [b.to_dict() for b in rows]
+
+@traced()
+def get_backups_by_status(status, limit=None):
+    """Backups in a status, oldest first"""
+    query = Backup.query.filter_by(status=status).order_by(Backup.created_at)
+    if limit is not None:
+        query = query.limit(limit)
+    return [b.to_dict() for b in query.all()]
+
+@traced()
+def count_backups_by_status():
+    return dict(db.session.query(Backup.status, func.count(Backup.id)).group_by(Backup.status).all())
+
+@traced()
+def update_backup(backup_id, **fields):
+    backup = db.session.get(Backup, backup_id)
+    if backup:
+        for name, value in fields.items():
+            setattr(backup, name, value)
+        db.session.commit()
+
+@traced()
+def get_stores_due_for_backup(cutoff, limit):
+    """Ready stores without a backup queued, running or succeeded since cutoff, least recently backed up first"""
+    recent = db.session.query(Backup.store_id).filter(
+        Backup.created_at >= cutoff, Backup.status != 'failed'
+    )
+    last_backup = db.session.query(Backup.store_id, func.max(Backup.created_at).label('at')) \
+        .group_by(Backup.store_id).subquery()
+    rows = db.session.query(Store.id).outerjoin(last_backup, last_backup.c.store_id == Store.id).filter(
+        Store.status == 'ready', Store.id.notin_(recent)
+    ).order_by(last_backup.c.at.is_(None).desc(), last_backup.c.at).limit(limit).all()
+    return [store_id for store_id, in rows]
+
+@traced()
+def update_store_quota_usage(usage_by_store, at=None):
+    """Record quota usage read back from each store's ResourceQuota: {store_id: (usage, utilization)}"""
+    at = at or datetime.utcnow()
+    stores = db.session.query(Store).filter(Store.id.in_(list(usage_by_store))).all() if usage_by_store else []
+    for store in stores:
+        usage, utilization = usage_by_store[store.id]
+        store.quota_usage = json.dumps(usage)
+        store.quota_utilization = utilization
+        store.quota_checked_at = at
+    db.session.commit()
+    return len(stores)
+
+@traced()
+def get_stores_near_quota(threshold, limit=100):
+    """Stores whose highest quota utilization is at least threshold, fullest first"""
+    rows = db.session.query(Store).filter(Store.quota_utilization >= threshold).order_by(
+        Store.quota_utilization.desc()
+    ).limit(limit).all()
+    return [store.to_dict() for store in rows]
+
+@traced()
+def get_store_ids_by_status(status):
+    return [store_id for store_id, in db.session.query(Store.id).filter(Store.status == status).all()]
+
+def _record_store_event(store_id, user_id, from_status, to_status):
+    """Buffer a status transition; written in batches by flush_store_events()"""
+    with _event_lock:
+        _event_buffer.append({
+            'store_id': store_id,
+            'user_id': user_id,
+            'from_status': from_status,
+            'to_status': to_status,
+            'created_at': datetime.utcnow()
+        })
+        full = len(_event_buffer) >= config.EVENT_BATCH_SIZE
+    if full:
+        flush_store_events()
+
+@traced()
+def flush_store_events():
+    """Insert all buffered lifecycle events in one statement"""
+    with _event_lock:
+        batch = list(_event_buffer)
+        _event_buffer.clear()
+    if batch:
+        db.session.execute(insert(StoreEvent), batch)
+        db.session.commit()
+    return len(batch)
+
+@traced()
+def get_lifecycle_durations(kind, since, until, exclude_store_ids=None):
+    """
+    Durations (seconds) of one lifecycle span for stores that finished it in [since, until).
+    Both lookups are range/equality scans on indexed columns.
+    """
+    start_status, end_status = LIFECYCLE_SPANS[kind]
+    query = db.session.query(StoreEvent.store_id, func.min(StoreEvent.created_at)).filter(
+        StoreEvent.to_status == end_status,
+        StoreEvent.from_status.notin_(_RESUMED_FROM),
+        StoreEvent.created_at >= since,
+        StoreEvent.created_at < until
+    )
+    if exclude_store_ids is not None:
+        query = query.filter(StoreEvent.store_id.notin_(exclude_store_ids))
+    ends = query.group_by(StoreEvent.store_id).all()
+    if not ends:
+        return []
+
+    end_times = dict(ends)
+    starts = db.session.query(StoreEvent.store_id, func.min(StoreEvent.created_at)).filter(
+        StoreEvent.to_status == start_status,
+        StoreEvent.store_id.in_(list(end_times))
+    ).group_by(StoreEvent.store_id).all()
+
+    durations = []
+    for store_id, started in starts:
+        finished = end_times[store_id]
+        if started <= finished:
+            durations.append((finished - started).total_seconds())
+    return durations
+
+@traced()
+def get_event_rollups(kind, since, until):
+    """Daily rollups of one lifecycle span between two dates"""
+    rows = StoreEventRollup.query.filter(
+        StoreEventRollup.kind == kind,
+        StoreEventRollup.day >= since.date(),
+        StoreEventRollup.day < until.date()
+    ).all()
+    return [{'day': r.day, 'count': r.count, 'total_seconds': r.total_seconds, 'buckets': json.loads(r.buckets)}
+            for r in rows]
+
+@traced()
+def compact_store_events(cutoff, bucket_bounds):
+    """
+    Fold lifecycle durations that finished before cutoff into daily histogram
+    rollups, then delete the raw events.
+    """
+    # Keep whole histories of stores still mid-transition or with events after the cutoff;
+    # their durations are rolled up once all their events are old enough
+    in_flight = db.session.query(Store.id).filter(Store.status.in_(['initialized', 'queued', 'provisioning', 'deleted']))
+    recent = db.session.query(StoreEvent.store_id).filter(StoreEvent.created_at >= cutoff)
+    keep = in_flight.union(recent)
+    oldest = db.session.query(func.min(StoreEvent.created_at)).filter(
+        StoreEvent.store_id.notin_(keep)
+    ).scalar()
+    if oldest is None or oldest >= cutoff:
+        return 0
+
+    day = datetime(oldest.year, oldest.month, oldest.day)
+    while day < cutoff:
+        day_end = min(day + timedelta(days=1), cutoff)
+        for kind in LIFECYCLE_SPANS:
+            durations = get_lifecycle_durations(kind, day, day_end, exclude_store_ids=keep)
+            if durations:
+                _merge_rollup(day.date(), kind, durations, bucket_bounds)
+        day += timedelta(days=1)
+
+    deleted = StoreEvent.query.filter(
+        StoreEvent.created_at < cutoff,
+        StoreEvent.store_id.notin_(keep)
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    return deleted
+
+def _merge_rollup(day, kind, durations, bucket_bounds):
+    rollup = StoreEventRollup.query.filter_by(day=day, kind=kind).first()
+    if not rollup:
+        rollup = StoreEventRollup(day=day, kind=kind, count=0, total_seconds=0.0, buckets='{}')
+        db.session.add(rollup)
+    buckets = json.loads(rollup.buckets)
+    for seconds in durations:
+        bound = next((b for b in bucket_bounds if seconds <= b), 'inf')
+        buckets[str(bound)] = buckets.get(str(bound), 0) + 1
+    rollup.buckets = json.dumps(buckets)
+    rollup.count += len(durations)
+    rollup.total_seconds += sum(durations)
 
+@traced()
 def get_all_users():
     users = User.query.all()
     return [u.to_dict() for u in users]
 
+@traced()
 def get_all_stores_with_users():
     stores = Store.query.options(db.joinedload(Store.user)).all()
     result = {}
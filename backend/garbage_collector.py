@@ -0,0 +1,246 @@
+"""
+Orphan and stuck-store garbage collection
+One sweep diffs the managed store namespaces against the stores table in a
+single bulk pass (one namespace list per cluster, one store query) and plans
+a repair or reclaim for every mismatch:
+
+    orphan_namespace    labeled namespace with no store row      -> delete namespace
+    stuck_deletion      row left in "deleted" by a failed delete -> retry delete / drop row
+    stuck_provisioning  row in "initialized"/"queued"/"provisioning" that
+                        no pipeline in this process is working on -> resume / re-check pods
+    missing_namespace   "ready" row whose namespace is gone      -> mark failed
+
+A store's namespace on a cluster the store is not placed on, and stores on a
+cluster that is no longer configured, are only reported (as skipped): their
+data may be live, so an operator decides. Anything younger than
+GC_GRACE_SECONDS is left alone, so in-progress creates and deletes are
+never raced. Actions run on a small thread pool; a dry run
+only returns the plan.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from flask import current_app
+
+import clusters
+import config
+import database
+from metrics import GC_ACTIONS
+from structured_logging import log_context
+from tracing import start_span
+
+logger = logging.getLogger(__name__)
+
+
+class SweepInProgress(Exception):
+    """Raised when a sweep is requested while another one is still running"""
+
+
+class GarbageCollector:
+    def __init__(self, store_manager, grace_seconds=None, max_concurrency=None, max_actions=None):
+        self.store_manager = store_manager
+        self.grace_seconds = config.GC_GRACE_SECONDS if grace_seconds is None else grace_seconds
+        self.max_concurrency = max_concurrency or config.GC_MAX_CONCURRENCY
+        self.max_actions = max_actions or config.GC_MAX_ACTIONS_PER_SWEEP
+        self._sweep_lock = threading.Lock()
+        self.last_report = None
+
+    def sweep(self, dry_run=False):
+        """Find mismatches and (unless dry_run) repair them; returns a report"""
+        if not self._sweep_lock.acquire(blocking=False):
+            raise SweepInProgress("A garbage collection sweep is already running")
+        try:
+            with start_span("gc.sweep", dry_run=dry_run) as span:
+                started = time.perf_counter()
+                report = self._sweep(dry_run)
+                report["duration_ms"] = round((time.perf_counter() - started) * 1000)
+                span.set_attribute("actions", len(report["actions"]))
+            if not dry_run:
+                self.last_report = report
+            return report
+        finally:
+            self._sweep_lock.release()
+
+    def run_periodic_sweep(self):
+        """Entry point for the background scheduler"""
+        report = self.sweep(dry_run=config.GC_DRY_RUN)
+        if report["actions"]:
+            logger.info(f"GC sweep planned {len(report['actions'])} actions: {report['summary']}",
+                        extra={"duration_ms": report["duration_ms"]})
+
+    def _sweep(self, dry_run):
+        report = {
+            "dry_run": dry_run,
+            "started_at": datetime.utcnow().isoformat(),
+            "actions": [],
+            "skipped": [],
+            "summary": {},
+        }
+        plan = self.plan()
+        if plan is None:
+            report["error"] = "Could not list store namespaces; nothing was changed"
+            return report
+
+        if len(plan["actions"]) > self.max_actions:
+            # Leave the rest for the next sweep rather than reclaiming a whole fleet at once
+            report["deferred"] = len(plan["actions"]) - self.max_actions
+            plan["actions"] = plan["actions"][:self.max_actions]
+        report["skipped"] = plan["skipped"]
+
+        if dry_run:
+            report["actions"] = [{**action, "result": "planned"} for action in plan["actions"]]
+        else:
+            report["actions"] = self._execute(plan["actions"])
+
+        for action in report["actions"]:
+            report["summary"][action["kind"]] = report["summary"].get(action["kind"], 0) + 1
+        return report
+
+    def plan(self):
+        """Diff namespaces against store rows; returns {"actions", "skipped"} or None if Kubernetes is unreachable"""
+        namespaces = {}
+        for cluster, k8s in self.store_manager.clusters.items():
+            listed = k8s.list_store_namespace_info()
+            if listed is None:
+                return None
+            namespaces.update({(cluster, ns["name"]): ns for ns in listed})
+        stores = database.get_all_stores_with_users()
+        interrupted = set(database.get_interrupted_store_ids())
+        in_flight = self.store_manager.in_flight_store_ids()
+        now = datetime.utcnow()
+
+        actions, skipped = [], []
+
+        def add(kind, action, store_id, namespace, reason, cluster):
+            actions.append({"kind": kind, "action": action, "store_id": store_id,
+                            "namespace": namespace, "cluster": cluster, "reason": reason})
+
+        for (cluster, name), ns in namespaces.items():
+            store_id = name.replace("store-", "", 1)
+            if store_id in stores:
+                placed = clusters.cluster_of(stores[store_id])
+                if placed != cluster:
+                    skipped.append({"store_id": store_id, "namespace": name, "cluster": cluster,
+                                    "reason": f"store is placed on cluster {placed}; not deleted automatically"})
+                continue
+            if ns["phase"] == "Terminating":
+                skipped.append({"namespace": name, "cluster": cluster, "reason": "orphan namespace already terminating"})
+                continue
+            age = _age_seconds(ns["created_at"], now)
+            if age is not None and age < self.grace_seconds:
+                skipped.append({"namespace": name, "cluster": cluster, "reason": f"orphan namespace only {age:.0f}s old"})
+                continue
+            add("orphan_namespace", "delete_namespace", None, name, "namespace has no store record", cluster)
+
+        unknown = []
+        for store_id, store in stores.items():
+            name = f"store-{store_id}"
+            cluster = clusters.cluster_of(store)
+            if cluster not in clusters.CLUSTERS:
+                unknown.append(store_id)
+                skipped.append({"store_id": store_id, "namespace": name, "cluster": cluster,
+                                "reason": f"cluster {cluster} is not configured (CLUSTERS)"})
+                continue
+            ns = namespaces.get((cluster, name))
+            status = store.get("status")
+            if store_id in in_flight:
+                continue
+            age = _age_seconds(store.get("status_changed_at") or store.get("created_at"), now)
+            if age is not None and age < self.grace_seconds:
+                continue
+            since = f"{status} for {age:.0f}s" if age is not None else status
+
+            if status == "deleted":
+                if ns is None:
+                    add("stuck_deletion", "deregister", store_id, name, f"{since}, namespace already gone", cluster)
+                elif ns["phase"] == "Terminating":
+                    skipped.append({"store_id": store_id, "namespace": name, "cluster": cluster,
+                                    "reason": "namespace still terminating"})
+                else:
+                    add("stuck_deletion", "retry_delete", store_id, name, f"{since}, namespace still exists", cluster)
+            elif status in ("initialized", "queued") or (status == "provisioning" and store_id in interrupted):
+                add("stuck_provisioning", "resume", store_id, name, f"{since} with unfinished steps", cluster)
+            elif status == "provisioning":
+                add("stuck_provisioning", "refresh_status", store_id, name, f"{since} waiting for pods", cluster)
+            elif status == "ready" and ns is None:
+                add("missing_namespace", "mark_failed", store_id, name, "store is ready but its namespace is gone",
+                    cluster)
+
+        if unknown:
+            logger.warning(f"GC skipped {len(unknown)} stores on clusters that are not configured: "
+                           f"{', '.join(sorted(unknown)[:20])}")
+        return {"actions": actions, "skipped": skipped}
+
+    def _execute(self, actions):
+        """Run actions with bounded concurrency, each in its own app context"""
+        if not actions:
+            return []
+        app = current_app._get_current_object()
+
+        def run(action):
+            with app.app_context(), log_context(store_id=action["store_id"], namespace=action["namespace"]):
+                try:
+                    result = self._apply(action)
+                except Exception as e:
+                    logger.exception(f"GC {action['action']} failed: {e}")
+                    result = f"error: {e}"
+                outcome = "error" if result.startswith(("error", "failed")) else "ok"
+                GC_ACTIONS.labels(action["kind"], outcome).inc()
+                logger.info(f"GC {action['kind']}: {action['action']} -> {result}",
+                            extra={"status": action["kind"]})
+                return {**action, "result": result}
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="gc") as pool:
+            return list(pool.map(run, actions))
+
+    def _apply(self, action):
+        store_id, namespace = action["store_id"], action["namespace"]
+        k8s = self.store_manager.clusters.get(action["cluster"])
+        with start_span(f"gc.{action['action']}", store_id=store_id, namespace=namespace):
+            if action["action"] == "delete_namespace":
+                return "deleted" if k8s.delete_namespace(namespace) else "failed: namespace delete rejected"
+
+            if action["action"] == "deregister":
+                if not self.store_manager.deregister_store(store_id):
+                    return "failed: could not release shared database"
+                return "deregistered"
+
+            if action["action"] == "retry_delete":
+                if not k8s.delete_namespace(namespace):
+                    return "failed: namespace delete rejected"
+                if not self.store_manager.deregister_store(store_id):
+                    return "failed: could not release shared database"
+                return "deleted"
+
+            if action["action"] == "resume":
+                # Queues the pipeline in its own thread, bounded by provisioning admission control
+                result = self.store_manager.resume_store(store_id)
+                if "error" in result:
+                    return f"failed: {result['error']}"
+                return "resume queued"
+
+            if action["action"] == "refresh_status":
+                store = database.get_store(store_id)
+                if not store or store["status"] != "provisioning":
+                    return "skipped: status changed"
+                return f"status {self.store_manager.refresh_provisioning_status(store)}"
+
+            if action["action"] == "mark_failed":
+                database.update_store_status(store_id, "failed", reason="namespace_missing: store namespace was deleted outside the platform")
+                return "marked failed"
+
+        return f"error: unknown action {action['action']}"
+
+
+def _age_seconds(timestamp, now):
+    """Seconds since an ISO string (naive UTC, as stored) or a tz-aware datetime (from Kubernetes)"""
+    if not timestamp:
+        return None
+    if isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(timestamp)
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return (now - timestamp).total_seconds()
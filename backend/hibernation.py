@@ -0,0 +1,274 @@
+"""
+Scale-to-zero hibernation for idle stores
+A periodic sweep reads per-host request counts from the ingress controller's
+metrics (nginx_ingress_controller_requests, via INGRESS_METRICS_URL), records
+traffic on the stores table, and hibernates ready stores that have been idle
+for HIBERNATION_IDLE_SECONDS:
+
+    hibernate   route the store's host to the activator, then scale WordPress,
+                a dedicated Redis and a dedicated MySQL to zero (volumes stay)
+    wake        scale back up, wait for WordPress to be ready, route the host
+                back to WordPress
+
+The activator is this backend, reached through ACTIVATOR_HOST: a request for
+a hibernated store's host starts a wake and gets a short "waking up" page that
+refreshes until the store answers again.
+"""
+import json
+import logging
+import re
+import threading
+import time
+import urllib.parse
+import urllib.request
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+import clusters
+import config
+import database
+from background import run_in_background
+from metrics import HIBERNATION_TRANSITIONS, STORE_WAKE_SECONDS
+from structured_logging import log_context
+from templates.ingress import get_activator_service, get_ingress, route_service_name
+from tracing import start_span
+
+logger = logging.getLogger(__name__)
+
+_STORE_HOST = re.compile(r"^store-([0-9a-f]{8})\.")
+_WAKE_POLL_SECONDS = 3
+
+WAKING_PAGE = """<!doctype html>
+<html><head><meta charset="utf-8"><meta http-equiv="refresh" content="5">
+<title>Waking up</title></head>
+<body style="font-family: sans-serif; text-align: center; padding-top: 15vh">
+<h1>This store is waking up</h1><p>It was idle and is starting again. This page reloads automatically.</p>
+</body></html>
+"""
+
+
+def store_id_from_host(host):
+    """Store id for a store host (store-<id>.<suffix>), None for any other host"""
+    match = _STORE_HOST.match(host or "")
+    return match.group(1) if match else None
+
+
+class Hibernator:
+    def __init__(self, store_manager):
+        self.store_manager = store_manager
+        # Stores with a hibernate or wake running in this process
+        self._transitions = set()
+        self._transitions_lock = threading.Lock()
+        self.last_sweep = None
+
+    def is_available(self):
+        return bool(config.ACTIVATOR_HOST)
+
+    def _claim(self, store_id):
+        with self._transitions_lock:
+            if store_id in self._transitions:
+                return False
+            self._transitions.add(store_id)
+            return True
+
+    def _release(self, store_id):
+        with self._transitions_lock:
+            self._transitions.discard(store_id)
+
+    def run_periodic_sweep(self):
+        """Entry point for the background scheduler"""
+        report = self.sweep()
+        if report and report["hibernated"]:
+            logger.info(f"Hibernated {len(report['hibernated'])} idle stores")
+
+    def sweep(self):
+        """Record ingress traffic, then hibernate stores idle for longer than the idle period"""
+        if not self.is_available() or not config.INGRESS_METRICS_URL:
+            return None
+        with start_span("hibernation.sweep"):
+            # Look back over two check intervals so a late scrape is not missed
+            window = int(config.HIBERNATION_CHECK_INTERVAL_SECONDS * 2)
+            counts = self._request_counts(window)
+            if counts is None:
+                # Never hibernate on missing data
+                return None
+            active = [host for host, count in counts.items() if count > 0]
+            touched = database.touch_stores_by_host(active)
+
+            cutoff = datetime.utcnow() - timedelta(seconds=config.HIBERNATION_IDLE_SECONDS)
+            hibernated, failed = [], []
+            unreachable = [name for name in clusters.CLUSTERS if not clusters.activator_host(name)]
+            for store_id in database.get_idle_store_ids(cutoff, config.HIBERNATION_MAX_PER_SWEEP, unreachable):
+                result = self.hibernate(store_id)
+                (failed if "error" in result else hibernated).append(store_id)
+
+            self.last_sweep = {
+                "at": datetime.utcnow().isoformat(),
+                "active_hosts": len(active),
+                "stores_touched": touched,
+                "hibernated": hibernated,
+                "failed": failed,
+            }
+            return self.last_sweep
+
+    def _request_counts(self, window_seconds):
+        """{host: requests in the window} from the ingress controller metrics, or None if unavailable"""
+        query = f"sum by (host) (increase(nginx_ingress_controller_requests[{window_seconds}s]))"
+        url = f"{config.INGRESS_METRICS_URL.rstrip('/')}/api/v1/query?{urllib.parse.urlencode({'query': query})}"
+        try:
+            with urllib.request.urlopen(url, timeout=10) as response:
+                body = json.load(response)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read ingress request metrics: {e}")
+            return None
+        if body.get("status") != "success":
+            logger.warning(f"Ingress metrics query failed: {body.get('error')}")
+            return None
+        return {
+            sample["metric"].get("host"): float(sample["value"][1])
+            for sample in body["data"]["result"]
+            if sample["metric"].get("host")
+        }
+
+    def hibernate(self, store_id, user_id=None):
+        """Route a ready store to the activator and scale it to zero"""
+        if not self.is_available():
+            return {"error": "Hibernation is not configured (ACTIVATOR_HOST)"}
+        if not self._claim(store_id):
+            return {"error": "Store is already hibernating or waking"}
+        try:
+            with log_context(store_id=store_id), start_span("hibernation.hibernate", store_id=store_id):
+                store = database.get_store(store_id)
+                if not store:
+                    return {"error": "Store not found"}
+                if user_id and str(store["user_id"]) != str(user_id):
+                    return {"error": "Unauthorized: You do not own this store"}
+                if store["status"] != "ready":
+                    return {"error": f"Store is {store['status']}; only ready stores can hibernate"}
+                if not clusters.activator_host(clusters.cluster_of(store)):
+                    return {"error": f"Hibernation is not configured on cluster '{clusters.cluster_of(store)}' "
+                                     f"(activator_host)"}
+
+                # Route first, so requests arriving during scale-down reach the activator
+                if not self._route_to_activator(store):
+                    HIBERNATION_TRANSITIONS.labels("hibernate", "error").inc()
+                    return {"error": "Failed to route store to the activator"}
+                if not self._scale(store, 0):
+                    self._route_to_store(store)
+                    self._scale(store, 1)
+                    HIBERNATION_TRANSITIONS.labels("hibernate", "error").inc()
+                    return {"error": "Failed to scale store down"}
+
+                database.set_store_hibernated_at(store_id, datetime.utcnow())
+                database.update_store_status(store_id, "hibernated")
+                HIBERNATION_TRANSITIONS.labels("hibernate", "ok").inc()
+                logger.info("Store hibernated", extra={"status": "hibernated"})
+                return {"id": store_id, "status": "hibernated"}
+        finally:
+            self._release(store_id)
+
+    def wake(self, store_id, user_id=None):
+        """Wake a store on request of its owner rather than a visitor"""
+        store = database.get_store(store_id)
+        if not store:
+            return {"error": "Store not found"}
+        if user_id and str(store["user_id"]) != str(user_id):
+            return {"error": "Unauthorized: You do not own this store"}
+        if store["status"] not in ("hibernated", "waking"):
+            return {"error": f"Store is {store['status']}, not hibernated"}
+        return {"id": store_id, "status": self.request_wake(store_id)}
+
+    def request_wake(self, store_id):
+        """Start waking a hibernated store in the background; returns its current status"""
+        store = database.get_store(store_id)
+        if not store:
+            return None
+        # "waking" without a wake in this process: the backend restarted mid-wake
+        if store["status"] in ("hibernated", "waking") and self._claim(store_id):
+            run_in_background(current_app._get_current_object(), self._wake, store_id, name=f"wake-{store_id}")
+            return "waking"
+        return store["status"]
+
+    def _wake(self, store_id):
+        try:
+            with log_context(store_id=store_id), start_span("hibernation.wake", store_id=store_id):
+                store = database.get_store(store_id)
+                if not store or store["status"] not in ("hibernated", "waking"):
+                    return
+                started = time.monotonic()
+                database.update_store_status(store_id, "waking")
+                database.touch_store(store_id)
+                if not self._scale(store, 1):
+                    database.update_store_status(store_id, "hibernated")
+                    HIBERNATION_TRANSITIONS.labels("wake", "error").inc()
+                    return
+
+                deadline = started + config.HIBERNATION_WAKE_TIMEOUT_SECONDS
+                k8s = self.store_manager.k8s_for(store)
+                evaluation = k8s.evaluate_namespace(f"store-{store_id}")
+                while evaluation["status"] == "provisioning" and time.monotonic() < deadline:
+                    time.sleep(_WAKE_POLL_SECONDS)
+                    evaluation = k8s.evaluate_namespace(f"store-{store_id}")
+
+                if evaluation["status"] != "ready":
+                    reason = evaluation.get("reason") or "wake_timeout"
+                    message = evaluation.get("message") or "store did not become ready after waking"
+                    database.update_store_status(store_id, "failed", reason=f"{reason}: {message}")
+                    HIBERNATION_TRANSITIONS.labels("wake", "error").inc()
+                    return
+
+                if not self._route_to_store(store):
+                    database.update_store_status(store_id, "failed", reason="wake_routing: could not route store back to WordPress")
+                    HIBERNATION_TRANSITIONS.labels("wake", "error").inc()
+                    return
+                database.set_store_hibernated_at(store_id, None)
+                database.update_store_status(store_id, "ready")
+                STORE_WAKE_SECONDS.observe(time.monotonic() - started)
+                HIBERNATION_TRANSITIONS.labels("wake", "ok").inc()
+                logger.info("Store woke up", extra={"status": "ready",
+                                                    "duration_ms": round((time.monotonic() - started) * 1000)})
+        finally:
+            self._release(store_id)
+
+    def _scale(self, store, replicas):
+        """Scale the store's workloads; MySQL comes up first and goes down last"""
+        namespace = f"store-{store['id']}"
+        k8s = self.store_manager.k8s_for(store)
+        steps = []
+        if store.get("db_mode") != "shared":
+            steps.append(lambda: k8s.scale_statefulset(namespace, "mysql", replicas))
+        if store.get("object_cache") == "dedicated":
+            steps.append(lambda: k8s.scale_deployment(namespace, "redis", replicas))
+        steps.append(lambda: k8s.scale_deployment(namespace, "wordpress", replicas))
+        if replicas == 0:
+            steps.reverse()
+        return all(step() for step in steps)
+
+    def _route_to_activator(self, store):
+        store_id = store["id"]
+        k8s = self.store_manager.k8s_for(store)
+        activator_host = clusters.activator_host(clusters.cluster_of(store))
+        if store.get("ingress_mode") == "consolidated":
+            return k8s.set_service_external_name(
+                self.store_manager.router.namespace, route_service_name(store_id), activator_host
+            )
+        namespace = f"store-{store_id}"
+        return (
+            k8s.create_service(namespace, get_activator_service(store_id, activator_host))
+            and k8s.apply_ingress(namespace, get_ingress(store_id, _store_host(store), service_name="activator"))
+        )
+
+    def _route_to_store(self, store):
+        store_id = store["id"]
+        k8s = self.store_manager.k8s_for(store)
+        if store.get("ingress_mode") == "consolidated":
+            return k8s.set_service_external_name(
+                self.store_manager.router.namespace, route_service_name(store_id),
+                f"wordpress.store-{store_id}.svc.cluster.local",
+            )
+        return k8s.apply_ingress(f"store-{store_id}", get_ingress(store_id, _store_host(store)))
+
+
+def _store_host(store):
+    return store.get("store_url") or f"store-{store['id']}.local"
@@ -0,0 +1,62 @@
+"""
+Node image cache
+Store images are pinned by digest (images.lock.json) and pulled IfNotPresent,
+so once a node has them a new store starts without pulling anything (images
+not yet locked are pulled Always). The
+pre-pull DaemonSet gets them onto every node ahead of time and is rolled
+whenever the image set changes (its template version annotation). The
+warmth report shows which nodes already hold which images.
+"""
+import logging
+
+import config
+import images
+from templates.prepull import PREPULL_NAME, get_prepull_daemonset
+
+logger = logging.getLogger(__name__)
+
+_VERSION_ANNOTATION = "store-platform/template-version"
+
+
+def ensure_prepull_daemonset(k8s):
+    """Create or roll the pre-pull DaemonSet when it does not match the current image set"""
+    version = images.template_version()
+    status = k8s.get_daemonset_status(config.PREPULL_NAMESPACE, PREPULL_NAME)
+    if status and status["annotations"].get(_VERSION_ANNOTATION) == version:
+        return {"version": version, "changed": False}
+    daemonset = get_prepull_daemonset(config.PREPULL_NAMESPACE, config.PREPULL_IMAGES, version)
+    if not k8s.apply_daemonset(config.PREPULL_NAMESPACE, daemonset):
+        return {"error": "Failed to apply the pre-pull DaemonSet"}
+    logger.info(f"Pre-pull DaemonSet now at template version {version}")
+    return {"version": version, "changed": True}
+
+
+def cache_warmth_report(k8s):
+    """Per node: which pre-pulled images are cached, and the share that is"""
+    nodes = k8s.list_node_images()
+    if nodes is None:
+        return {"error": "Could not list nodes"}
+    wanted = {name: images.canonical(images.image(name)) for name in config.PREPULL_IMAGES}
+    report = []
+    for node in nodes:
+        cached = sorted(name for name, ref in wanted.items() if ref in node["images"])
+        report.append({
+            "node": node["name"],
+            "cached": cached,
+            "missing": sorted(set(wanted) - set(cached)),
+            "warmth": round(len(cached) / len(wanted), 2) if wanted else 1.0,
+        })
+    status = k8s.get_daemonset_status(config.PREPULL_NAMESPACE, PREPULL_NAME)
+    return {
+        "template_version": images.template_version(),
+        "images": {name: images.image(name) for name in config.PREPULL_IMAGES},
+        "unpinned": images.unpinned(),
+        "prepull": None if status is None else {
+            "version": status["annotations"].get(_VERSION_ANNOTATION),
+            "desired": status["desired"],
+            "ready": status["ready"],
+            "updated": status["updated"],
+        },
+        "nodes": report,
+        "fully_warm_nodes": sum(1 for node in report if not node["missing"]),
+    }
@@ -0,0 +1,161 @@
+"""
+Container images used in store namespaces
+Tags live in images.lock.json next to this file, together with the digest
+each tag resolved to when the lock was last refreshed. Templates reference
+images as tag@digest, so a store always runs exactly the image that was
+tested, even when the tag moves upstream. Entries without a digest fall back
+to the plain tag, pulled Always (a cached copy of a tag can be stale), and
+the backend logs a warning when it starts.
+
+Refresh the digests (needs registry access), and check before a release
+that every entry has one:
+
+    python images.py lock
+    python images.py check
+
+The backend Docker image runs `lock --missing` and `check` at build time,
+so an image built from a lock with unpinned entries still ships digests;
+digests committed to the lock are kept as they are.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+import urllib.error
+import urllib.request
+
+logger = logging.getLogger(__name__)
+
+LOCK_FILE = os.environ.get("IMAGES_LOCK_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "images.lock.json"))
+
+
+_MANIFEST_TYPES = ", ".join([
+    "application/vnd.oci.image.index.v1+json",
+    "application/vnd.docker.distribution.manifest.list.v2+json",
+    "application/vnd.oci.image.manifest.v1+json",
+    "application/vnd.docker.distribution.manifest.v2+json",
+])
+
+
+def _load():
+    with open(LOCK_FILE) as f:
+        return json.load(f)
+
+
+_LOCK = _load()
+
+
+def unpinned():
+    """Components whose lock entry has no digest"""
+    return sorted(name for name, entry in _LOCK.items() if not entry.get("digest"))
+
+
+def warn_unpinned():
+    """Log the entries without a digest; called once when the backend starts serving"""
+    if unpinned():
+        logger.warning(f"Images without a locked digest (run 'python images.py lock'): {', '.join(unpinned())}")
+
+
+def image(name):
+    """Image reference for a component, pinned to its locked digest when there is one"""
+    entry = _LOCK[name]
+    if entry.get("digest"):
+        return f"{entry['image']}@{entry['digest']}"
+    return entry["image"]
+
+
+def pull_policy(name):
+    """IfNotPresent for a digest, which never changes under a cached copy; Always for a bare tag"""
+    return "IfNotPresent" if _LOCK[name].get("digest") else "Always"
+
+
+def template_version():
+    """Short hash of the image set (tags and digests) the templates currently reference"""
+    entries = {name: [entry["image"], entry.get("digest")] for name, entry in _LOCK.items()}
+    return hashlib.sha256(json.dumps(entries, sort_keys=True).encode()).hexdigest()[:12]
+
+
+def canonical(reference):
+    """Fully qualified form, as nodes report their images: 'mysql:8.0' -> 'docker.io/library/mysql:8.0'"""
+    name, at, digest = reference.partition("@")
+    registry, repository, tag = _split_reference(name)
+    if registry == "registry-1.docker.io":
+        registry = "docker.io"
+    return f"{registry}/{repository}@{digest}" if at else f"{registry}/{repository}:{tag}"
+
+
+def _split_reference(reference):
+    """'nginx:1.27-alpine' -> ('registry-1.docker.io', 'library/nginx', '1.27-alpine')"""
+    name, _, tag = reference.rpartition(":")
+    if not name or "/" in tag:
+        name, tag = reference, "latest"
+    first, _, rest = name.partition("/")
+    if rest and ("." in first or ":" in first or first == "localhost"):
+        registry, repository = first, rest
+    else:
+        registry, repository = "registry-1.docker.io", name
+        if "/" not in repository:
+            repository = f"library/{repository}"
+    return registry, repository, tag
+
+
+def _bearer_token(challenge):
+    """Fetch an anonymous pull token for a WWW-Authenticate: Bearer challenge"""
+    params = dict(re.findall(r'(\w+)="([^"]*)"', challenge))
+    realm = params.pop("realm")
+    query = "&".join(f"{k}={v}" for k, v in params.items())
+    with urllib.request.urlopen(f"{realm}?{query}", timeout=15) as response:
+        body = json.load(response)
+    return body.get("token") or body.get("access_token")
+
+
+def resolve_digest(reference):
+    """Ask the registry which digest a tag currently points to"""
+    registry, repository, tag = _split_reference(reference)
+    url = f"https://{registry}/v2/{repository}/manifests/{tag}"
+    headers = {"Accept": _MANIFEST_TYPES}
+    for _ in range(2):
+        request = urllib.request.Request(url, headers=headers, method="HEAD")
+        try:
+            with urllib.request.urlopen(request, timeout=15) as response:
+                return response.headers["Docker-Content-Digest"]
+        except urllib.error.HTTPError as e:
+            challenge = e.headers.get("WWW-Authenticate", "")
+            if e.code != 401 or not challenge.startswith("Bearer") or "Authorization" in headers:
+                raise
+            headers["Authorization"] = f"Bearer {_bearer_token(challenge)}"
+    raise RuntimeError(f"Could not resolve {reference}")
+
+
+def lock(missing_only=False):
+    """Resolve every tag (or only those without a digest) to its current digest and write it back"""
+    entries = _load()
+    for name, entry in entries.items():
+        if missing_only and entry.get("digest"):
+            continue
+        digest = resolve_digest(entry["image"])
+        if digest != entry.get("digest"):
+            print(f"{name}: {entry['image']} -> {digest}")
+        entry["digest"] = digest
+    with open(LOCK_FILE, "w") as f:
+        json.dump(entries, f, indent=2)
+        f.write("\n")
+
+
+def check():
+    """Exit non-zero when an entry has no digest, so a release cannot ship bare tags"""
+    missing = unpinned()
+    if missing:
+        sys.exit(f"No locked digest for: {', '.join(missing)}. Run 'python images.py lock'")
+    print(f"All {len(_LOCK)} images are pinned")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] not in (["lock"], ["lock", "--missing"], ["check"]):
+        sys.exit("usage: python images.py lock [--missing] | check")
+    if sys.argv[1] == "lock":
+        lock(missing_only=sys.argv[2:] == ["--missing"])
+    else:
+        check()
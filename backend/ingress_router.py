@@ -0,0 +1,117 @@
+"""
+Consolidated store routing
+Instead of an Ingress in every store namespace, stores in "consolidated"
+ingress mode are routed through a fixed set of Ingress shards in one routing
+namespace (INGRESS_ROUTING_NAMESPACE):
+
+    store-<id>          ExternalName service -> wordpress.store-<id>.svc
+    store-routes-<n>    Ingress with one host rule per store hashed to shard n
+
+Adding or removing a route only marks its shard dirty. The flusher rewrites
+dirty shards every INGRESS_FLUSH_INTERVAL_SECONDS from the stores table, so
+a burst of creates and deletes becomes one write (and one ingress controller
+reload) per touched shard, and each write stays small. Every shard references
+the same wildcard TLS secret instead of a certificate per host.
+"""
+import logging
+import threading
+import zlib
+from datetime import datetime
+
+import config
+import database
+from metrics import INGRESS_SHARD_WRITES
+from templates.ingress import get_route_service, get_route_shard_ingress, route_service_name, route_shard_name
+from tracing import start_span
+
+logger = logging.getLogger(__name__)
+
+
+class IngressRouter:
+    def __init__(self, k8s, namespace=None, shards=None, tls_secret=None):
+        self.k8s = k8s
+        self.namespace = namespace or config.INGRESS_ROUTING_NAMESPACE
+        self.shards = shards or config.INGRESS_SHARDS
+        self.tls_secret = config.INGRESS_WILDCARD_TLS_SECRET if tls_secret is None else tls_secret
+        self._dirty = set()
+        self._dirty_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self.last_flush = None
+
+    def shard_for(self, store_id):
+        return zlib.crc32(store_id.encode()) % self.shards
+
+    def add_route(self, store_id):
+        """Create the store's route service and queue its shard for the next flush"""
+        if not self.k8s.create_service(self.namespace, get_route_service(store_id, self.namespace)):
+            return False
+        self._mark_dirty(self.shard_for(store_id))
+        return True
+
+    def remove_route(self, store_id):
+        """Queue the store's shard for rewrite and drop its route service"""
+        self._mark_dirty(self.shard_for(store_id))
+        return self.k8s.delete_service(self.namespace, route_service_name(store_id))
+
+    def resync(self):
+        """Rewrite every shard on the next flush, e.g. after a restart lost pending changes"""
+        for shard in range(self.shards):
+            self._mark_dirty(shard)
+
+    def _mark_dirty(self, shard):
+        with self._dirty_lock:
+            self._dirty.add(shard)
+
+    def flush(self):
+        """Rewrite dirty shards from the stores table; failed shards stay dirty for the next flush"""
+        with self._dirty_lock:
+            dirty, self._dirty = self._dirty, set()
+        if not dirty:
+            return None
+
+        with self._flush_lock, start_span("ingress.flush", shards=len(dirty)):
+            routes_by_shard = {shard: [] for shard in dirty}
+            for store_id, host in database.get_consolidated_routes():
+                shard = self.shard_for(store_id)
+                if shard in routes_by_shard:
+                    routes_by_shard[shard].append((store_id, host))
+
+            failed = []
+            for shard, routes in sorted(routes_by_shard.items()):
+                if routes:
+                    ingress = get_route_shard_ingress(shard, self.namespace, routes, self.tls_secret)
+                    ok = self.k8s.apply_ingress(self.namespace, ingress)
+                else:
+                    # An Ingress needs at least one rule; an empty shard has no object
+                    ok = self.k8s.delete_ingress(self.namespace, route_shard_name(shard))
+                INGRESS_SHARD_WRITES.labels("ok" if ok else "error").inc()
+                if not ok:
+                    failed.append(shard)
+
+            if failed:
+                with self._dirty_lock:
+                    self._dirty.update(failed)
+            self.last_flush = {
+                "at": datetime.utcnow().isoformat(),
+                "shards_written": sorted(set(dirty) - set(failed)),
+                "shards_failed": failed,
+                "routes": sum(len(routes) for routes in routes_by_shard.values()),
+            }
+            logger.info(f"Flushed {len(dirty)} ingress shards ({len(failed)} failed)")
+            return self.last_flush
+
+    def status(self):
+        """Routes per shard, shards waiting for a flush and the last flush"""
+        counts = [0] * self.shards
+        for store_id, _ in database.get_consolidated_routes():
+            counts[self.shard_for(store_id)] += 1
+        with self._dirty_lock:
+            pending = sorted(self._dirty)
+        return {
+            "mode": config.INGRESS_MODE,
+            "namespace": self.namespace,
+            "tls_secret": self.tls_secret or None,
+            "routes_per_shard": {route_shard_name(shard): count for shard, count in enumerate(counts)},
+            "pending_shards": pending,
+            "last_flush": self.last_flush,
+        }
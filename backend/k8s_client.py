@@ -1,22 +1,161 @@
-from kubernetes import client, config
+from kubernetes import client, config as kube_config
 from kubernetes.client.rest import ApiException
+from kubernetes.utils import parse_quantity
+from metrics import observe_k8s_call
+from tracing import start_span
+import config
+import logging
 import os
 
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_GROUP = "snapshot.storage.k8s.io"
+SNAPSHOT_VERSION = "v1"
+
+
+class _InstrumentedApi:
+    """Wraps a kubernetes API group so every call is timed and failures are counted"""
+
+    def __init__(self, api):
+        self._api = api
+
+    def __getattr__(self, name):
+        attr = getattr(self._api, name)
+        if name.startswith("_") or not callable(attr):
+            return attr
+        # e.g. create_namespaced_stateful_set -> ("create", "stateful_set")
+        verb, _, resource = name.partition("_")
+        resource = resource.replace("namespaced_", "", 1).replace("_for_all_namespaces", "")
+
+        def call(*args, **kwargs):
+            with start_span(f"k8s.{verb} {resource}", **{"k8s.verb": verb, "k8s.resource": resource}):
+                return observe_k8s_call(verb, resource, attr, *args, **kwargs)
+        return call
+
+
+# Container waiting reasons that will not clear without intervention
+_FATAL_WAITING_REASONS = {
+    "ImagePullBackOff": "image_pull",
+    "InvalidImageName": "image_pull",
+    "ErrImageNeverPull": "image_pull",
+    "CreateContainerConfigError": "config_error",
+    "CreateContainerError": "config_error",
+}
+
+# Warning events that explain why a store is stuck
+_EVENT_REASONS = {
+    "FailedScheduling": "unschedulable",
+    "FailedMount": "volume_mount",
+    "FailedAttachVolume": "volume_mount",
+    "ProvisioningFailed": "volume_provisioning",
+    "Failed": "container_failed",
+    "BackOff": "crash_loop",
+}
+
+
+def _finding(reason, message):
+    return {"reason": reason, "message": message}
+
+
+def _classify_pod(pod):
+    """Returns (hard failure, stall reason) for a pod; either may be None"""
+    for condition in pod.status.conditions or []:
+        if condition.type == "PodScheduled" and condition.status == "False" and condition.reason == "Unschedulable":
+            return None, _finding("unschedulable", f"Pod {pod.metadata.name}: {condition.message}")
+
+    init_statuses = pod.status.init_container_statuses or []
+    for status in init_statuses + (pod.status.container_statuses or []):
+        is_init = status in init_statuses
+        waiting = status.state.waiting if status.state else None
+        if waiting and waiting.reason in _FATAL_WAITING_REASONS:
+            return _finding(
+                _FATAL_WAITING_REASONS[waiting.reason],
+                f"Container {status.name} in {pod.metadata.name}: {waiting.reason} {waiting.message or ''}".strip(),
+            ), None
+
+        terminated = status.state.terminated if status.state else None
+        # Only while it is still down: a container that restarted (e.g. while MySQL came up) and recovered is fine
+        down = not status.ready and (waiting or (terminated and terminated.exit_code != 0))
+        if down and (status.restart_count or 0) >= config.CONTAINER_RESTART_LIMIT:
+            last = status.last_state.terminated if status.last_state else None
+            detail = f" (last exit code {last.exit_code}: {last.reason})" if last else ""
+            return _finding(
+                "init_failed" if is_init else "crash_loop",
+                f"Container {status.name} in {pod.metadata.name} restarted {status.restart_count} times{detail}",
+            ), None
+
+        if waiting and waiting.reason == "ErrImagePull":
+            # Often a transient registry error; becomes ImagePullBackOff if it persists
+            return None, _finding("image_pull", f"Container {status.name}: {waiting.message or waiting.reason}")
+    return None, None
+
+
+def _pod_resources(spec, field, defaults=None):
+    """
+    (cpu cores, memory bytes) of a pod spec's requests or limits: the sum of
+    its containers, or its largest init container if that is bigger.
+    Containers without a value take it from `defaults` (e.g. a LimitRange's
+    defaults) when given, and a missing request falls back to the limit, as
+    the API server does.
+    """
+    defaults = defaults or {}
+
+    def amount(container, resource):
+        resources = container.resources
+        value = (getattr(resources, field, None) or {}).get(resource) if resources else None
+        if value is None and field == "requests" and resources:
+            value = (resources.limits or {}).get(resource)
+        if value is None:
+            value = defaults.get(resource, 0)
+        return float(parse_quantity(value))
+
+    containers = [(amount(c, "cpu"), amount(c, "memory")) for c in spec.containers or []]
+    inits = [(amount(c, "cpu"), amount(c, "memory")) for c in spec.init_containers or []]
+    cpu = max([sum(c for c, _ in containers)] + [c for c, _ in inits])
+    memory = max([sum(m for _, m in containers)] + [m for _, m in inits])
+    return cpu, memory
+
+
+def pod_requests(spec, defaults=None):
+    """(cpu cores, memory bytes) a pod spec requests from the scheduler"""
+    return _pod_resources(spec, "requests", defaults)
+
+
+def pod_limits(spec, defaults=None):
+    """(cpu cores, memory bytes) a pod spec is limited to"""
+    return _pod_resources(spec, "limits", defaults)
+
+
 class K8sClient:
-    def __init__(self):
-        """Initialize Kubernetes client - works both in-cluster and locally"""
-        try:
-            # Try in-cluster config first (when running in K8s)
-            config.load_incluster_config()
-            print("Using in-cluster config")
-        except:
-            # Fall back to local kubeconfig (for development)
-            config.load_kube_config()
-            print("Using local kubeconfig")
+    def __init__(self, kubeconfig=None, context=None):
+        """
+        Initialize Kubernetes client - works both in-cluster and locally.
+        With a kubeconfig file and/or context, the client talks to that
+        cluster only, without touching the process-wide default config.
+        """
+        api_client = None
+        if kubeconfig or context:
+            api_client = kube_config.new_client_from_config(config_file=kubeconfig, context=context)
+            logger.info(f"Using kubeconfig {kubeconfig or 'default'} context {context or 'current'}")
+        else:
+            try:
+                # Try in-cluster config first (when running in K8s)
+                kube_config.load_incluster_config()
+                logger.info("Using in-cluster config")
+            except:
+                # Fall back to local kubeconfig (for development)
+                kube_config.load_kube_config()
+                logger.info("Using local kubeconfig")
         
-        self.core_v1 = client.CoreV1Api()
-        self.apps_v1 = client.AppsV1Api()
-        self.networking_v1 = client.NetworkingV1Api()
+        self.core_v1 = _InstrumentedApi(client.CoreV1Api(api_client))
+        self.apps_v1 = _InstrumentedApi(client.AppsV1Api(api_client))
+        self.networking_v1 = _InstrumentedApi(client.NetworkingV1Api(api_client))
+        self.batch_v1 = _InstrumentedApi(client.BatchV1Api(api_client))
+        self.autoscaling_v2 = _InstrumentedApi(client.AutoscalingV2Api(api_client))
+        self.storage_v1 = _InstrumentedApi(client.StorageV1Api(api_client))
+        self.custom_objects = _InstrumentedApi(client.CustomObjectsApi(api_client))
+        # API server URL, so two cluster entries for the same cluster can be told apart
+        self.host = self.core_v1.api_client.configuration.host
     
     def create_namespace(self, name):
         """Create a namespace"""
@@ -31,23 +170,23 @@ class K8sClient:
         )
         try:
             self.core_v1.create_namespace(namespace)
-            print(f"✓ Created namespace: {name}")
+            logger.info(f"Created namespace: {name}", extra={"namespace": name})
             return True
         except ApiException as e:
             if e.status == 409:  # Already exists
-                print(f"⚠ Namespace {name} already exists")
+                logger.warning(f"Namespace {name} already exists", extra={"namespace": name})
                 return True
-            print(f"✗ Error creating namespace: {e}")
+            logger.error(f"Error creating namespace: {e}", extra={"namespace": name})
             return False
     
     def delete_namespace(self, name):
         """Delete a namespace and all its resources"""
         try:
             self.core_v1.delete_namespace(name)
-            print(f"✓ Deleted namespace: {name}")
+            logger.info(f"Deleted namespace: {name}", extra={"namespace": name})
             return True
         except ApiException as e:
-            print(f"✗ Error deleting namespace: {e}")
+            logger.error(f"Error deleting namespace: {e}", extra={"namespace": name})
             return False
     
     def namespace_exists(self, name):
@@ -60,22 +199,34 @@ class K8sClient:
     
     def get_namespace_status(self, name):
         """Get status of pods in namespace - specifically checks WordPress pod"""
+        return self.evaluate_namespace(name)["status"]
+
+    def evaluate_namespace(self, name):
+        """
+        Evaluate a store namespace: ready, provisioning or failed, plus a
+        classified reason when something is wrong.
+        Hard failures (image can't be pulled, crash loops, wp-init failing
+        repeatedly) fail at once; conditions that may still clear on their own
+        (unschedulable pods, pending volumes) come back as "provisioning" with
+        a reason, and the caller fails them once they exceed the stall deadline.
+        """
         try:
             pods = self.core_v1.list_namespaced_pod(name)
 
-            total = len(pods.items)
-            if total == 0:
-                return "provisioning"
-
             wordpress_ready = False
-            has_failed_pods = False
+            hard_failure = None
+            stall_reason = None
 
             for pod in pods.items:
                 # Check if pod is in Failed state
                 if pod.status.phase == "Failed":
-                    has_failed_pods = True
+                    hard_failure = hard_failure or _finding("pod_failed", f"Pod {pod.metadata.name} failed: {pod.status.reason or pod.status.message or 'unknown'}")
                     continue
 
+                problem, stalled = _classify_pod(pod)
+                hard_failure = hard_failure or problem
+                stall_reason = stall_reason or stalled
+
                 # Check specifically for WordPress pod
                 is_wordpress = pod.metadata.name.startswith("wordpress-")
 
@@ -100,106 +251,593 @@ class K8sClient:
                     if pod.status.phase == "Running" and init_containers_ready and main_containers_ready:
                         wordpress_ready = True
 
-            if has_failed_pods:
-                return "failed"
-            elif wordpress_ready:
-                return "ready"
-            else:
-                return "provisioning"
+            if hard_failure:
+                return {"status": "failed", **hard_failure}
+            if wordpress_ready:
+                return {"status": "ready", "reason": None, "message": None}
+
+            # Not ready yet: look for volumes and warning events that explain the wait
+            stall_reason = stall_reason or self._find_stall_reason(name)
+            return {"status": "provisioning", **(stall_reason or {"reason": None, "message": None})}
         except ApiException:
-            return "unknown"
-    
+            return {"status": "unknown", "reason": None, "message": None}
+
+    def _find_stall_reason(self, namespace):
+        """Explain a store that is not ready from its PVCs and Warning events"""
+        for pvc in self.core_v1.list_namespaced_persistent_volume_claim(namespace).items:
+            if pvc.status.phase == "Pending":
+                return _finding("volume_pending", f"PVC {pvc.metadata.name} is Pending")
+
+        events = self.core_v1.list_namespaced_event(namespace, field_selector="type=Warning").items
+        # Newest first, so the reason reflects the current problem
+        events.sort(key=lambda e: e.last_timestamp or e.event_time or e.metadata.creation_timestamp, reverse=True)
+        for event in events:
+            reason = _EVENT_REASONS.get(event.reason)
+            if reason:
+                return _finding(reason, f"{event.involved_object.kind} {event.involved_object.name}: {event.message}")
+        return None
+
     def create_secret(self, namespace, secret_spec):
         """Create a secret"""
         try:
             self.core_v1.create_namespaced_secret(namespace, secret_spec)
-            print(f"✓ Created secret: {secret_spec.metadata.name}")
+            logger.info(f"Created secret: {secret_spec.metadata.name}", extra={"namespace": namespace})
             return True
         except ApiException as e:
             if e.status == 409:
-                print(f"⚠ Secret {secret_spec.metadata.name} already exists")
+                logger.warning(f"Secret {secret_spec.metadata.name} already exists", extra={"namespace": namespace})
                 return True
-            print(f"✗ Error creating secret: {e}")
+            logger.error(f"Error creating secret: {e}", extra={"namespace": namespace})
             return False
     
+    def apply_secret(self, namespace, secret_spec):
+        """Replace a secret with secret_spec, creating it if it does not exist"""
+        name = secret_spec.metadata.name
+        try:
+            self.core_v1.replace_namespaced_secret(name, namespace, secret_spec)
+            logger.info(f"Updated secret: {name}", extra={"namespace": namespace})
+            return True
+        except ApiException as e:
+            if e.status != 404:
+                logger.error(f"Error updating secret: {e}", extra={"namespace": namespace})
+                return False
+        return self.create_secret(namespace, secret_spec)
+
     def create_statefulset(self, namespace, statefulset_spec):
         """Create a StatefulSet"""
         try:
             self.apps_v1.create_namespaced_stateful_set(namespace, statefulset_spec)
-            print(f"✓ Created StatefulSet: {statefulset_spec.metadata.name}")
+            logger.info(f"Created StatefulSet: {statefulset_spec.metadata.name}", extra={"namespace": namespace})
             return True
         except ApiException as e:
             if e.status == 409:
-                print(f"⚠ StatefulSet already exists")
+                logger.warning(f"StatefulSet {statefulset_spec.metadata.name} already exists", extra={"namespace": namespace})
                 return True
-            print(f"✗ Error creating StatefulSet: {e}")
+            logger.error(f"Error creating StatefulSet: {e}", extra={"namespace": namespace})
             return False
     
     def create_deployment(self, namespace, deployment_spec):
         """Create a Deployment"""
         try:
             self.apps_v1.create_namespaced_deployment(namespace, deployment_spec)
-            print(f"✓ Created Deployment: {deployment_spec.metadata.name}")
+            logger.info(f"Created Deployment: {deployment_spec.metadata.name}", extra={"namespace": namespace})
             return True
         except ApiException as e:
             if e.status == 409:
-                print(f"⚠ Deployment already exists")
+                logger.warning(f"Deployment {deployment_spec.metadata.name} already exists", extra={"namespace": namespace})
                 return True
-            print(f"✗ Error creating Deployment: {e}")
+            logger.error(f"Error creating Deployment: {e}", extra={"namespace": namespace})
             return False
     
     def create_service(self, namespace, service_spec):
         """Create a Service"""
         try:
             self.core_v1.create_namespaced_service(namespace, service_spec)
-            print(f"✓ Created Service: {service_spec.metadata.name}")
+            logger.info(f"Created Service: {service_spec.metadata.name}", extra={"namespace": namespace})
             return True
         except ApiException as e:
             if e.status == 409:
-                print(f"⚠ Service already exists")
+                logger.warning(f"Service {service_spec.metadata.name} already exists", extra={"namespace": namespace})
                 return True
-            print(f"✗ Error creating Service: {e}")
+            logger.error(f"Error creating Service: {e}", extra={"namespace": namespace})
             return False
     
     def create_ingress(self, namespace, ingress_spec):
         """Create an Ingress"""
         try:
             self.networking_v1.create_namespaced_ingress(namespace, ingress_spec)
-            print(f"✓ Created Ingress: {ingress_spec.metadata.name}")
+            logger.info(f"Created Ingress: {ingress_spec.metadata.name}", extra={"namespace": namespace})
             return True
         except ApiException as e:
             if e.status == 409:
-                print(f"⚠ Ingress already exists")
+                logger.warning(f"Ingress {ingress_spec.metadata.name} already exists", extra={"namespace": namespace})
                 return True
-            print(f"✗ Error creating Ingress: {e}")
+            logger.error(f"Error creating Ingress: {e}", extra={"namespace": namespace})
             return False
-    
+
+    def apply_ingress(self, namespace, ingress_spec):
+        """Replace an Ingress with ingress_spec, creating it if it does not exist"""
+        name = ingress_spec.metadata.name
+        try:
+            self.networking_v1.replace_namespaced_ingress(name, namespace, ingress_spec)
+            logger.info(f"Updated Ingress: {name}", extra={"namespace": namespace})
+            return True
+        except ApiException as e:
+            if e.status != 404:
+                logger.error(f"Error updating Ingress: {e}", extra={"namespace": namespace})
+                return False
+        return self.create_ingress(namespace, ingress_spec)
+
+    def delete_ingress(self, namespace, name):
+        """Delete an Ingress; a missing one counts as deleted"""
+        try:
+            self.networking_v1.delete_namespaced_ingress(name, namespace)
+            logger.info(f"Deleted Ingress: {name}", extra={"namespace": namespace})
+            return True
+        except ApiException as e:
+            if e.status == 404:
+                return True
+            logger.error(f"Error deleting Ingress: {e}", extra={"namespace": namespace})
+            return False
+
+    def set_service_external_name(self, namespace, name, external_name):
+        """Point an ExternalName service at another host"""
+        try:
+            self.core_v1.patch_namespaced_service(name, namespace, {"spec": {"externalName": external_name}})
+            logger.info(f"Service {name} now resolves to {external_name}", extra={"namespace": namespace})
+            return True
+        except ApiException as e:
+            logger.error(f"Error patching Service: {e}", extra={"namespace": namespace})
+            return False
+
+    def scale_deployment(self, namespace, name, replicas):
+        """Set a Deployment's replica count"""
+        try:
+            self.apps_v1.patch_namespaced_deployment_scale(name, namespace, {"spec": {"replicas": replicas}})
+            logger.info(f"Scaled Deployment {name} to {replicas}", extra={"namespace": namespace})
+            return True
+        except ApiException as e:
+            logger.error(f"Error scaling Deployment: {e}", extra={"namespace": namespace})
+            return False
+
+    def scale_statefulset(self, namespace, name, replicas):
+        """Set a StatefulSet's replica count"""
+        try:
+            self.apps_v1.patch_namespaced_stateful_set_scale(name, namespace, {"spec": {"replicas": replicas}})
+            logger.info(f"Scaled StatefulSet {name} to {replicas}", extra={"namespace": namespace})
+            return True
+        except ApiException as e:
+            logger.error(f"Error scaling StatefulSet: {e}", extra={"namespace": namespace})
+            return False
+
+    def statefulset_ready(self, namespace, name):
+        """Whether every replica of a StatefulSet passes its readiness probe; None if it cannot be read"""
+        try:
+            statefulset = self.apps_v1.read_namespaced_stateful_set(name, namespace)
+        except ApiException as e:
+            logger.error(f"Error reading StatefulSet {name}: {e}", extra={"namespace": namespace})
+            return None
+        desired = statefulset.spec.replicas if statefulset.spec.replicas is not None else 1
+        return bool(statefulset.status) and (statefulset.status.ready_replicas or 0) >= desired
+
+    def delete_service(self, namespace, name):
+        """Delete a Service; a missing one counts as deleted"""
+        try:
+            self.core_v1.delete_namespaced_service(name, namespace)
+            logger.info(f"Deleted Service: {name}", extra={"namespace": namespace})
+            return True
+        except ApiException as e:
+            if e.status == 404:
+                return True
+            logger.error(f"Error deleting Service: {e}", extra={"namespace": namespace})
+            return False
+
     def create_configmap(self, namespace, configmap_spec):
         """Create a ConfigMap"""
         try:
             self.core_v1.create_namespaced_config_map(namespace, configmap_spec)
-            print(f"✓ Created ConfigMap: {configmap_spec.metadata.name}")
+            logger.info(f"Created ConfigMap: {configmap_spec.metadata.name}", extra={"namespace": namespace})
             return True
         except ApiException as e:
             if e.status == 409:
-                print(f"⚠ ConfigMap already exists")
+                logger.warning(f"ConfigMap {configmap_spec.metadata.name} already exists", extra={"namespace": namespace})
                 return True
-            print(f"✗ Error creating ConfigMap: {e}")
+            logger.error(f"Error creating ConfigMap: {e}", extra={"namespace": namespace})
             return False
     
     def create_pvc(self, namespace, pvc_spec):
         """Create a PersistentVolumeClaim"""
         try:
             self.core_v1.create_namespaced_persistent_volume_claim(namespace, pvc_spec)
-            print(f"✓ Created PVC: {pvc_spec.metadata.name}")
+            logger.info(f"Created PVC: {pvc_spec.metadata.name}", extra={"namespace": namespace})
             return True
         except ApiException as e:
             if e.status == 409:
-                print(f"⚠ PVC already exists")
+                logger.warning(f"PVC {pvc_spec.metadata.name} already exists", extra={"namespace": namespace})
                 return True
-            print(f"✗ Error creating PVC: {e}")
+            logger.error(f"Error creating PVC: {e}", extra={"namespace": namespace})
             return False
     
+    def create_hpa(self, namespace, hpa_spec):
+        """Create a HorizontalPodAutoscaler"""
+        try:
+            self.autoscaling_v2.create_namespaced_horizontal_pod_autoscaler(namespace, hpa_spec)
+            logger.info(f"Created HorizontalPodAutoscaler: {hpa_spec.metadata.name}", extra={"namespace": namespace})
+            return True
+        except ApiException as e:
+            if e.status == 409:
+                logger.warning(f"HorizontalPodAutoscaler {hpa_spec.metadata.name} already exists", extra={"namespace": namespace})
+                return True
+            logger.error(f"Error creating HorizontalPodAutoscaler: {e}", extra={"namespace": namespace})
+            return False
+
+    def apply_resource_quota(self, namespace, quota_spec):
+        """Replace a ResourceQuota with quota_spec, creating it if it does not exist"""
+        name = quota_spec.metadata.name
+        try:
+            self.core_v1.replace_namespaced_resource_quota(name, namespace, quota_spec)
+            logger.info(f"Updated ResourceQuota: {name}", extra={"namespace": namespace})
+            return True
+        except ApiException as e:
+            if e.status != 404:
+                logger.error(f"Error updating ResourceQuota: {e}", extra={"namespace": namespace})
+                return False
+        try:
+            self.core_v1.create_namespaced_resource_quota(namespace, quota_spec)
+            logger.info(f"Created ResourceQuota: {name}", extra={"namespace": namespace})
+            return True
+        except ApiException as e:
+            logger.error(f"Error creating ResourceQuota: {e}", extra={"namespace": namespace})
+            return False
+
+    def apply_limit_range(self, namespace, limit_range_spec):
+        """Replace a LimitRange with limit_range_spec, creating it if it does not exist"""
+        name = limit_range_spec.metadata.name
+        try:
+            self.core_v1.replace_namespaced_limit_range(name, namespace, limit_range_spec)
+            logger.info(f"Updated LimitRange: {name}", extra={"namespace": namespace})
+            return True
+        except ApiException as e:
+            if e.status != 404:
+                logger.error(f"Error updating LimitRange: {e}", extra={"namespace": namespace})
+                return False
+        try:
+            self.core_v1.create_namespaced_limit_range(namespace, limit_range_spec)
+            logger.info(f"Created LimitRange: {name}", extra={"namespace": namespace})
+            return True
+        except ApiException as e:
+            logger.error(f"Error creating LimitRange: {e}", extra={"namespace": namespace})
+            return False
+
+    def list_store_resource_quotas(self):
+        """
+        {namespace: {"hard": {resource: amount}, "used": {resource: amount}}}
+        of the store ResourceQuotas, amounts in cores, bytes or counts; None on error
+        """
+        try:
+            quotas = self.core_v1.list_resource_quota_for_all_namespaces(
+                label_selector="app=store-quota,managed-by=store-platform"
+            )
+        except ApiException as e:
+            logger.error(f"Error listing ResourceQuotas: {e}")
+            return None
+        result = {}
+        for quota in quotas.items:
+            status = quota.status
+            result[quota.metadata.namespace] = {
+                "hard": {k: float(parse_quantity(v)) for k, v in ((status.hard if status else None) or {}).items()},
+                "used": {k: float(parse_quantity(v)) for k, v in ((status.used if status else None) or {}).items()},
+            }
+        return result
+
+    def get_pvc(self, namespace, name):
+        """Requested size, current capacity, storage class and resize conditions of a PVC; None if missing"""
+        try:
+            pvc = self.core_v1.read_namespaced_persistent_volume_claim(name, namespace)
+        except ApiException as e:
+            if e.status != 404:
+                logger.error(f"Error reading PVC: {e}", extra={"namespace": namespace})
+            return None
+        return {
+            "name": name,
+            "storage_class": pvc.spec.storage_class_name,
+            "requested": pvc.spec.resources.requests.get("storage"),
+            "capacity": (pvc.status.capacity or {}).get("storage"),
+            "phase": pvc.status.phase,
+            "conditions": [
+                {"type": c.type, "status": c.status, "message": c.message}
+                for c in pvc.status.conditions or []
+            ],
+        }
+
+    def storage_class_allows_expansion(self, name):
+        """Whether PVCs of a storage class can be grown in place; None if the class cannot be read"""
+        try:
+            storage_class = self.storage_v1.read_storage_class(name)
+        except ApiException as e:
+            logger.error(f"Error reading StorageClass {name}: {e}")
+            return None
+        return bool(storage_class.allow_volume_expansion)
+
+    def list_schedulable_nodes(self):
+        """
+        [{name, cpu, memory, pods}] allocatable on Ready nodes that accept new
+        pods (not cordoned or tainted NoSchedule/NoExecute); None on error
+        """
+        try:
+            nodes = self.core_v1.list_node()
+        except ApiException as e:
+            logger.error(f"Error listing nodes: {e}")
+            return None
+        result = []
+        for node in nodes.items:
+            if node.spec.unschedulable:
+                continue
+            if any(t.effect in ("NoSchedule", "NoExecute") for t in node.spec.taints or []):
+                continue
+            if not any(c.type == "Ready" and c.status == "True" for c in node.status.conditions or []):
+                continue
+            allocatable = node.status.allocatable or {}
+            result.append({
+                "name": node.metadata.name,
+                "cpu": float(parse_quantity(allocatable.get("cpu", 0))),
+                "memory": float(parse_quantity(allocatable.get("memory", 0))),
+                "pods": int(parse_quantity(allocatable.get("pods", 110))),
+            })
+        return result
+
+    def list_pod_requests(self):
+        """
+        (node name or None while unscheduled, cpu cores, memory bytes) of every
+        pod that still holds or waits for resources; None on error
+        """
+        try:
+            pods = self.core_v1.list_pod_for_all_namespaces(
+                field_selector="status.phase!=Succeeded,status.phase!=Failed"
+            )
+        except ApiException as e:
+            logger.error(f"Error listing pods: {e}")
+            return None
+        return [(pod.spec.node_name, *pod_requests(pod.spec)) for pod in pods.items]
+
+    def get_storage_capacity(self):
+        """
+        ({storage class: largest capacity published by its CSI driver, in bytes},
+        default storage class). Classes whose driver publishes no
+        CSIStorageCapacity are missing. None on error.
+        """
+        try:
+            capacities = self.storage_v1.list_csi_storage_capacity_for_all_namespaces()
+            classes = self.storage_v1.list_storage_class()
+        except ApiException as e:
+            logger.error(f"Error reading storage capacity: {e}")
+            return None
+        by_class = {}
+        for capacity in capacities.items:
+            # maximumVolumeSize is the better answer when the driver reports it
+            size = capacity.maximum_volume_size or capacity.capacity
+            if size is not None:
+                value = float(parse_quantity(size))
+                by_class[capacity.storage_class_name] = max(by_class.get(capacity.storage_class_name, 0.0), value)
+        default = next(
+            (sc.metadata.name for sc in classes.items
+             if (sc.metadata.annotations or {}).get("storageclass.kubernetes.io/is-default-class") == "true"),
+            None,
+        )
+        return by_class, default
+
+    def expand_pvc(self, namespace, name, size_gi):
+        """Raise a PVC's storage request; the CSI driver grows the volume (and filesystem) online"""
+        try:
+            self.core_v1.patch_namespaced_persistent_volume_claim(
+                name, namespace, {"spec": {"resources": {"requests": {"storage": f"{size_gi}Gi"}}}}
+            )
+            logger.info(f"Expanding PVC {name} to {size_gi}Gi", extra={"namespace": namespace})
+            return True
+        except ApiException as e:
+            logger.error(f"Error expanding PVC: {e}", extra={"namespace": namespace})
+            return False
+
+    def create_volume_snapshot(self, namespace, snapshot):
+        """Create a VolumeSnapshot (snapshot.storage.k8s.io/v1)"""
+        name = snapshot["metadata"]["name"]
+        try:
+            self.custom_objects.create_namespaced_custom_object(
+                SNAPSHOT_GROUP, SNAPSHOT_VERSION, namespace, "volumesnapshots", snapshot
+            )
+            logger.info(f"Created VolumeSnapshot: {name}", extra={"namespace": namespace})
+            return True
+        except ApiException as e:
+            if e.status == 409:
+                logger.warning(f"VolumeSnapshot {name} already exists", extra={"namespace": namespace})
+                return True
+            logger.error(f"Error creating VolumeSnapshot: {e}", extra={"namespace": namespace})
+            return False
+
+    def get_volume_snapshot(self, namespace, name):
+        """Readiness, bound content and error of a VolumeSnapshot; None if missing"""
+        try:
+            snapshot = self.custom_objects.get_namespaced_custom_object(
+                SNAPSHOT_GROUP, SNAPSHOT_VERSION, namespace, "volumesnapshots", name
+            )
+        except ApiException as e:
+            if e.status != 404:
+                logger.error(f"Error reading VolumeSnapshot: {e}", extra={"namespace": namespace})
+            return None
+        status = snapshot.get("status") or {}
+        return {
+            "ready": bool(status.get("readyToUse")),
+            "content_name": status.get("boundVolumeSnapshotContentName"),
+            "restore_size": status.get("restoreSize"),
+            "error": (status.get("error") or {}).get("message"),
+        }
+
+    def get_volume_snapshot_content(self, name):
+        """CSI driver and snapshot handle behind a VolumeSnapshotContent; None if missing"""
+        try:
+            content = self.custom_objects.get_cluster_custom_object(
+                SNAPSHOT_GROUP, SNAPSHOT_VERSION, "volumesnapshotcontents", name
+            )
+        except ApiException as e:
+            if e.status != 404:
+                logger.error(f"Error reading VolumeSnapshotContent {name}: {e}")
+            return None
+        return {
+            "driver": content["spec"]["driver"],
+            "snapshot_handle": (content.get("status") or {}).get("snapshotHandle"),
+        }
+
+    def create_volume_snapshot_content(self, content):
+        """Create a pre-provisioned VolumeSnapshotContent (cluster scoped)"""
+        name = content["metadata"]["name"]
+        try:
+            self.custom_objects.create_cluster_custom_object(
+                SNAPSHOT_GROUP, SNAPSHOT_VERSION, "volumesnapshotcontents", content
+            )
+            logger.info(f"Created VolumeSnapshotContent: {name}")
+            return True
+        except ApiException as e:
+            if e.status == 409:
+                logger.warning(f"VolumeSnapshotContent {name} already exists")
+                return True
+            logger.error(f"Error creating VolumeSnapshotContent: {e}")
+            return False
+
+    def delete_volume_snapshot(self, namespace, name):
+        """Delete a VolumeSnapshot; a missing one counts as deleted"""
+        try:
+            self.custom_objects.delete_namespaced_custom_object(
+                SNAPSHOT_GROUP, SNAPSHOT_VERSION, namespace, "volumesnapshots", name
+            )
+            logger.info(f"Deleted VolumeSnapshot: {name}", extra={"namespace": namespace})
+            return True
+        except ApiException as e:
+            if e.status == 404:
+                return True
+            logger.error(f"Error deleting VolumeSnapshot: {e}", extra={"namespace": namespace})
+            return False
+
+    def delete_volume_snapshot_content(self, name):
+        """Delete a VolumeSnapshotContent; a missing one counts as deleted"""
+        try:
+            self.custom_objects.delete_cluster_custom_object(
+                SNAPSHOT_GROUP, SNAPSHOT_VERSION, "volumesnapshotcontents", name
+            )
+            logger.info(f"Deleted VolumeSnapshotContent: {name}")
+            return True
+        except ApiException as e:
+            if e.status == 404:
+                return True
+            logger.error(f"Error deleting VolumeSnapshotContent: {e}")
+            return False
+
+    def create_job(self, namespace, job_spec):
+        """Create a Job"""
+        try:
+            self.batch_v1.create_namespaced_job(namespace, job_spec)
+            logger.info(f"Created Job: {job_spec.metadata.name}", extra={"namespace": namespace})
+            return True
+        except ApiException as e:
+            if e.status == 409:
+                logger.warning(f"Job {job_spec.metadata.name} already exists", extra={"namespace": namespace})
+                return True
+            logger.error(f"Error creating Job: {e}", extra={"namespace": namespace})
+            return False
+
+    def delete_job(self, namespace, name):
+        """Delete a Job and its pods; a missing Job counts as deleted"""
+        try:
+            self.batch_v1.delete_namespaced_job(name, namespace, propagation_policy="Background")
+            logger.info(f"Deleted Job: {name}", extra={"namespace": namespace})
+            return True
+        except ApiException as e:
+            if e.status == 404:
+                return True
+            logger.error(f"Error deleting Job: {e}", extra={"namespace": namespace})
+            return False
+
+    def get_latest_job(self, namespace, label_selector):
+        """
+        Most recent Job matching a label selector, with its state
+        (running/succeeded/failed) and the log of its last pod; None if there is none.
+        """
+        try:
+            jobs = self.batch_v1.list_namespaced_job(namespace, label_selector=label_selector).items
+            if not jobs:
+                return None
+            job = max(jobs, key=lambda j: j.metadata.creation_timestamp)
+            if job.status.succeeded:
+                state = "succeeded"
+            elif job.status.failed:
+                state = "failed"
+            else:
+                state = "running"
+
+            log = None
+            pods = self.core_v1.list_namespaced_pod(namespace, label_selector=f"job-name={job.metadata.name}").items
+            if pods and state != "running":
+                pod = max(pods, key=lambda p: p.metadata.creation_timestamp)
+                log = self.core_v1.read_namespaced_pod_log(pod.metadata.name, namespace)
+            return {
+                "name": job.metadata.name,
+                "state": state,
+                "started_at": job.status.start_time.isoformat() if job.status.start_time else None,
+                "finished_at": job.status.completion_time.isoformat() if job.status.completion_time else None,
+                "log": log,
+            }
+        except ApiException as e:
+            logger.error(f"Error reading Jobs: {e}", extra={"namespace": namespace})
+            return None
+
+    def apply_daemonset(self, namespace, daemonset_spec):
+        """Replace a DaemonSet with daemonset_spec, creating it if it does not exist"""
+        name = daemonset_spec.metadata.name
+        try:
+            self.apps_v1.replace_namespaced_daemon_set(name, namespace, daemonset_spec)
+            logger.info(f"Updated DaemonSet: {name}", extra={"namespace": namespace})
+            return True
+        except ApiException as e:
+            if e.status != 404:
+                logger.error(f"Error updating DaemonSet: {e}", extra={"namespace": namespace})
+                return False
+        try:
+            self.apps_v1.create_namespaced_daemon_set(namespace, daemonset_spec)
+            logger.info(f"Created DaemonSet: {name}", extra={"namespace": namespace})
+            return True
+        except ApiException as e:
+            logger.error(f"Error creating DaemonSet: {e}", extra={"namespace": namespace})
+            return False
+
+    def get_daemonset_status(self, namespace, name):
+        """Rollout of a DaemonSet and its annotations; None if it does not exist or cannot be read"""
+        try:
+            ds = self.apps_v1.read_namespaced_daemon_set(name, namespace)
+        except ApiException as e:
+            if e.status != 404:
+                logger.error(f"Error reading DaemonSet: {e}", extra={"namespace": namespace})
+            return None
+        return {
+            "annotations": ds.metadata.annotations or {},
+            "desired": ds.status.desired_number_scheduled or 0,
+            "ready": ds.status.number_ready or 0,
+            "updated": ds.status.updated_number_scheduled or 0,
+        }
+
+    def list_node_images(self):
+        """[{name, images}] with every image name/digest each node has cached; None on error"""
+        try:
+            nodes = self.core_v1.list_node()
+        except ApiException as e:
+            logger.error(f"Error listing nodes: {e}")
+            return None
+        return [
+            {
+                "name": node.metadata.name,
+                "images": {name for img in (node.status.images or []) for name in (img.names or [])},
+            }
+            for node in nodes.items
+        ]
+
     def list_store_namespaces(self):
         """List all store namespaces"""
         try:
@@ -208,5 +846,26 @@ class K8sClient:
             )
             return [ns.metadata.name for ns in namespaces.items]
         except ApiException as e:
-            print(f"✗ Error listing namespaces: {e}")
-            return []
\ No newline at end of file
+            logger.error(f"Error listing namespaces: {e}")
+            return []
+
+    def list_store_namespace_info(self):
+        """
+        List store namespaces with their creation time and phase (Active/Terminating).
+        Returns None if the API call fails, so callers never mistake an error for "no namespaces".
+        """
+        try:
+            namespaces = self.core_v1.list_namespace(
+                label_selector="app=store,managed-by=store-platform"
+            )
+        except ApiException as e:
+            logger.error(f"Error listing namespaces: {e}")
+            return None
+        return [
+            {
+                "name": ns.metadata.name,
+                "created_at": ns.metadata.creation_timestamp,
+                "phase": ns.status.phase if ns.status else None,
+            }
+            for ns in namespaces.items
+        ]
@@ -0,0 +1,191 @@
+"""
+Prometheus metrics
+Histograms for provisioning steps, Kubernetes API calls, database queries and
+HTTP routes, plus per-status store gauges computed at scrape time.
+"""
+import time
+
+from flask import g, request
+from prometheus_client import Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, REGISTRY, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+from sqlalchemy import event
+
+# Store creation spans seconds (API calls) to minutes (MySQL wait, image pulls)
+_SLOW_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 45, 60, 90, 120, 180, 300, 600)
+_READY_BUCKETS = (15, 30, 45, 60, 90, 120, 180, 240, 300, 450, 600, 900, 1200, 1800, 3600)
+_FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+PROVISION_STEP_SECONDS = Histogram(
+    "store_provision_step_seconds",
+    "Duration of each store provisioning step",
+    ["step", "outcome"],
+    buckets=_SLOW_BUCKETS,
+)
+STORE_TIME_TO_READY_SECONDS = Histogram(
+    "store_time_to_ready_seconds",
+    "Time from store registration until its WordPress pod is ready",
+    buckets=_READY_BUCKETS,
+)
+ADMISSION_WAIT_SECONDS = Histogram(
+    "store_provision_admission_wait_seconds",
+    "Time a provisioning request waited for an admission slot",
+    buckets=_SLOW_BUCKETS,
+)
+K8S_API_SECONDS = Histogram(
+    "k8s_api_request_seconds",
+    "Kubernetes API call latency",
+    ["verb", "resource"],
+    buckets=_FAST_BUCKETS,
+)
+K8S_API_ERRORS = Counter(
+    "k8s_api_errors_total",
+    "Kubernetes API calls that raised an error",
+    ["verb", "resource", "code"],
+)
+DB_QUERY_SECONDS = Histogram(
+    "db_query_seconds",
+    "Database statement latency",
+    ["operation"],
+    buckets=_FAST_BUCKETS,
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_seconds",
+    "HTTP request latency per route",
+    ["method", "route", "status"],
+    buckets=_FAST_BUCKETS,
+)
+LOG_RECORDS_DROPPED = Counter(
+    "log_records_dropped_total",
+    "Log records dropped because the logging queue was full",
+    ["level"],
+)
+GC_ACTIONS = Counter(
+    "store_gc_actions_total",
+    "Repairs and reclaims performed by the garbage collector",
+    ["kind", "outcome"],
+)
+INGRESS_SHARD_WRITES = Counter(
+    "store_ingress_shard_writes_total",
+    "Writes of consolidated routing Ingress shards, each carrying a batch of route changes",
+    ["outcome"],
+)
+HIBERNATION_TRANSITIONS = Counter(
+    "store_hibernation_transitions_total",
+    "Stores hibernated and woken",
+    ["action", "outcome"],
+)
+STORE_WAKE_SECONDS = Histogram(
+    "store_wake_seconds",
+    "Time from a wake request until the store serves traffic again",
+    buckets=_SLOW_BUCKETS,
+)
+BACKUPS = Counter(
+    "store_backups_total",
+    "Finished store backups",
+    ["kind", "outcome"],
+)
+BACKUP_SECONDS = Histogram(
+    "store_backup_seconds",
+    "Run time of a backup Job, from start to completion",
+    buckets=_SLOW_BUCKETS,
+)
+RESTORES = Counter(
+    "store_restores_total",
+    "Finished store restores",
+    ["target", "outcome"],
+)
+PROVISIONS_IN_FLIGHT = Gauge(
+    "store_provisions_in_flight",
+    "Store pipelines currently holding an admission slot",
+)
+PROVISIONS_QUEUED = Gauge(
+    "store_provisions_queued",
+    "Store pipelines waiting for an admission slot",
+)
+STORES_NEAR_QUOTA = Gauge(
+    "stores_near_quota",
+    "Stores using more than QUOTA_NEAR_LIMIT_PERCENT of a ResourceQuota resource",
+)
+CLUSTER_CAPACITY_REMAINING = Gauge(
+    "store_cluster_capacity_remaining",
+    "Free capacity per cluster after running pods and reservations: cpu, memory_bytes, pods, "
+    "storage_bytes:<class> and stores:<plan> (default stores of that plan that still fit)",
+    ["cluster", "resource"],
+)
+
+
+def observe_k8s_call(verb, resource, fn, *args, **kwargs):
+    """Time a Kubernetes API call, counting failures by HTTP status"""
+    start = time.perf_counter()
+    try:
+        return fn(*args, **kwargs)
+    except Exception as e:
+        K8S_API_ERRORS.labels(verb, resource, str(getattr(e, "status", None) or "error")).inc()
+        raise
+    finally:
+        K8S_API_SECONDS.labels(verb, resource).observe(time.perf_counter() - start)
+
+
+def render_latest(scheduler=None):
+    """Render every registered metric in the Prometheus text format; returns (body, content type)"""
+    if scheduler is not None:
+        stats = scheduler.stats()
+        PROVISIONS_IN_FLIGHT.set(stats["in_flight"])
+        PROVISIONS_QUEUED.set(stats["queued"])
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+class _StoreStatusCollector:
+    """Counts stores per status from the database on every scrape"""
+
+    def __init__(self, app):
+        self.app = app
+
+    def collect(self):
+        import database
+
+        family = GaugeMetricFamily("stores", "Stores per status", labels=["status"])
+        with self.app.app_context():
+            for status, count in database.count_stores_by_status().items():
+                family.add_metric([status or "unknown"], count)
+        yield family
+
+
+def init_metrics(app, scheduler=None):
+    """Instrument the Flask app, its database engine and the provisioning scheduler"""
+    from models import db
+
+    @app.before_request
+    def _start_timer():
+        g._metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _record_request(response):
+        start = getattr(g, "_metrics_start", None)
+        if start is not None:
+            route = request.url_rule.rule if request.url_rule else "unmatched"
+            HTTP_REQUEST_SECONDS.labels(request.method, route, str(response.status_code)).observe(
+                time.perf_counter() - start
+            )
+        return response
+
+    with app.app_context():
+        engine = db.engine
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_execute(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._metrics_query_start = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_execute(conn, cursor, statement, parameters, context, executemany):
+        start = getattr(context, "_metrics_query_start", None)
+        if start is None:
+            return
+        operation = statement.lstrip().split(" ", 1)[0].upper() or "UNKNOWN"
+        DB_QUERY_SECONDS.labels(operation).observe(time.perf_counter() - start)
+
+    if scheduler is not None:
+        scheduler.add_wait_observer(lambda user_id, wait: ADMISSION_WAIT_SECONDS.observe(wait))
+
+    REGISTRY.register(_StoreStatusCollector(app))
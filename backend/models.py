@@ -1,3 +1,4 @@
+import json
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.orm import DeclarativeBase
 from datetime import datetime
@@ -9,6 +10,8 @@ class Base(DeclarativeBase):
 db = SQLAlchemy(model_class=Base)
 bcrypt = Bcrypt()
 
+DEFAULT_MAX_PLAN_UNITS = 6
+
 class User(db.Model):
     __tablename__ = 'users'
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
@@ -16,6 +19,8 @@ class User(db.Model):
     password_hash = db.Column(db.String(128), nullable=False)
     max_stores = db.Column(db.Integer, default=3)
     max_storage_gi = db.Column(db.Integer, default=10)
+    provisioning_weight = db.Column(db.Integer, default=1)  # Share of provisioning slots under contention
+    max_plan_units = db.Column(db.Integer, default=DEFAULT_MAX_PLAN_UNITS)  # Budget for store plans (small=1, medium=2, large=4)
     
     # Relationship
     stores = db.relationship('Store', back_populates='user', cascade='all, delete-orphan')
@@ -31,7 +36,9 @@ class User(db.Model):
             'id': self.id,
             'username': self.username,
             'max_stores': self.max_stores,
-            'max_storage_gi': self.max_storage_gi
+            'max_storage_gi': self.max_storage_gi,
+            'provisioning_weight': self.provisioning_weight or 1,
+            'max_plan_units': self.max_plan_units if self.max_plan_units is not None else DEFAULT_MAX_PLAN_UNITS
         }
 
 class Store(db.Model):
@@ -40,13 +47,38 @@ class Store(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     name = db.Column(db.String)
     storage_size_gi = db.Column(db.Integer, default=2)
-    status = db.Column(db.String, default='initialized')  # initialized, provisioning, ready, failed, deleted
+    status = db.Column(db.String, default='initialized')  # initialized, queued, provisioning, ready, failed, deleted, hibernated, waking, restoring
     store_url = db.Column(db.String)
     admin_password = db.Column(db.String)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    # Provisioning inputs, kept so an interrupted create can be resumed
+    sample_products = db.Column(db.Text)
+    wordpress_storage_gi = db.Column(db.Integer)
+    trace_id = db.Column(db.String(32))  # Trace of the request that created the store
+    admission_wait_seconds = db.Column(db.Float)  # Time the latest pipeline run queued for an admission slot
+    status_changed_at = db.Column(db.DateTime)
+    failure_reason = db.Column(db.Text)  # Classified cause, e.g. "image_pull: ..."
+    plan = db.Column(db.String)  # Size tier from plans.PLANS; NULL for stores created before plans
+    db_mode = db.Column(db.String)  # "dedicated" (own MySQL StatefulSet) or "shared"; NULL means dedicated
+    db_instance = db.Column(db.String, index=True)  # Shared MySQL instance holding the store's database
+    db_password = db.Column(db.String)  # Password of the store's scoped user on a shared instance
+    object_cache = db.Column(db.String)  # Redis object cache: "dedicated", "shared" or NULL for none
+    runtime = db.Column(db.String)  # WordPress runtime: "apache" or "fpm"; NULL means apache
+    last_request_at = db.Column(db.DateTime)  # Last time ingress metrics or the activator saw traffic
+    hibernated_at = db.Column(db.DateTime)
+    autoscaling = db.Column(db.String)  # HPA target: "cpu", "requests" or NULL for a single replica
+    ingress_mode = db.Column(db.String)  # "per_store" (own Ingress) or "consolidated" (route on a shared shard); NULL means per_store
+    cloned_from = db.Column(db.String)  # Source store id for stores restored from its volume snapshots
+    cluster = db.Column(db.String, index=True)  # Cluster from clusters.CLUSTERS running the store; NULL means DEFAULT_CLUSTER
+    quota_usage = db.Column(db.Text)  # JSON {resource: {"used", "hard"}} read back from the namespace ResourceQuota
+    quota_utilization = db.Column(db.Float, index=True)  # Highest used / hard ratio in quota_usage
+    quota_checked_at = db.Column(db.DateTime)
+
     # Relationship
     user = db.relationship('User', back_populates='stores')
+    steps = db.relationship('ProvisioningStep', back_populates='store', cascade='all, delete-orphan',
+                            order_by='ProvisioningStep.position')
 
     def to_dict(self):
         return {
@@ -57,5 +89,162 @@ class Store(db.Model):
             'status': self.status,
             'store_url': self.store_url,
             'admin_password': self.admin_password,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'sample_products': self.sample_products,
+            'wordpress_storage_gi': self.wordpress_storage_gi,
+            'trace_id': self.trace_id,
+            'admission_wait_seconds': self.admission_wait_seconds,
+            'status_changed_at': self.status_changed_at.isoformat() if self.status_changed_at else None,
+            'failure_reason': self.failure_reason,
+            'plan': self.plan,
+            'db_mode': self.db_mode or 'dedicated',
+            'db_instance': self.db_instance,
+            'db_password': self.db_password,
+            'object_cache': self.object_cache,
+            'runtime': self.runtime or 'apache',
+            'autoscaling': self.autoscaling,
+            'ingress_mode': self.ingress_mode or 'per_store',
+            'last_request_at': self.last_request_at.isoformat() if self.last_request_at else None,
+            'hibernated_at': self.hibernated_at.isoformat() if self.hibernated_at else None,
+            'cloned_from': self.cloned_from,
+            'cluster': self.cluster,
+            'quota_usage': json.loads(self.quota_usage) if self.quota_usage else None,
+            'quota_utilization': self.quota_utilization,
+            'quota_checked_at': self.quota_checked_at.isoformat() if self.quota_checked_at else None
+        }
+
+class ProvisioningStep(db.Model):
+    """Journal entry for one step of a store's provisioning pipeline"""
+    __tablename__ = 'provisioning_steps'
+    __table_args__ = (db.UniqueConstraint('store_id', 'step'),)
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    store_id = db.Column(db.String, db.ForeignKey('stores.id'), nullable=False, index=True)
+    step = db.Column(db.String, nullable=False)
+    position = db.Column(db.Integer, nullable=False, default=0)
+    state = db.Column(db.String, nullable=False, default='pending')  # pending, running, done, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    # Relationship
+    store = db.relationship('Store', back_populates='steps')
+
+    def to_dict(self):
+        duration_ms = None
+        if self.started_at and self.finished_at:
+            duration_ms = int((self.finished_at - self.started_at).total_seconds() * 1000)
+        return {
+            'step': self.step,
+            'state': self.state,
+            'attempts': self.attempts,
+            'error': self.error,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'duration_ms': duration_ms
+        }
+
+class IdempotencyKey(db.Model):
+    """Stored outcome of a POST /api/stores call, keyed by the client's Idempotency-Key"""
+    __tablename__ = 'idempotency_keys'
+    __table_args__ = (db.UniqueConstraint('user_id', 'key'),)
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    key = db.Column(db.String(255), nullable=False)
+    fingerprint = db.Column(db.String(64), nullable=False)
+    status = db.Column(db.String, nullable=False, default='in_progress')  # in_progress, completed
+    store_id = db.Column(db.String)
+    response_code = db.Column(db.Integer)
+    response_body = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    def to_dict(self):
+        return {
+            'key': self.key,
+            'fingerprint': self.fingerprint,
+            'status': self.status,
+            'store_id': self.store_id,
+            'response_code': self.response_code,
+            'response_body': self.response_body,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'expires_at': self.expires_at.isoformat() if self.expires_at else None
+        }
+
+class Backup(db.Model):
+    """One backup of a store's database and wp-content, run as a Job in its namespace"""
+    __tablename__ = 'backups'
+    __table_args__ = (db.Index('ix_backups_status_created', 'status', 'created_at'),)
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    # No foreign key: backups outlive the store, so a deleted store can be restored
+    store_id = db.Column(db.String, nullable=False, index=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    kind = db.Column(db.String, nullable=False, default='manual')  # manual, scheduled
+    status = db.Column(db.String, nullable=False, default='pending')  # pending, running, succeeded, failed
+    # What a restore into a new store needs from the source
+    store_url = db.Column(db.String)
+    plan = db.Column(db.String)
+    runtime = db.Column(db.String)
+    wordpress_storage_gi = db.Column(db.Integer)
+    location = db.Column(db.String)  # Object prefix of the dump and wp-content tarball
+    job_name = db.Column(db.String)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'store_id': self.store_id,
+            'user_id': self.user_id,
+            'kind': self.kind,
+            'status': self.status,
+            'store_url': self.store_url,
+            'plan': self.plan,
+            'runtime': self.runtime,
+            'wordpress_storage_gi': self.wordpress_storage_gi,
+            'location': self.location,
+            'job_name': self.job_name,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+class StoreEvent(db.Model):
+    """Append-only record of a store status transition"""
+    __tablename__ = 'store_events'
+    __table_args__ = (db.Index('ix_store_events_status_time', 'to_status', 'created_at'),)
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    # No foreign key: history outlives the store row
+    store_id = db.Column(db.String, nullable=False, index=True)
+    user_id = db.Column(db.Integer)
+    from_status = db.Column(db.String)
+    to_status = db.Column(db.String, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'store_id': self.store_id,
+            'user_id': self.user_id,
+            'from_status': self.from_status,
+            'to_status': self.to_status,
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
+
+class StoreEventRollup(db.Model):
+    """Daily histogram of lifecycle durations, kept after raw events are compacted away"""
+    __tablename__ = 'store_event_rollups'
+    __table_args__ = (db.UniqueConstraint('day', 'kind'),)
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    day = db.Column(db.Date, nullable=False, index=True)
+    kind = db.Column(db.String, nullable=False)  # provisioning, deletion
+    count = db.Column(db.Integer, nullable=False, default=0)
+    total_seconds = db.Column(db.Float, nullable=False, default=0.0)
+    buckets = db.Column(db.Text, nullable=False, default='{}')  # JSON: upper bound (seconds) -> count
@@ -0,0 +1,200 @@
+"""
+Redis object cache for WordPress
+Stores can opt into a persistent object cache (the redis-cache plugin):
+
+    dedicated  a small Redis Deployment in the store namespace
+    shared     a key prefix (store_<id>:) on a shared Redis, configured with
+               SHARED_REDIS_HOST / SHARED_REDIS_PORT / SHARED_REDIS_PASSWORD
+
+Either way WordPress talks to a `redis` service in its namespace. On the
+shared instance each store authenticates as its own ACL user (store_<id>),
+which can only touch keys under its prefix; the admin password stays with
+the backend. Users are written to the instance's aclfile when it has one.
+
+This module also carries a minimal RESP client, used to read hit rates and
+to manage store users and keys on the shared instance, so the backend needs
+no Redis library.
+"""
+import logging
+import os
+import socket
+
+MODES = ("dedicated", "shared")
+
+SHARED_REDIS_HOST = os.environ.get("SHARED_REDIS_HOST")
+SHARED_REDIS_PORT = int(os.environ.get("SHARED_REDIS_PORT", 6379))
+SHARED_REDIS_PASSWORD = os.environ.get("SHARED_REDIS_PASSWORD")
+
+_TIMEOUT_SECONDS = 5
+
+# Cache commands only: no admin, no keyless dangerous commands (FLUSHDB, KEYS, ...), INFO for diagnostics
+_STORE_USER_RULES = ("resetchannels", "-@all", "+@read", "+@write", "+@connection", "+@transaction",
+                     "+@scripting", "-@dangerous", "+info")
+
+logger = logging.getLogger(__name__)
+
+
+class RedisError(Exception):
+    """Raised when Redis is unreachable or returns an error reply"""
+
+
+def key_prefix(store_id):
+    return f"store_{store_id}:"
+
+
+def acl_user(store_id):
+    return f"store_{store_id}"
+
+
+def is_shared_available():
+    return bool(SHARED_REDIS_HOST)
+
+
+def connection_settings(store_id, mode):
+    """Values for the WordPress config: host/port as seen from the store namespace, and the key prefix"""
+    return {
+        "host": "redis",
+        "port": SHARED_REDIS_PORT if mode == "shared" else 6379,
+        "prefix": key_prefix(store_id),
+    }
+
+
+class _Connection:
+    """One RESP connection; enough of the protocol for INFO, SCAN and UNLINK"""
+
+    def __init__(self, host, port, password=None):
+        try:
+            self._sock = socket.create_connection((host, port), timeout=_TIMEOUT_SECONDS)
+        except OSError as e:
+            raise RedisError(f"Cannot connect to Redis at {host}:{port}: {e}") from e
+        self._file = self._sock.makefile("rb")
+        if password:
+            self.command("AUTH", password)
+
+    def command(self, *args):
+        parts = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            data = str(arg).encode("utf-8", "surrogateescape")
+            parts.append(f"${len(data)}\r\n".encode() + data + b"\r\n")
+        try:
+            self._sock.sendall(b"".join(parts))
+            return self._read_reply()
+        except OSError as e:
+            raise RedisError(f"Redis connection failed: {e}") from e
+
+    def _read_reply(self):
+        line = self._file.readline()
+        if not line:
+            raise RedisError("Redis closed the connection")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode()
+        if kind == b"-":
+            raise RedisError(rest.decode())
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            length = int(rest)
+            if length < 0:
+                return None
+            data = self._file.read(length + 2)
+            # surrogateescape round-trips binary key names back into UNLINK unchanged
+            return data[:-2].decode("utf-8", "surrogateescape")
+        if kind == b"*":
+            length = int(rest)
+            return None if length < 0 else [self._read_reply() for _ in range(length)]
+        raise RedisError(f"Unexpected Redis reply: {line!r}")
+
+    def close(self):
+        self._file.close()
+        self._sock.close()
+
+
+def _parse_info(text):
+    info = {}
+    for line in (text or "").splitlines():
+        if line and not line.startswith("#") and ":" in line:
+            key, _, value = line.partition(":")
+            info[key] = value
+    return info
+
+
+def cache_stats(store_id, mode, namespace):
+    """
+    Hit rate and memory of the Redis serving a store. A shared instance only
+    reports instance-wide counters, so "scope" tells the two apart.
+    """
+    if mode == "shared":
+        host, port, password, scope = SHARED_REDIS_HOST, SHARED_REDIS_PORT, SHARED_REDIS_PASSWORD, "shared_instance"
+    else:
+        host, port, password, scope = f"redis.{namespace}.svc.cluster.local", 6379, None, "store"
+
+    conn = _Connection(host, port, password)
+    try:
+        stats = _parse_info(conn.command("INFO", "stats"))
+        memory = _parse_info(conn.command("INFO", "memory"))
+        keys = None
+        if mode == "dedicated":
+            keys = conn.command("DBSIZE")
+    finally:
+        conn.close()
+
+    hits = int(stats.get("keyspace_hits", 0))
+    misses = int(stats.get("keyspace_misses", 0))
+    return {
+        "mode": mode,
+        "scope": scope,
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": round(hits / (hits + misses), 4) if hits + misses else None,
+        "evicted_keys": int(stats.get("evicted_keys", 0)),
+        "used_memory_bytes": int(memory.get("used_memory", 0)),
+        "maxmemory_bytes": int(memory.get("maxmemory", 0)),
+        "keys": keys,
+    }
+
+
+def create_store_user(store_id, password):
+    """Create (or reset) a store's ACL user on the shared Redis, limited to the store's key prefix"""
+    conn = _Connection(SHARED_REDIS_HOST, SHARED_REDIS_PORT, SHARED_REDIS_PASSWORD)
+    try:
+        conn.command("ACL", "SETUSER", acl_user(store_id), "reset", "on", f">{password}",
+                     f"~{key_prefix(store_id)}*", *_STORE_USER_RULES)
+        _save_acl(conn)
+    finally:
+        conn.close()
+
+
+def drop_store_user(store_id):
+    """Remove a store's ACL user from the shared Redis (no-op if it does not exist)"""
+    conn = _Connection(SHARED_REDIS_HOST, SHARED_REDIS_PORT, SHARED_REDIS_PASSWORD)
+    try:
+        conn.command("ACL", "DELUSER", acl_user(store_id))
+        _save_acl(conn)
+    finally:
+        conn.close()
+
+
+def _save_acl(conn):
+    try:
+        conn.command("ACL", "SAVE")
+    except RedisError as e:
+        # Without an aclfile the users live until the instance restarts
+        logger.warning(f"Could not save Redis ACL users: {e}")
+
+
+def purge_store_keys(store_id, batch_size=500):
+    """Remove a store's keys from the shared Redis; returns how many were removed"""
+    conn = _Connection(SHARED_REDIS_HOST, SHARED_REDIS_PORT, SHARED_REDIS_PASSWORD)
+    removed = 0
+    try:
+        cursor = "0"
+        while True:
+            cursor, keys = conn.command("SCAN", cursor, "MATCH", f"{key_prefix(store_id)}*", "COUNT", batch_size)
+            if keys:
+                removed += conn.command("UNLINK", *keys)
+            if cursor == "0":
+                break
+    finally:
+        conn.close()
+    return removed
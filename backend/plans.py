@@ -0,0 +1,123 @@
+"""
+Store plans (size tiers)
+Each plan sets container requests/limits for MySQL, WordPress, the setup
+init container and the optional Redis object cache, the MySQL buffer pool and connection limit, PHP memory and
+OPcache settings, and the replica range and targets for autoscaled stores. Memory requests equal limits, so a store never uses more
+memory than it reserved (and is not the first evicted under node pressure),
+and the scheduler can bin-pack stores by their requests.
+
+Plans cost quota units (users.max_plan_units) in addition to storage.
+Storage classes per plan and volume come from the environment, since class
+names are cluster specific; volumes without one use the cluster default.
+
+    DEFAULT_STORE_PLAN=small
+    PLAN_STORAGE_CLASSES={"large": {"mysql": "fast-ssd", "wordpress": "fast-ssd"}}
+"""
+import json
+import os
+
+PLANS = {
+    "small": {
+        "units": 1,
+        "description": "Up to a few hundred products and light traffic",
+        "mysql": {
+            "resources": {"requests": {"cpu": "100m", "memory": "512Mi"}, "limits": {"cpu": "500m", "memory": "512Mi"}},
+            "innodb_buffer_pool_size": "128M",
+            "max_connections": 40,
+        },
+        "wordpress": {
+            "resources": {"requests": {"cpu": "100m", "memory": "256Mi"}, "limits": {"cpu": "500m", "memory": "256Mi"}},
+            "php_memory_limit": "128M",
+            "opcache_memory_mb": 64,
+            "opcache_max_files": 4000,
+        },
+        "redis": {
+            "resources": {"requests": {"cpu": "25m", "memory": "96Mi"}, "limits": {"cpu": "200m", "memory": "96Mi"}},
+            "maxmemory": "64mb",
+        },
+        "autoscaling": {"min_replicas": 1, "max_replicas": 3, "target_cpu_percent": 70, "target_requests_per_second": 10},
+    },
+    "medium": {
+        "units": 2,
+        "description": "Thousands of products and steady traffic",
+        "mysql": {
+            "resources": {"requests": {"cpu": "250m", "memory": "1Gi"}, "limits": {"cpu": "1", "memory": "1Gi"}},
+            "innodb_buffer_pool_size": "512M",
+            "max_connections": 80,
+        },
+        "wordpress": {
+            "resources": {"requests": {"cpu": "250m", "memory": "512Mi"}, "limits": {"cpu": "1", "memory": "512Mi"}},
+            "php_memory_limit": "256M",
+            "opcache_memory_mb": 128,
+            "opcache_max_files": 10000,
+        },
+        "redis": {
+            "resources": {"requests": {"cpu": "50m", "memory": "192Mi"}, "limits": {"cpu": "250m", "memory": "192Mi"}},
+            "maxmemory": "128mb",
+        },
+        "autoscaling": {"min_replicas": 1, "max_replicas": 5, "target_cpu_percent": 70, "target_requests_per_second": 20},
+    },
+    "large": {
+        "units": 4,
+        "description": "Large catalogues and busy shops",
+        "mysql": {
+            "resources": {"requests": {"cpu": "500m", "memory": "2Gi"}, "limits": {"cpu": "2", "memory": "2Gi"}},
+            "innodb_buffer_pool_size": "1280M",
+            "max_connections": 150,
+        },
+        "wordpress": {
+            "resources": {"requests": {"cpu": "500m", "memory": "1Gi"}, "limits": {"cpu": "2", "memory": "1Gi"}},
+            "php_memory_limit": "512M",
+            "opcache_memory_mb": 256,
+            "opcache_max_files": 20000,
+        },
+        "redis": {
+            "resources": {"requests": {"cpu": "100m", "memory": "384Mi"}, "limits": {"cpu": "500m", "memory": "384Mi"}},
+            "maxmemory": "256mb",
+        },
+        "autoscaling": {"min_replicas": 2, "max_replicas": 8, "target_cpu_percent": 70, "target_requests_per_second": 40},
+    },
+}
+
+_STORAGE_CLASSES = json.loads(os.environ.get("PLAN_STORAGE_CLASSES") or "{}")
+for _name, _plan in PLANS.items():
+    _plan["storage"] = {
+        "mysql_class": _STORAGE_CLASSES.get(_name, {}).get("mysql"),
+        "wordpress_class": _STORAGE_CLASSES.get(_name, {}).get("wordpress"),
+    }
+
+# wp-cli installs WooCommerce in the init container and needs more than the runtime PHP limit
+SETUP_RESOURCES = {"requests": {"cpu": "100m", "memory": "256Mi"}, "limits": {"cpu": "1", "memory": "768Mi"}}
+
+DEFAULT_PLAN = os.environ.get("DEFAULT_STORE_PLAN", "small")
+
+
+def get_plan(name):
+    """Plan settings by name (None for an unknown plan); stores created before plans use the default"""
+    return PLANS.get(name or DEFAULT_PLAN)
+
+
+def plan_units(name):
+    plan = get_plan(name)
+    return plan["units"] if plan else PLANS[DEFAULT_PLAN]["units"]
+
+
+def list_plans():
+    """Public summary of the plans for the API"""
+    return [
+        {
+            "name": name,
+            "units": plan["units"],
+            "description": plan["description"],
+            "mysql": {"memory": plan["mysql"]["resources"]["limits"]["memory"],
+                      "cpu": plan["mysql"]["resources"]["limits"]["cpu"]},
+            "wordpress": {"memory": plan["wordpress"]["resources"]["limits"]["memory"],
+                          "cpu": plan["wordpress"]["resources"]["limits"]["cpu"],
+                          "php_memory_limit": plan["wordpress"]["php_memory_limit"]},
+            "storage": plan["storage"],
+            "autoscaling": {"min_replicas": plan["autoscaling"]["min_replicas"],
+                            "max_replicas": plan["autoscaling"]["max_replicas"]},
+            "default": name == DEFAULT_PLAN,
+        }
+        for name, plan in PLANS.items()
+    ]
@@ -0,0 +1,142 @@
+"""
+Provisioning admission control
+Caps how many store pipelines run at once, globally and per user, and hands
+out free slots in weighted fair order across users (start-time fair queuing):
+a user with weight 2 is admitted twice as often as a user with weight 1 while
+both have work queued, and a user who floods the queue only delays themselves.
+"""
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+
+
+class AdmissionTimeout(Exception):
+    """Raised when a provisioning request waited too long for a slot"""
+
+
+class _Ticket:
+    def __init__(self, user_id, tag, seq):
+        self.user_id = user_id
+        self.tag = tag
+        self.seq = seq
+        self.enqueued_at = time.monotonic()
+
+
+class ProvisioningScheduler:
+    def __init__(self, max_in_flight, max_per_user):
+        self.max_in_flight = max_in_flight
+        self.max_per_user = max_per_user
+
+        self._cond = threading.Condition()
+        self._waiting = []
+        self._seq = itertools.count()
+        self._virtual_time = 0.0
+        self._finish_tags = {}  # user_id -> virtual finish tag of their last request
+        self._running = {}  # user_id -> in-flight count
+        self._in_flight = 0
+
+        # Counters for reporting
+        self._admitted = 0
+        self._timed_out = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._observers = []
+
+    def add_wait_observer(self, fn):
+        """Call fn(user_id, wait_seconds) every time a request is admitted"""
+        self._observers.append(fn)
+
+    @contextmanager
+    def admit(self, user_id, weight=1, timeout=None):
+        """Hold a provisioning slot for the duration of the block; yields the wait in seconds"""
+        wait = self.acquire(user_id, weight=weight, timeout=timeout)
+        try:
+            yield wait
+        finally:
+            self.release(user_id)
+
+    def acquire(self, user_id, weight=1, timeout=None):
+        """Block until a slot is free for this user; returns seconds spent waiting"""
+        weight = max(float(weight or 1), 0.01)
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        with self._cond:
+            start_tag = max(self._virtual_time, self._finish_tags.get(user_id, 0.0))
+            self._finish_tags[user_id] = start_tag + 1.0 / weight
+            ticket = _Ticket(user_id, start_tag, next(self._seq))
+            self._waiting.append(ticket)
+
+            while not self._is_next(ticket):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    self._waiting.remove(ticket)
+                    # Give back the virtual time this request reserved
+                    self._finish_tags[user_id] -= 1.0 / weight
+                    self._timed_out += 1
+                    self._cond.notify_all()
+                    raise AdmissionTimeout(f"No provisioning slot within {timeout:g}s")
+                self._cond.wait(remaining)
+
+            self._waiting.remove(ticket)
+            self._virtual_time = max(self._virtual_time, ticket.tag)
+            self._in_flight += 1
+            self._running[user_id] = self._running.get(user_id, 0) + 1
+
+            wait = time.monotonic() - ticket.enqueued_at
+            self._admitted += 1
+            self._total_wait += wait
+            self._max_wait = max(self._max_wait, wait)
+            # Others may now be first in line for a different user
+            self._cond.notify_all()
+
+        for observer in self._observers:
+            observer(user_id, wait)
+        return wait
+
+    def release(self, user_id):
+        """Free the slot held by a finished pipeline"""
+        with self._cond:
+            self._in_flight -= 1
+            self._running[user_id] -= 1
+            if not self._running[user_id]:
+                del self._running[user_id]
+            if not self._running.get(user_id) and not any(t.user_id == user_id for t in self._waiting):
+                # Idle users don't bank credit; they rejoin at the current virtual time
+                self._finish_tags.pop(user_id, None)
+            self._cond.notify_all()
+
+    def _is_next(self, ticket):
+        """Whether ticket is the earliest-tagged waiter that may run right now"""
+        if self._in_flight >= self.max_in_flight:
+            return False
+        eligible = [
+            t for t in self._waiting
+            if self._running.get(t.user_id, 0) < self.max_per_user
+        ]
+        if not eligible:
+            return False
+        return min(eligible, key=lambda t: (t.tag, t.seq)) is ticket
+
+    def stats(self):
+        """Snapshot of queue state and admission wait counters"""
+        with self._cond:
+            return {
+                "max_in_flight": self.max_in_flight,
+                "max_per_user": self.max_per_user,
+                "in_flight": self._in_flight,
+                "queued": len(self._waiting),
+                "running_by_user": dict(self._running),
+                "queued_by_user": _count_by_user(self._waiting),
+                "admitted_total": self._admitted,
+                "timed_out_total": self._timed_out,
+                "admission_wait_seconds_total": round(self._total_wait, 3),
+                "admission_wait_seconds_max": round(self._max_wait, 3),
+            }
+
+
+def _count_by_user(tickets):
+    counts = {}
+    for t in tickets:
+        counts[t.user_id] = counts.get(t.user_id, 0) + 1
+    return counts
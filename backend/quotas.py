@@ -0,0 +1,109 @@
+"""
+Per-store ResourceQuota and LimitRange
+Each store namespace gets a ResourceQuota sized to what the store can use
+at most, so a runaway store is stopped at its own namespace instead of
+starving the stores next to it on the node:
+
+    requests/limits   its long-running pods at their peak (the autoscaler's
+                      max_replicas for autoscaled stores), one extra
+                      WordPress pod for rolling updates, and the one-off
+                      Jobs that may run next to them (setup or clone fixup,
+                      a backup, a benchmark)
+    pods              the same pods counted
+    storage           the owner's max_storage_gi, which also bounds resizes
+    PVCs              the store's volumes
+
+All amounts come from the same templates and plan the pipeline uses. The
+LimitRange gives containers without resources small defaults (the quota
+rejects pods that set none) and caps a single container at the plan's
+largest one.
+
+Quota usage is read back every QUOTA_USAGE_INTERVAL_SECONDS into the
+store record; stores above QUOTA_NEAR_LIMIT_PERCENT of any resource are
+listed by GET /api/admin/quotas.
+"""
+import math
+
+from kubernetes import client
+
+from capacity import store_pod_specs
+from k8s_client import pod_limits, pod_requests
+from templates.backup import get_backup_job
+from templates.benchmark import get_benchmark_job
+from templates.clone import get_clone_fixup_job
+from templates.quota import DEFAULT_CONTAINER_LIMITS, DEFAULT_CONTAINER_REQUESTS
+from templates.wordpress import get_wp_setup_job
+
+_MI = 1024 ** 2
+# Placeholder bucket settings; only the Job's resources matter here
+_S3 = {"provider": "Other", "region": "us-east-1"}
+
+
+def _job_specs(store_id):
+    """One-off Jobs of a store that may run at the same time: (setup or clone fixup), backup, benchmark"""
+    setup = [get_wp_setup_job(store_id).spec.template.spec, get_clone_fixup_job(store_id).spec.template.spec]
+    backup = get_backup_job(store_id, 0, "backup", _S3, "bucket").spec.template.spec
+    benchmark = get_benchmark_job(store_id, "benchmark", "store.local").spec.template.spec
+    return [max(setup, key=lambda spec: _pod_usage(spec)), backup, benchmark]
+
+
+def _pod_usage(spec):
+    """(request cpu, request memory, limit cpu, limit memory) of a pod after LimitRange defaults"""
+    return (*pod_requests(spec, DEFAULT_CONTAINER_REQUESTS), *pod_limits(spec, DEFAULT_CONTAINER_LIMITS))
+
+
+def _container_max(specs):
+    """Largest CPU and memory limit of any container in these pods, after LimitRange defaults"""
+    cpu = memory = 0.0
+    for spec in specs:
+        for container in (spec.containers or []) + (spec.init_containers or []):
+            limit_cpu, limit_memory = pod_limits(client.V1PodSpec(containers=[container]), DEFAULT_CONTAINER_LIMITS)
+            cpu, memory = max(cpu, limit_cpu), max(memory, limit_memory)
+    return cpu, memory
+
+
+def _cpu(cores):
+    return f"{math.ceil(cores * 1000)}m"
+
+
+def _memory(size):
+    return f"{math.ceil(size / _MI)}Mi"
+
+
+def store_quota(ctx, max_storage_gi):
+    """
+    (ResourceQuota hard limits, LimitRange container max) for a store,
+    as Kubernetes quantity strings
+    """
+    replicas = ctx["plan"]["autoscaling"]["max_replicas"] if ctx["autoscaling"] else None
+    steady = store_pod_specs(ctx, wordpress_replicas=replicas)
+    # The last spec is always WordPress; a rolling update runs one more of it
+    pods = steady + [steady[-1]] + _job_specs(ctx["store_id"])
+    usage = [_pod_usage(spec) for spec in pods]
+    volumes = 2 if ctx["db_mode"] == "dedicated" else 1
+    hard = {
+        "requests.cpu": _cpu(sum(u[0] for u in usage)),
+        "requests.memory": _memory(sum(u[1] for u in usage)),
+        "limits.cpu": _cpu(sum(u[2] for u in usage)),
+        "limits.memory": _memory(sum(u[3] for u in usage)),
+        "pods": str(len(pods)),
+        "requests.storage": f"{max_storage_gi}Gi",
+        "persistentvolumeclaims": str(volumes),
+    }
+    cpu, memory = _container_max(pods)
+    return hard, {"cpu": _cpu(cpu), "memory": _memory(memory)}
+
+
+def quota_usage(quota):
+    """
+    ({resource: {"used", "hard"}}, highest used / hard ratio) of a quota
+    read back by K8sClient.list_store_resource_quotas
+    """
+    usage = {}
+    peak = 0.0
+    for resource, hard in quota["hard"].items():
+        used = quota["used"].get(resource, 0.0)
+        usage[resource] = {"used": used, "hard": hard}
+        if hard > 0:
+            peak = max(peak, used / hard)
+    return usage, round(peak, 4)
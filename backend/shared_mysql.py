@@ -0,0 +1,154 @@
+"""
+Shared multi-tenant MySQL
+Instead of a MySQL StatefulSet per store, a store in "shared" mode gets its
+own database and scoped user on one of a few pooled MySQL instances. The
+instances are configured as JSON:
+
+    SHARED_MYSQL_INSTANCES='[
+      {"name": "shared-1", "host": "mysql-shared-1.databases.svc.cluster.local",
+       "port": 3306, "admin_user": "root", "admin_password_env": "SHARED_MYSQL_1_PASSWORD",
+       "max_stores": 200}
+    ]'
+
+`host` must be a DNS name: stores reach their instance through an
+ExternalName service called `mysql` in the store namespace. The admin
+password can be given inline (`admin_password`) or read from another
+environment variable (`admin_password_env`), e.g. one mapped from a Secret.
+"""
+import json
+import logging
+import os
+import re
+import threading
+
+import database
+
+logger = logging.getLogger(__name__)
+
+_IDENTIFIER = re.compile(r"^[a-z0-9_]{1,32}$")
+placement_lock = threading.Lock()
+
+
+class SharedMySQLError(Exception):
+    """Raised when a shared instance is unavailable or rejects a change"""
+
+
+def _load_instances():
+    raw = os.environ.get("SHARED_MYSQL_INSTANCES", "").strip()
+    if not raw:
+        return {}
+    instances = {}
+    for entry in json.loads(raw):
+        password = entry.get("admin_password")
+        if password is None and entry.get("admin_password_env"):
+            password = os.environ.get(entry["admin_password_env"])
+        instances[entry["name"]] = {
+            "name": entry["name"],
+            "host": entry["host"],
+            "port": int(entry.get("port", 3306)),
+            "admin_user": entry.get("admin_user", "root"),
+            "admin_password": password,
+            "max_stores": int(entry.get("max_stores", 200)),
+        }
+    return instances
+
+
+INSTANCES = _load_instances()
+
+
+def is_available():
+    return bool(INSTANCES)
+
+
+def get_instance(name):
+    return INSTANCES.get(name)
+
+
+def database_name(store_id):
+    return f"store_{store_id}"
+
+
+def choose_instance():
+    """
+    Placement policy: the instance with the lowest fill ratio (stores /
+    max_stores) that still has room, or None if every instance is full.
+    Call with placement_lock held until the store is registered, so
+    concurrent creates see each other's placements.
+    """
+    counts = database.count_stores_by_db_instance()
+    candidates = [
+        (counts.get(name, 0) / instance["max_stores"], counts.get(name, 0), name)
+        for name, instance in INSTANCES.items()
+        if counts.get(name, 0) < instance["max_stores"]
+    ]
+    if not candidates:
+        return None
+    return min(candidates)[2]
+
+
+def _connect(instance):
+    try:
+        import pymysql
+    except ImportError as e:
+        raise SharedMySQLError("Shared MySQL mode needs the PyMySQL package") from e
+    try:
+        return pymysql.connect(
+            host=instance["host"],
+            port=instance["port"],
+            user=instance["admin_user"],
+            password=instance["admin_password"],
+            connect_timeout=10,
+            autocommit=True,
+        )
+    except pymysql.MySQLError as e:
+        raise SharedMySQLError(f"Cannot connect to shared MySQL {instance['name']}: {e}") from e
+
+
+def _checked(store_id):
+    name = database_name(store_id)
+    if not _IDENTIFIER.match(name):
+        raise SharedMySQLError(f"Invalid store id for a database name: {store_id}")
+    return name
+
+
+def create_store_database(instance_name, store_id, password, max_connections=None):
+    """Create (or re-sync on resume) the store's database and a user limited to it"""
+    instance = INSTANCES.get(instance_name)
+    if instance is None:
+        raise SharedMySQLError(f"Unknown shared MySQL instance '{instance_name}'")
+    name = _checked(store_id)
+    limit = f" WITH MAX_USER_CONNECTIONS {int(max_connections)}" if max_connections else ""
+
+    connection = _connect(instance)
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{name}` CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci")
+            # '%%' is the any-host wildcard, escaped because the statement has parameters
+            cursor.execute(f"CREATE USER IF NOT EXISTS '{name}'@'%%' IDENTIFIED BY %s{limit}", (password,))
+            # The user may exist from an interrupted attempt; make the password and limit match the Secret
+            cursor.execute(f"ALTER USER '{name}'@'%%' IDENTIFIED BY %s{limit}", (password,))
+            cursor.execute(f"GRANT ALL PRIVILEGES ON `{name}`.* TO '{name}'@'%'")
+    except Exception as e:
+        raise SharedMySQLError(f"Failed to create database {name} on {instance_name}: {e}") from e
+    finally:
+        connection.close()
+    logger.info(f"Created database {name} on shared instance {instance_name}", extra={"store_id": store_id})
+
+
+def drop_store_database(instance_name, store_id):
+    """Drop the store's database and user; safe to repeat"""
+    instance = INSTANCES.get(instance_name)
+    if instance is None:
+        raise SharedMySQLError(f"Unknown shared MySQL instance '{instance_name}'")
+    name = _checked(store_id)
+
+    connection = _connect(instance)
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP DATABASE IF EXISTS `{name}`")
+            cursor.execute(f"DROP USER IF EXISTS '{name}'@'%'")
+    except Exception as e:
+        raise SharedMySQLError(f"Failed to drop database {name} on {instance_name}: {e}") from e
+    finally:
+        connection.close()
+    logger.info(f"Dropped database {name} on shared instance {instance_name}", extra={"store_id": store_id})
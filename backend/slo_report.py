@@ -0,0 +1,106 @@
+"""
+Store lifecycle SLO reports
+p50/p95/p99 of provisioning (initialized -> ready) and deletion
+(deleted -> removed) durations over time windows, computed from the
+store_events history. Windows reaching past the raw-event retention also
+use the daily histogram rollups and are reported as approximate.
+"""
+import math
+import re
+from datetime import datetime, timedelta
+
+import config
+import database
+
+# Histogram bounds (seconds) used when compacting old events into rollups
+BUCKET_BOUNDS = (15, 30, 45, 60, 90, 120, 180, 240, 300, 450, 600, 900, 1200, 1800, 3600, 7200, 14400)
+
+PERCENTILES = (50, 95, 99)
+
+_WINDOW_UNITS = {"m": "minutes", "h": "hours", "d": "days", "w": "weeks"}
+
+
+def parse_window(text):
+    """Parse a window such as '30m', '24h', '7d' or '4w' into a timedelta"""
+    match = re.fullmatch(r"\s*(\d+)\s*([mhdw])\s*", text or "")
+    if not match:
+        raise ValueError(f"Invalid window '{text}', expected e.g. 24h, 7d or 4w")
+    return timedelta(**{_WINDOW_UNITS[match.group(2)]: int(match.group(1))})
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(math.ceil(p / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def _bucket_percentile(buckets, total, p):
+    """Percentile from {upper bound: count}, reported as the bucket's upper bound (capped at the last bound)"""
+    rank = max(math.ceil(p / 100 * total), 1)
+    seen = 0
+    for bound in sorted(buckets, key=lambda b: math.inf if b == "inf" else float(b)):
+        seen += buckets[bound]
+        if seen >= rank:
+            return float(BUCKET_BOUNDS[-1]) if bound == "inf" else float(bound)
+    return None
+
+
+def _bucket_of(seconds):
+    return str(next((b for b in BUCKET_BOUNDS if seconds <= b), "inf"))
+
+
+def _summarize(kind, window, now):
+    since = now - window
+    raw = sorted(database.get_lifecycle_durations(kind, since, now))
+    raw_cutoff = now - timedelta(days=config.EVENT_RETENTION_DAYS)
+
+    if since >= raw_cutoff:
+        result = {"count": len(raw), "approximate": False}
+        for p in PERCENTILES:
+            value = percentile(raw, p)
+            result[f"p{p}"] = round(value, 1) if value is not None else None
+        result["mean"] = round(sum(raw) / len(raw), 1) if raw else None
+        return result
+
+    # Window reaches into compacted history: merge raw durations into the rollup histograms
+    buckets, total, total_seconds = {}, 0, 0.0
+    for rollup in database.get_event_rollups(kind, since, raw_cutoff + timedelta(days=1)):
+        for bound, count in rollup["buckets"].items():
+            buckets[bound] = buckets.get(bound, 0) + count
+        total += rollup["count"]
+        total_seconds += rollup["total_seconds"]
+    for seconds in raw:
+        bound = _bucket_of(seconds)
+        buckets[bound] = buckets.get(bound, 0) + 1
+    total += len(raw)
+    total_seconds += sum(raw)
+
+    result = {"count": total, "approximate": True}
+    for p in PERCENTILES:
+        result[f"p{p}"] = _bucket_percentile(buckets, total, p) if total else None
+    result["mean"] = round(total_seconds / total, 1) if total else None
+    return result
+
+
+def build_report(windows, now=None):
+    """SLO summary per lifecycle kind and window, e.g. build_report(['24h', '7d'])"""
+    now = now or datetime.utcnow()
+    database.flush_store_events()
+    parsed = [(w, parse_window(w)) for w in windows]
+    return {
+        "generated_at": now.isoformat(),
+        "unit": "seconds",
+        **{
+            kind: {label: _summarize(kind, window, now) for label, window in parsed}
+            for kind in database.LIFECYCLE_SPANS
+        },
+    }
+
+
+def compact_events(now=None):
+    """Downsample events older than the retention period into daily rollups"""
+    now = now or datetime.utcnow()
+    database.flush_store_events()
+    return database.compact_store_events(now - timedelta(days=config.EVENT_RETENTION_DAYS), BUCKET_BOUNDS)
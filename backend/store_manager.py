@@ -1,27 +1,144 @@
+import logging
+import re
 import secrets
+import threading
 import time
 import os
-from k8s_client import K8sClient
-from templates.mysql import get_mysql_secret, get_mysql_service, get_mysql_statefulset
+from templates.mysql import get_mysql_secret, get_mysql_service, get_mysql_statefulset, get_shared_mysql_service
 from templates.wordpress import (
     get_wordpress_config,
+    get_wp_setup_job,
+    get_php_config,
     get_wordpress_pvc,
     get_wp_setup_script,
     get_wordpress_deployment,
+    get_wordpress_fpm_deployment,
     get_wordpress_service,
 )
 from templates.ingress import get_ingress
+from ingress_router import IngressRouter
+from templates.autoscaling import get_wordpress_hpa
+from templates.benchmark import get_benchmark_job
+from templates.clone import (
+    CLONE_VOLUMES,
+    get_clone_fixup_config,
+    get_clone_fixup_job,
+    get_imported_snapshot,
+    get_imported_snapshot_content,
+    get_volume_snapshot,
+    imported_content_name,
+    imported_snapshot_name,
+    snapshot_data_source,
+    source_snapshot_name,
+)
+from templates.redis import (
+    get_redis_credentials_secret,
+    get_redis_deployment,
+    get_redis_service,
+    get_shared_redis_service,
+)
+from provisioning_scheduler import ProvisioningScheduler, AdmissionTimeout
+from capacity import CapacityTracker, store_demand
+from templates.quota import get_limit_range, get_resource_quota
+from metrics import PROVISION_STEP_SECONDS, STORE_TIME_TO_READY_SECONDS, STORES_NEAR_QUOTA
+from tracing import start_span, traced
+from structured_logging import log_context
+from datetime import datetime
+from flask import current_app
+from background import run_in_background
+import clusters
+import config
 import database
+import object_cache
+import plans
+import quotas
+import shared_mysql
+
+logger = logging.getLogger(__name__)
+
+RUNTIMES = ("apache", "fpm")
+AUTOSCALING_METRICS = ("cpu", "requests")
+WORDPRESS_PVC = "wordpress-pvc"
+# volumeClaimTemplate "mysql-storage" of StatefulSet "mysql", ordinal 0
+MYSQL_PVC = "mysql-storage-mysql-0"
+_CLONE_POLL_SECONDS = 5
 
 
 class StoreManager:
+    # Ordered provisioning pipeline: (step name, method, error message).
+    # Every step is journaled per store, so a failed or interrupted create
+    # resumes from the first step that has not completed.
+    PROVISION_STEPS = [
+        ("namespace", "_create_namespace", "Failed to create namespace"),
+        ("mysql_secret", "_create_mysql_secret", "Failed to create MySQL secret"),
+        ("mysql_service", "_create_mysql_service", "Failed to create MySQL service"),
+        ("mysql_statefulset", "_create_mysql_statefulset", "Failed to create MySQL"),
+        ("mysql_wait", "_wait_for_mysql", "MySQL did not become ready"),
+        ("wordpress_config", "_create_wordpress_config", "Failed to create WordPress config"),
+        ("php_config", "_create_php_config", "Failed to create PHP config"),
+        ("wordpress_pvc", "_create_wordpress_pvc", "Failed to create WordPress PVC"),
+        ("wp_setup_script", "_create_wp_setup_script", "Failed to create WP setup script"),
+        ("wordpress_deployment", "_create_wordpress_deployment", "Failed to create WordPress"),
+        ("wordpress_service", "_create_wordpress_service", "Failed to create WordPress service"),
+        ("ingress", "_create_ingress", "Failed to create Ingress"),
+    ]
+
+    # Shared MySQL mode: a database and scoped user on a pooled instance
+    # replace the per-store StatefulSet and the wait for it to start
+    SHARED_DB_PROVISION_STEPS = [
+        ("namespace", "_create_namespace", "Failed to create namespace"),
+        ("mysql_secret", "_create_mysql_secret", "Failed to create MySQL secret"),
+        ("mysql_service", "_create_shared_mysql_service", "Failed to create MySQL service"),
+        ("shared_database", "_create_shared_database", "Failed to create database on shared MySQL"),
+    ] + [
+        step for step in PROVISION_STEPS
+        if step[0] not in ("namespace", "mysql_secret", "mysql_service", "mysql_statefulset", "mysql_wait")
+    ]
+
+    # Added before the WordPress config for stores with a Redis object cache
+    OBJECT_CACHE_STEP = ("object_cache", "_create_object_cache", "Failed to create Redis object cache")
+
+    # Right after the namespace, so every workload is admitted against the store's quota
+    QUOTA_STEP = ("resource_quota", "_create_resource_quota", "Failed to create ResourceQuota and LimitRange")
+
+    # Autoscaled stores: setup runs once as a Job before the Deployment, and an HPA comes last
+    SETUP_JOB_STEP = ("wp_setup_job", "_create_wp_setup_job", "Failed to start WordPress setup Job")
+    AUTOSCALER_STEP = ("autoscaler", "_create_autoscaler", "Failed to create HorizontalPodAutoscaler")
+
+    # Clones: the volumes are restored from snapshots of the source store, and a
+    # Job rewrites the URL and rotates credentials before WordPress starts
+    CLONE_SNAPSHOT_STEPS = [
+        ("volume_snapshots", "_snapshot_source_volumes", "Failed to snapshot the source store's volumes"),
+        ("snapshot_import", "_import_source_snapshots", "Source store snapshots did not become ready"),
+    ]
+    CLONE_FIXUP_STEP = ("clone_fixup", "_run_clone_fixup", "Failed to rewrite the cloned store's URL and credentials")
+    CLONE_CLEANUP_STEP = ("snapshot_cleanup", "_delete_clone_snapshots", "Failed to delete the clone's snapshots")
+
     def __init__(self):
-        self.k8s = K8sClient()
+        self.clusters = clusters.ClusterClients()
+        # The backend's own cluster, which also hosts the consolidated routing shards
+        self.k8s = self.clusters.default
+        self.router = IngressRouter(self.k8s)
+        # Stores whose pipeline is running in this process
+        self._in_flight = set()
+        self._in_flight_lock = threading.Lock()
+        # Serializes quota checks of resizes, creates and clones so concurrent ones cannot all pass
+        self._storage_lock = threading.Lock()
+        self.scheduler = ProvisioningScheduler(
+            max_in_flight=config.PROVISIONING_MAX_IN_FLIGHT,
+            max_per_user=config.PROVISIONING_MAX_PER_USER,
+        )
+        self.capacity = CapacityTracker(self.clusters)
+
+    def k8s_for(self, store):
+        """Client for the cluster a store (or provisioning context) lives on"""
+        return self.clusters.for_store(store)
 
     def generate_store_id(self):
         """Generate unique store ID"""
         return secrets.token_hex(4)
 
+    @traced("StoreManager.create_store")
     def create_store(
         self,
         user_id,
@@ -29,31 +146,45 @@ class StoreManager:
         store_url_suffix=None,
         admin_password=None,
         storage_size_gi=2,
+        idempotency_key=None,
+        plan=None,
+        db_mode=None,
+        cache_mode=None,
+        runtime=None,
+        autoscaling=None,
     ):
         """Create a new store"""
+        plan = plan or plans.DEFAULT_PLAN
+        if plans.get_plan(plan) is None:
+            return {"error": f"Unknown plan '{plan}'. Available plans: {', '.join(plans.PLANS)}"}
+        db_mode = db_mode or config.DEFAULT_DB_MODE
+        if db_mode not in ("dedicated", "shared"):
+            return {"error": f"Unknown db_mode '{db_mode}'. Use 'dedicated' or 'shared'"}
+        if db_mode == "shared" and not shared_mysql.is_available():
+            return {"error": "Shared MySQL mode is not configured (SHARED_MYSQL_INSTANCES)"}
+        if cache_mode not in (None,) + object_cache.MODES:
+            return {"error": f"Unknown object_cache '{cache_mode}'. Use 'dedicated', 'shared' or leave it out"}
+        if cache_mode == "shared" and not object_cache.is_shared_available():
+            return {"error": "Shared Redis is not configured (SHARED_REDIS_HOST)"}
+        runtime = runtime or config.DEFAULT_WORDPRESS_RUNTIME
+        if runtime not in RUNTIMES:
+            return {"error": f"Unknown runtime '{runtime}'. Use 'apache' or 'fpm'"}
+        if autoscaling not in (None,) + AUTOSCALING_METRICS:
+            return {"error": f"Unknown autoscaling '{autoscaling}'. Use 'cpu', 'requests' or leave it out"}
+        if autoscaling and not config.RWX_STORAGE_CLASS:
+            return {"error": "Autoscaling is not configured (RWX_STORAGE_CLASS)"}
+
         # 1. Quota Check
         user = database.get_user(user_id)
         if not user:
             return {"error": "User not found"}
 
-        usage = database.get_user_usage(user_id)
-        current_stores = usage["store_count"] or 0
-        current_storage = usage["total_storage"] or 0
-
-        if current_stores >= user["max_stores"]:
-            return {"error": f"Store limit reached ({user['max_stores']} stores)."}
-
         # Assuming MySQL takes 1Gi fixed + requested Wordpress storage
-        total_request = storage_size_gi + 1
-
-        if (current_storage + total_request) > user["max_storage_gi"]:
-            return {
-                "error": f"Storage quota exceeded. Available: {user['max_storage_gi'] - current_storage}Gi, Requested: {total_request}Gi"
-            }
+        # (shared mode stores don't get their own MySQL volume)
+        total_request = storage_size_gi + (1 if db_mode == "dedicated" else 0)
 
         # 2. Generate Store Details
         store_id = self.generate_store_id()
-        namespace = f"store-{store_id}"
         if store_url_suffix:
             store_url = f"store-{store_id}.{store_url_suffix}"
         else:
@@ -65,122 +196,803 @@ class StoreManager:
         if sample_products is None:
             sample_products = "Sample Product 1|299|This is a sample product\nSample Product 2|599|Another sample product"
 
-        # 3. Register in DB with "initialized" status
-        database.register_store(
-            store_id,
-            user_id,
-            total_request,
-            status="initialized",
-            store_url=store_url,
-            admin_password=db_password,
+        # 3. Register in DB with "initialized" status and journal the pipeline.
+        # Quota is checked and the store placed while holding the placement
+        # and storage locks, so concurrent creates and resizes see each other.
+        with clusters.placement_lock, shared_mysql.placement_lock, self._storage_lock:
+            quota_error = self._check_quota(user, total_request, plan)
+            if quota_error:
+                return quota_error
+            cluster = clusters.choose_cluster(user_id)
+            if cluster is None:
+                return {"error": "All clusters are full or cordoned", "reason": "no_cluster"}
+            db_instance = None
+            if db_mode == "shared":
+                db_instance = shared_mysql.choose_instance()
+                if db_instance is None:
+                    return {"error": "All shared MySQL instances are full"}
+            database.register_store(
+                store_id,
+                user_id,
+                total_request,
+                status="initialized",
+                store_url=store_url,
+                admin_password=db_password,
+                sample_products=sample_products,
+                wordpress_storage_gi=storage_size_gi,
+                plan=plan,
+                db_mode=db_mode,
+                db_instance=db_instance,
+                db_password=secrets.token_urlsafe(24) if db_mode == "shared" else None,
+                object_cache=cache_mode,
+                runtime=runtime,
+                ingress_mode=_ingress_mode(cluster),
+                autoscaling=autoscaling,
+                cluster=cluster,
+            )
+        database.init_provisioning_steps(
+            store_id, [name for name, _, _ in self._pipeline(db_mode, cache_mode, autoscaling)]
         )
+        if idempotency_key:
+            database.attach_idempotency_store(user_id, idempotency_key, store_id)
 
-        print(f"\n=== Creating store: {store_id} ===")
-        print(f"📝 Status: initialized")
+        logger.info(f"Creating store {store_id}", extra={"store_id": store_id, "user_id": user_id, "status": "initialized"})
 
-        try:
-            # 4. Update status to "provisioning" before starting k8s operations
-            database.update_store_status(store_id, "provisioning")
-            print(f"🚀 Status: provisioning")
-
-            # Create namespace
-            if not self.k8s.create_namespace(namespace):
-                database.update_store_status(store_id, "failed")
-                return {"error": "Failed to create namespace"}
-
-            # Create MySQL secret
-            mysql_secret = get_mysql_secret(store_id, db_password)
-            if not self.k8s.create_secret(namespace, mysql_secret):
-                database.update_store_status(store_id, "failed")
-                return {"error": "Failed to create MySQL secret"}
-
-            # Create MySQL service
-            mysql_svc = get_mysql_service(store_id)
-            if not self.k8s.create_service(namespace, mysql_svc):
-                database.update_store_status(store_id, "failed")
-                return {"error": "Failed to create MySQL service"}
-
-            # Create MySQL StatefulSet
-            mysql_ss = get_mysql_statefulset(store_id)
-            if not self.k8s.create_statefulset(namespace, mysql_ss):
-                database.update_store_status(store_id, "failed")
-                return {"error": "Failed to create MySQL"}
-
-            # Wait for MySQL to be ready
-            print("⏳ Waiting for MySQL to be ready...")
-            time.sleep(30)  # Simple wait; improve with actual pod checking
-
-            # Create WordPress ConfigMap
-            wp_config = get_wordpress_config(
-                store_id, db_password, store_url, sample_products
-            )
-            if not self.k8s.create_configmap(namespace, wp_config):
-                database.update_store_status(store_id, "failed")
-                return {"error": "Failed to create WordPress config"}
-
-            # Create WordPress PVC (With custom size)
-            wp_pvc = get_wordpress_pvc(store_id, storage_size_gi)
-            if not self.k8s.create_pvc(namespace, wp_pvc):
-                database.update_store_status(store_id, "failed")
-                return {"error": "Failed to create WordPress PVC"}
-
-            # Create WP Setup Script ConfigMap
-            wp_setup = get_wp_setup_script(
-                store_id, db_password, store_url, sample_products
+        return self._queue_provisioning(database.get_store(store_id), user)
+
+    @traced("StoreManager.clone_store")
+    def clone_store(self, source_id, user_id, store_url_suffix=None, admin_password=None):
+        """
+        Create a store from snapshots of an existing store's volumes. The clone
+        keeps the source's plan, runtime, object cache and volume sizes, gets
+        its own URL and credentials, and counts against quota like a new store.
+        """
+        source = database.get_store(source_id)
+        if not source:
+            return {"error": "Store not found"}
+        if str(source["user_id"]) != str(user_id):
+            return {"error": "Unauthorized: You do not own this store"}
+        if source["status"] not in ("ready", "hibernated"):
+            return {"error": f"Store is {source['status']}; only ready or hibernated stores can be cloned"}
+        if source["db_mode"] != "dedicated":
+            return {"error": "Stores on shared MySQL have no database volume to snapshot and cannot be cloned"}
+        if source["autoscaling"]:
+            return {"error": "Autoscaled stores keep WordPress on a ReadWriteMany volume and cannot be cloned"}
+
+        user = database.get_user(user_id)
+        if not user:
+            return {"error": "User not found"}
+        plan = source.get("plan") or plans.DEFAULT_PLAN
+
+        store_id = self.generate_store_id()
+        store_url = f"store-{store_id}.{store_url_suffix}" if store_url_suffix else f"store-{store_id}.local"
+        source_ctx = self._provisioning_context(source)
+        # Snapshots cannot leave their cluster, so the clone is placed next to its source
+        cluster = source_ctx["cluster"]
+        with clusters.placement_lock, self._storage_lock:
+            quota_error = self._check_quota(user, source["storage_size_gi"], plan)
+            if quota_error:
+                return quota_error
+            if not clusters.accepts_stores(cluster):
+                return {"error": f"The source store's cluster '{cluster}' is full or cordoned"}
+            database.register_store(
+                store_id,
+                user_id,
+                source["storage_size_gi"],
+                name=source.get("name") or "",
+                status="initialized",
+                store_url=store_url,
+                admin_password=admin_password or secrets.token_urlsafe(16),
+                sample_products=source.get("sample_products"),
+                wordpress_storage_gi=source_ctx["storage_size_gi"],
+                plan=plan,
+                db_mode="dedicated",
+                object_cache=source.get("object_cache"),
+                runtime=source["runtime"],
+                ingress_mode=_ingress_mode(cluster),
+                cloned_from=source_id,
+                cluster=cluster,
             )
-            if not self.k8s.create_configmap(namespace, wp_setup):
-                database.update_store_status(store_id, "failed")
-                return {"error": "Failed to create WP setup script"}
-
-            # Create WordPress Deployment
-            wp_deployment = get_wordpress_deployment(store_id, db_password, store_url)
-            if not self.k8s.create_deployment(namespace, wp_deployment):
-                database.update_store_status(store_id, "failed")
-                return {"error": "Failed to create WordPress"}
-
-            # Create WordPress Service
-            wp_service = get_wordpress_service(store_id)
-            if not self.k8s.create_service(namespace, wp_service):
-                database.update_store_status(store_id, "failed")
-                return {"error": "Failed to create WordPress service"}
-
-            # Create Ingress
-            ingress = get_ingress(store_id, store_url)
-            if not self.k8s.create_ingress(namespace, ingress):
-                database.update_store_status(store_id, "failed")
-                return {"error": "Failed to create Ingress"}
+        database.init_provisioning_steps(
+            store_id, [name for name, _, _ in self._pipeline("dedicated", source.get("object_cache"), cloned=True)]
+        )
+        logger.info(f"Cloning store {source_id} as {store_id}",
+                    extra={"store_id": store_id, "user_id": user_id, "status": "initialized"})
+        result = self._queue_provisioning(database.get_store(store_id), user)
+        if "error" not in result:
+            result["cloned_from"] = source_id
+        return result
 
-            # 5. Keep status as "provisioning" - will update to "ready" when pods are actually running
-            print(f"✅ Store resources created successfully! Status: provisioning\n")
+    def _check_quota(self, user, storage_gi, plan):
+        """Error dict if one more store of this size and plan would exceed the user's quota, else None"""
+        usage = database.get_user_usage(user["id"])
+        current_stores = usage["store_count"] or 0
+        current_storage = usage["total_storage"] or 0
+
+        if current_stores >= user["max_stores"]:
+            return {"error": f"Store limit reached ({user['max_stores']} stores)."}
+
+        if (current_storage + storage_gi) > user["max_storage_gi"]:
+            return {
+                "error": f"Storage quota exceeded. Available: {user['max_storage_gi'] - current_storage}Gi, Requested: {storage_gi}Gi"
+            }
 
+        requested_units = plans.plan_units(plan)
+        if usage["plan_units"] + requested_units > user["max_plan_units"]:
             return {
+                "error": f"Plan quota exceeded. Available: {user['max_plan_units'] - usage['plan_units']} units, "
+                         f"Requested: {requested_units} ({plan})"
+            }
+        return None
+
+    @traced("StoreManager.resume_store")
+    def resume_store(self, store_id, user_id=None):
+        """Continue provisioning a failed or interrupted store from its first incomplete step"""
+        store = database.get_store(store_id)
+        if not store:
+            return {"error": "Store not found"}
+        if user_id and str(store["user_id"]) != str(user_id):
+            return {"error": "Unauthorized: You do not own this store"}
+        if store["status"] not in ("initialized", "queued", "provisioning", "failed"):
+            return {"error": f"Store is {store['status']}; only failed or interrupted stores can be resumed"}
+
+        user = database.get_user(store["user_id"])
+        logger.info(f"Resuming store {store_id}", extra={"store_id": store_id, "user_id": store["user_id"]})
+        return self._queue_provisioning(store, user)
+
+    def resume_interrupted_stores(self):
+        """Resume every store whose provisioning was cut short (e.g. by a backend restart)"""
+        for store_id in database.get_interrupted_store_ids():
+            result = self.resume_store(store_id)
+            if "error" in result:
+                logger.error(f"Could not resume store {store_id}: {result['error']}", extra={"store_id": store_id})
+
+    def refresh_quota_usage(self):
+        """Read every store ResourceQuota's usage back into the store records"""
+        usage_by_store = {}
+        for cluster, k8s in self.clusters.items():
+            found = k8s.list_store_resource_quotas()
+            if found is None:
+                logger.warning(f"Could not read ResourceQuotas on cluster {cluster}")
+                continue
+            for namespace, quota in found.items():
+                if namespace.startswith("store-"):
+                    usage_by_store[namespace[len("store-"):]] = quotas.quota_usage(quota)
+        database.update_store_quota_usage(usage_by_store)
+        threshold = config.QUOTA_NEAR_LIMIT_PERCENT / 100
+        near = sorted(store_id for store_id, (_, utilization) in usage_by_store.items() if utilization >= threshold)
+        STORES_NEAR_QUOTA.set(len(near))
+        if near:
+            logger.warning(f"{len(near)} stores near their quota: {', '.join(near[:20])}")
+        return {"checked": len(usage_by_store), "near_limit": near}
+
+    def get_provisioning_steps(self, store_id, user_id=None):
+        """Get the provisioning journal of a store"""
+        store = database.get_store(store_id)
+        if not store:
+            return {"error": "Store not found"}
+        if user_id and str(store["user_id"]) != str(user_id):
+            return {"error": "Unauthorized: You do not own this store"}
+        return {
+            "id": store_id,
+            "status": store["status"],
+            "admission_wait_seconds": store.get("admission_wait_seconds"),
+            "steps": database.get_provisioning_steps(store_id),
+        }
+
+    def in_flight_store_ids(self):
+        """Snapshot of stores whose pipeline is running in this process"""
+        with self._in_flight_lock:
+            return set(self._in_flight)
+
+    def get_cache_stats(self, store_id, user_id=None):
+        """Object cache hit rate and memory for a store"""
+        store = database.get_store(store_id)
+        if not store:
+            return {"error": "Store not found"}
+        if user_id and str(store["user_id"]) != str(user_id):
+            return {"error": "Unauthorized: You do not own this store"}
+        if not store.get("object_cache"):
+            return {"error": "Store has no object cache"}
+        try:
+            stats = object_cache.cache_stats(store_id, store["object_cache"], f"store-{store_id}")
+        except object_cache.RedisError as e:
+            return {"error": f"Object cache unavailable: {e}"}
+        return {"id": store_id, **stats}
+
+    def get_storage(self, store_id, user_id=None):
+        """Recorded sizes and the live state of a store's volumes"""
+        store = database.get_store(store_id)
+        if not store:
+            return {"error": "Store not found"}
+        if user_id and str(store["user_id"]) != str(user_id):
+            return {"error": "Unauthorized: You do not own this store"}
+        ctx = self._provisioning_context(store)
+        volumes = {"wordpress": self.k8s_for(ctx).get_pvc(ctx["namespace"], WORDPRESS_PVC)}
+        if ctx["db_mode"] == "dedicated":
+            volumes["mysql"] = self.k8s_for(ctx).get_pvc(ctx["namespace"], MYSQL_PVC)
+        return {
+            "id": store_id,
+            "storage_gi": store["storage_size_gi"],
+            "wordpress_gi": ctx["storage_size_gi"],
+            "mysql_gi": ctx["mysql_storage_gi"] or None,
+            "volumes": volumes,
+        }
+
+    @traced("StoreManager.resize_storage")
+    def resize_storage(self, store_id, user_id=None, wordpress_gi=None, mysql_gi=None):
+        """
+        Grow a store's WordPress and/or MySQL volume in place. Volumes can
+        only grow, the storage class must allow expansion, and the new total
+        counts against the owner's max_storage_gi like a new store would.
+        """
+        with self._storage_lock:
+            store = database.get_store(store_id)
+            if not store:
+                return {"error": "Store not found"}
+            if user_id and str(store["user_id"]) != str(user_id):
+                return {"error": "Unauthorized: You do not own this store"}
+            if store["status"] not in ("ready", "hibernated"):
+                return {"error": f"Store is {store['status']}; only ready or hibernated stores can be resized"}
+            ctx = self._provisioning_context(store)
+            if mysql_gi is not None and ctx["db_mode"] != "dedicated":
+                return {"error": "Store uses shared MySQL; its database has no volume to resize"}
+
+            targets = []
+            for volume, pvc_name, current, requested in (
+                ("wordpress", WORDPRESS_PVC, ctx["storage_size_gi"], wordpress_gi),
+                ("mysql", MYSQL_PVC, ctx["mysql_storage_gi"], mysql_gi),
+            ):
+                if requested is None or requested == current:
+                    continue
+                if requested < current:
+                    return {"error": f"The {volume} volume can only grow ({current}Gi now, {requested}Gi requested)"}
+                targets.append((volume, pvc_name, current, requested))
+            if not targets:
+                return {"error": "No size change requested"}
+
+            user = database.get_user(store["user_id"])
+            usage = database.get_user_usage(store["user_id"])
+            growth = sum(requested - current for _, _, current, requested in targets)
+            if usage["total_storage"] + growth > user["max_storage_gi"]:
+                return {
+                    "error": f"Storage quota exceeded. Available: {user['max_storage_gi'] - usage['total_storage']}Gi, "
+                             f"Requested: {growth}Gi"
+                }
+
+            k8s = self.k8s_for(ctx)
+            for volume, pvc_name, _, _ in targets:
+                pvc = k8s.get_pvc(ctx["namespace"], pvc_name)
+                if pvc is None:
+                    return {"error": f"The {volume} volume was not found"}
+                if not pvc["storage_class"] or not k8s.storage_class_allows_expansion(pvc["storage_class"]):
+                    return {"error": f"Storage class '{pvc['storage_class']}' of the {volume} volume does not allow expansion"}
+
+            sizes = {"wordpress": ctx["storage_size_gi"], "mysql": ctx["mysql_storage_gi"]}
+            error = None
+            for volume, pvc_name, _, requested in targets:
+                if not k8s.expand_pvc(ctx["namespace"], pvc_name, requested):
+                    error = f"Failed to expand the {volume} volume"
+                    break
+                sizes[volume] = requested
+
+            # Account for whatever was actually expanded, even after a partial failure
+            database.update_store_storage(store_id, sizes["wordpress"] + sizes["mysql"], sizes["wordpress"])
+            logger.info("Store storage resized", extra={"store_id": store_id})
+            if error:
+                return {"error": error}
+            return {"id": store_id, "storage_gi": sizes["wordpress"] + sizes["mysql"],
+                    "wordpress_gi": sizes["wordpress"], "mysql_gi": sizes["mysql"] or None}
+
+    def start_benchmark(self, store_id, user_id=None, requests=500, concurrency=10, path="/"):
+        """Launch a load test Job against a ready store"""
+        store = database.get_store(store_id)
+        if not store:
+            return {"error": "Store not found"}
+        if user_id and str(store["user_id"]) != str(user_id):
+            return {"error": "Unauthorized: You do not own this store"}
+        if store["status"] != "ready":
+            return {"error": f"Store is {store['status']}; only ready stores can be benchmarked"}
+
+        job_name = f"benchmark-{int(time.time())}"
+        job = get_benchmark_job(
+            store_id, job_name, store.get("store_url") or f"store-{store_id}.local",
+            requests=requests, concurrency=concurrency, path=path,
+        )
+        if not self.k8s_for(store).create_job(f"store-{store_id}", job):
+            return {"error": "Failed to start benchmark"}
+        return {"id": store_id, "job": job_name, "state": "running", "runtime": store["runtime"]}
+
+    def get_benchmark(self, store_id, user_id=None):
+        """Result of the store's latest benchmark run"""
+        store = database.get_store(store_id)
+        if not store:
+            return {"error": "Store not found"}
+        if user_id and str(store["user_id"]) != str(user_id):
+            return {"error": "Unauthorized: You do not own this store"}
+        job = self.k8s_for(store).get_latest_job(f"store-{store_id}", "app=benchmark")
+        if job is None:
+            return {"error": "No benchmark found for this store"}
+        log = job.pop("log")
+        return {
+            "id": store_id,
+            "runtime": store["runtime"],
+            "plan": store.get("plan") or plans.DEFAULT_PLAN,
+            **job,
+            **(_parse_ab_output(log) if log else {}),
+        }
+
+    def compare_benchmarks(self, store_ids):
+        """Latest benchmark of several stores, with mean requests/sec per runtime"""
+        results = [self.get_benchmark(store_id) for store_id in store_ids]
+        by_runtime = {}
+        for result in results:
+            if result.get("requests_per_second") is not None:
+                by_runtime.setdefault(result["runtime"], []).append(result["requests_per_second"])
+        return {
+            "stores": results,
+            "runtimes": {
+                runtime: {"stores": len(values), "mean_requests_per_second": round(sum(values) / len(values), 2)}
+                for runtime, values in by_runtime.items()
+            },
+        }
+
+    def _queue_provisioning(self, store, user):
+        """
+        Mark a registered store "queued" and run its journaled pipeline in a
+        background thread, skipping completed steps. Returns the store summary
+        right away; waits for capacity and admission, and their failures,
+        show up on the store's status.
+        """
+        store_id = store["id"]
+        with self._in_flight_lock:
+            if store_id in self._in_flight:
+                return {"error": "Store is already being provisioned"}
+            self._in_flight.add(store_id)
+
+        try:
+            ctx = self._provisioning_context(store)
+            database.update_store_status(store_id, "queued")
+            run_in_background(current_app._get_current_object(), self._run_provisioning, store, ctx, user,
+                              name=f"provision-{store_id}")
+        except BaseException:
+            with self._in_flight_lock:
+                self._in_flight.discard(store_id)
+            raise
+        return self._store_summary(ctx, user, "queued")
+
+    def _run_provisioning(self, store, ctx, user):
+        """Pipeline thread of a queued store"""
+        store_id = store["id"]
+        try:
+            with log_context(store_id=store_id, user_id=store["user_id"]), start_span("provision", store_id=store_id):
+                self._admit_and_provision(store, ctx, user)
+        finally:
+            with self._in_flight_lock:
+                self._in_flight.discard(store_id)
+
+    def _admit_and_provision(self, store, ctx, user):
+        """Wait for cluster capacity and an admission slot, then run the pipeline"""
+        store_id = store["id"]
+        shortfall = self._wait_for_capacity(ctx)
+        if shortfall:
+            database.update_store_status(store_id, "failed", reason=f"capacity: {shortfall}")
+            logger.error(f"Store {store_id} does not fit its cluster: {shortfall}")
+            return {
+                "error": "Not enough cluster capacity for this store, please resume it later",
+                "reason": "capacity",
                 "id": store_id,
-                "namespace": namespace,
-                "url": f"https://{store_url}",
-                "admin_url": f"https://{store_url}/wp-admin",
-                "admin_user": "admin",
-                "admin_password": db_password,
-                "status": "provisioning",
-                "created_at": time.time(),
-                "owner": user["username"],
             }
+        try:
+            result = self._admit_to_scheduler(store, ctx, user)
+        except BaseException:
+            self.capacity.release(store_id)
+            raise
+        if result.get("error"):
+            self.capacity.release(store_id)
+        else:
+            self.capacity.settle(store_id)
+        return result
+
+    def _wait_for_capacity(self, ctx):
+        """
+        Reserve the store's pods and volumes on its cluster, waiting up to
+        CAPACITY_WAIT_SECONDS for room. Returns None once reserved, else the
+        shortfall. Only fresh pipelines are checked: a resumed one already
+        holds part of its resources, which the cluster view counts.
+        """
+        store_id = ctx["store_id"]
+        if not config.CAPACITY_ADMISSION_ENABLED:
+            return None
+        if any(s["state"] == "done" for s in database.get_provisioning_steps(store_id)):
+            return None
+        demand = store_demand(ctx)
+        deadline = time.monotonic() + config.CAPACITY_WAIT_SECONDS
+        with start_span("provision.capacity", store_id=store_id, cluster=ctx["cluster"]) as span:
+            while True:
+                shortfall = self.capacity.reserve(store_id, ctx["cluster"], demand)
+                if shortfall is None or time.monotonic() >= deadline:
+                    span.set_attribute("ok", shortfall is None)
+                    return shortfall
+                logger.info(f"Store {store_id} waiting for capacity: {shortfall}")
+                time.sleep(min(config.CAPACITY_REFRESH_SECONDS, max(deadline - time.monotonic(), 0)))
+
+    def _admit_to_scheduler(self, store, ctx, user):
+        """Wait for an admission slot, then run the pipeline"""
+        store_id = store["id"]
+        weight = user.get("provisioning_weight", 1) if user else 1
+        try:
+            with self.scheduler.admit(
+                store["user_id"], weight=weight, timeout=config.PROVISIONING_ADMISSION_TIMEOUT_SECONDS
+            ) as wait:
+                if wait >= 1:
+                    logger.info(f"Store {store_id} admitted after {wait:.1f}s in queue",
+                                extra={"duration_ms": round(wait * 1000)})
+                database.set_store_admission_wait(store_id, round(wait, 3))
+                result = self._provision(ctx, user)
+        except AdmissionTimeout as e:
+            database.update_store_status(store_id, "failed", reason=f"admission_timeout: {e}")
+            logger.error(f"Store {store_id} not admitted: {e}")
+            return {
+                "error": "Provisioning is busy, please resume the store later",
+                "reason": "admission_timeout",
+                "id": store_id,
+            }
+        return result
+
+    def _provision(self, ctx, user):
+        """Run each journaled step that has not completed yet"""
+        store_id = ctx["store_id"]
+        try:
+            # 4. Update status to "provisioning" before starting k8s operations
+            database.update_store_status(store_id, "provisioning")
+            logger.info("Status: provisioning", extra={"status": "provisioning"})
+
+            completed = {
+                s["step"] for s in database.get_provisioning_steps(store_id) if s["state"] == "done"
+            }
+            for step, method, error in self._pipeline(ctx["db_mode"], ctx["object_cache"], ctx["autoscaling"],
+                                                      cloned=bool(ctx["cloned_from"])):
+                if step in completed:
+                    continue
+                database.start_provisioning_step(store_id, step)
+                step_start = time.perf_counter()
+                try:
+                    with log_context(step=step), start_span(f"provision.{step}", store_id=store_id, step=step) as span:
+                        ok = getattr(self, method)(ctx)
+                        span.set_attribute("ok", bool(ok))
+                except Exception as e:
+                    PROVISION_STEP_SECONDS.labels(step, "error").observe(time.perf_counter() - step_start)
+                    database.finish_provisioning_step(store_id, step, "failed", error=str(e))
+                    raise
+                elapsed = time.perf_counter() - step_start
+                PROVISION_STEP_SECONDS.labels(step, "success" if ok else "failure").observe(elapsed)
+                logger.log(logging.INFO if ok else logging.WARNING, f"Step {step} {'done' if ok else 'failed'}",
+                           extra={"step": step, "duration_ms": round(elapsed * 1000)})
+                if not ok:
+                    database.finish_provisioning_step(store_id, step, "failed", error=error)
+                    database.update_store_status(store_id, "failed", reason=f"step_failed: {step}: {error}")
+                    return {"error": error}
+                database.finish_provisioning_step(store_id, step, "done")
+
+            # 5. Keep status as "provisioning" - will update to "ready" when pods are actually running
+            logger.info("Store resources created successfully", extra={"status": "provisioning"})
+
+            return self._store_summary(ctx, user, "provisioning")
         except Exception as e:
             # If any unexpected error occurs, mark as failed
-            database.update_store_status(store_id, "failed")
-            print(f"❌ Error creating store: {e}")
+            database.update_store_status(store_id, "failed", reason=f"error: {e}")
+            logger.exception(f"Error creating store: {e}")
             return {"error": f"Store creation failed: {str(e)}"}
 
+    def _store_summary(self, ctx, user, status):
+        return {
+            "id": ctx["store_id"],
+            "namespace": ctx["namespace"],
+            "url": f"https://{ctx['store_url']}",
+            "admin_url": f"https://{ctx['store_url']}/wp-admin",
+            "admin_user": "admin",
+            "admin_password": ctx["db_password"],
+            "status": status,
+            "plan": ctx["plan_name"],
+            "created_at": time.time(),
+            "owner": user["username"] if user else None,
+        }
+
+    def _pipeline(self, db_mode, cache_mode=None, autoscaling=None, cloned=False):
+        steps = list(self.SHARED_DB_PROVISION_STEPS if db_mode == "shared" else self.PROVISION_STEPS)
+        if cache_mode:
+            position = [name for name, _, _ in steps].index("wordpress_config")
+            steps.insert(position, self.OBJECT_CACHE_STEP)
+        if autoscaling:
+            position = [name for name, _, _ in steps].index("wordpress_deployment")
+            steps.insert(position, self.SETUP_JOB_STEP)
+            steps.append(self.AUTOSCALER_STEP)
+        if cloned:
+            steps[1:1] = self.CLONE_SNAPSHOT_STEPS
+            position = [name for name, _, _ in steps].index("wordpress_deployment")
+            steps.insert(position, self.CLONE_FIXUP_STEP)
+            steps.append(self.CLONE_CLEANUP_STEP)
+        if config.STORE_QUOTAS_ENABLED:
+            steps.insert(1, self.QUOTA_STEP)
+        return steps
+
+    def _provisioning_context(self, store):
+        """Rebuild the pipeline inputs from a store record"""
+        store_id = store["id"]
+        sample_products = store.get("sample_products")
+        if sample_products is None:
+            sample_products = "Sample Product 1|299|This is a sample product\nSample Product 2|599|Another sample product"
+        wordpress_storage_gi = store.get("wordpress_storage_gi")
+        if wordpress_storage_gi is None:
+            # Stores registered before the journal: total minus the fixed 1Gi for MySQL
+            wordpress_storage_gi = max((store.get("storage_size_gi") or 3) - 1, 1)
+        mysql_storage_gi = 0
+        if (store.get("db_mode") or "dedicated") == "dedicated":
+            mysql_storage_gi = max((store.get("storage_size_gi") or 0) - wordpress_storage_gi, 1)
+        ctx = {
+            "store_id": store_id,
+            "user_id": store["user_id"],
+            "namespace": f"store-{store_id}",
+            "store_url": store.get("store_url") or f"store-{store_id}.local",
+            "db_password": store.get("admin_password"),
+            "sample_products": sample_products,
+            "storage_size_gi": wordpress_storage_gi,
+            "mysql_storage_gi": mysql_storage_gi,
+            "plan_name": store.get("plan") or plans.DEFAULT_PLAN,
+            "plan": plans.get_plan(store.get("plan")),
+            "db_mode": store.get("db_mode") or "dedicated",
+            "db_instance": store.get("db_instance"),
+            "object_cache": store.get("object_cache"),
+            "runtime": store.get("runtime") or "apache",
+            "ingress_mode": store.get("ingress_mode") or "per_store",
+            "autoscaling": store.get("autoscaling"),
+            "cloned_from": store.get("cloned_from"),
+            "cluster": clusters.cluster_of(store),
+        }
+        if ctx["db_mode"] == "shared":
+            # Scoped user on the shared instance, with its own generated password
+            ctx.update(db_name=shared_mysql.database_name(store_id), db_user=shared_mysql.database_name(store_id),
+                       db_user_password=store.get("db_password"))
+        else:
+            ctx.update(db_name="wordpress", db_user="wordpress", db_user_password=store.get("admin_password"))
+        return ctx
+
+    # --- Provisioning steps (each returns True on success) ---
+
+    def _create_namespace(self, ctx):
+        return self.k8s_for(ctx).create_namespace(ctx["namespace"])
+
+    def _create_resource_quota(self, ctx):
+        user = database.get_user(ctx["user_id"])
+        hard, container_max = quotas.store_quota(ctx, user["max_storage_gi"])
+        k8s = self.k8s_for(ctx)
+        return (k8s.apply_limit_range(ctx["namespace"], get_limit_range(ctx["store_id"], container_max, user["max_storage_gi"]))
+                and k8s.apply_resource_quota(ctx["namespace"], get_resource_quota(ctx["store_id"], hard)))
+
+    def _create_mysql_secret(self, ctx):
+        mysql_secret = get_mysql_secret(
+            ctx["store_id"], ctx["db_user_password"], database=ctx["db_name"], user=ctx["db_user"]
+        )
+        return self.k8s_for(ctx).create_secret(ctx["namespace"], mysql_secret)
+
+    def _create_mysql_service(self, ctx):
+        mysql_svc = get_mysql_service(ctx["store_id"])
+        return self.k8s_for(ctx).create_service(ctx["namespace"], mysql_svc)
+
+    def _create_shared_mysql_service(self, ctx):
+        instance = shared_mysql.get_instance(ctx["db_instance"])
+        if instance is None:
+            logger.error(f"Shared MySQL instance {ctx['db_instance']} is no longer configured")
+            return False
+        return self.k8s_for(ctx).create_service(ctx["namespace"], get_shared_mysql_service(ctx["store_id"], instance["host"]))
+
+    def _create_shared_database(self, ctx):
+        shared_mysql.create_store_database(
+            ctx["db_instance"],
+            ctx["store_id"],
+            ctx["db_user_password"],
+            max_connections=ctx["plan"]["mysql"]["max_connections"],
+        )
+        return True
+
+    def _create_mysql_statefulset(self, ctx):
+        data_source = snapshot_data_source("mysql") if ctx["cloned_from"] else None
+        mysql_ss = get_mysql_statefulset(ctx["store_id"], ctx["plan"], storage_gi=ctx["mysql_storage_gi"],
+                                         data_source=data_source)
+        return self.k8s_for(ctx).create_statefulset(ctx["namespace"], mysql_ss)
+
+    def _wait_for_mysql(self, ctx):
+        """Poll the MySQL StatefulSet until its pod is ready, up to MYSQL_READY_TIMEOUT_SECONDS"""
+        logger.info("Waiting for MySQL to be ready...")
+        k8s = self.k8s_for(ctx)
+        deadline = time.monotonic() + config.MYSQL_READY_TIMEOUT_SECONDS
+        while not k8s.statefulset_ready(ctx["namespace"], "mysql"):
+            if time.monotonic() >= deadline:
+                logger.error(f"MySQL not ready after {config.MYSQL_READY_TIMEOUT_SECONDS:.0f}s")
+                return False
+            time.sleep(config.MYSQL_READY_POLL_SECONDS)
+        return True
+
+    def _create_object_cache(self, ctx):
+        if ctx["object_cache"] == "shared":
+            # A fresh password on every run keeps the ACL user and the Secret in step
+            password = secrets.token_hex(24)
+            object_cache.create_store_user(ctx["store_id"], password)
+            k8s = self.k8s_for(ctx)
+            credentials = get_redis_credentials_secret(ctx["store_id"], object_cache.acl_user(ctx["store_id"]), password)
+            service = get_shared_redis_service(ctx["store_id"], object_cache.SHARED_REDIS_HOST)
+            return k8s.apply_secret(ctx["namespace"], credentials) and k8s.create_service(ctx["namespace"], service)
+        return self.k8s_for(ctx).create_deployment(
+            ctx["namespace"], get_redis_deployment(ctx["store_id"], ctx["plan"])
+        ) and self.k8s_for(ctx).create_service(ctx["namespace"], get_redis_service(ctx["store_id"]))
+
+    def _create_wordpress_config(self, ctx):
+        cache = None
+        if ctx["object_cache"]:
+            cache = object_cache.connection_settings(ctx["store_id"], ctx["object_cache"])
+        wp_config = get_wordpress_config(
+            ctx["store_id"], ctx["db_password"], ctx["store_url"], ctx["sample_products"], object_cache=cache
+        )
+        return self.k8s_for(ctx).create_configmap(ctx["namespace"], wp_config)
+
+    def _create_php_config(self, ctx):
+        php_config = get_php_config(ctx["store_id"], ctx["plan"], runtime=ctx["runtime"])
+        return self.k8s_for(ctx).create_configmap(ctx["namespace"], php_config)
+
+    def _create_wordpress_pvc(self, ctx):
+        # With custom size
+        if ctx["autoscaling"]:
+            # Every replica mounts the same wp-content
+            wp_pvc = get_wordpress_pvc(ctx["store_id"], ctx["storage_size_gi"], shared=True,
+                                       storage_class=config.RWX_STORAGE_CLASS)
+        else:
+            data_source = snapshot_data_source("wordpress") if ctx["cloned_from"] else None
+            wp_pvc = get_wordpress_pvc(ctx["store_id"], ctx["storage_size_gi"],
+                                       storage_class=ctx["plan"]["storage"]["wordpress_class"],
+                                       data_source=data_source)
+        return self.k8s_for(ctx).create_pvc(ctx["namespace"], wp_pvc)
+
+    def _create_wp_setup_script(self, ctx):
+        wp_setup = get_wp_setup_script(
+            ctx["store_id"], ctx["db_password"], ctx["store_url"], ctx["sample_products"]
+        )
+        return self.k8s_for(ctx).create_configmap(ctx["namespace"], wp_setup)
+
+    def _db_port(self, ctx):
+        if ctx["db_mode"] == "shared":
+            return shared_mysql.get_instance(ctx["db_instance"])["port"]
+        return 3306
+
+    def _create_wp_setup_job(self, ctx):
+        k8s = self.k8s_for(ctx)
+        job = k8s.get_latest_job(ctx["namespace"], "app=wp-setup")
+        if job and job["state"] == "failed":
+            # Resumed after a failed setup: the marker was never written, so run it again
+            logger.warning(f"Setup Job failed: {(job.get('log') or '')[-500:]}")
+            if not k8s.delete_job(ctx["namespace"], job["name"]):
+                return False
+        elif job:
+            return True
+        return k8s.create_job(ctx["namespace"], get_wp_setup_job(ctx["store_id"], db_port=self._db_port(ctx)))
+
+    def _snapshot_source_volumes(self, ctx):
+        source_namespace = f"store-{ctx['cloned_from']}"
+        return all(
+            self.k8s_for(ctx).create_volume_snapshot(source_namespace, get_volume_snapshot(
+                source_namespace, source_snapshot_name(ctx["store_id"], volume), pvc_name,
+                config.VOLUME_SNAPSHOT_CLASS or None,
+            ))
+            for volume, pvc_name in CLONE_VOLUMES
+        )
+
+    def _import_source_snapshots(self, ctx):
+        """
+        Wait for the source snapshots, then bind a copy of each into the clone's
+        namespace (a PVC can only be restored from a snapshot in its own namespace)
+        """
+        source_namespace = f"store-{ctx['cloned_from']}"
+        snapshot_class = config.VOLUME_SNAPSHOT_CLASS or None
+        deadline = time.monotonic() + config.CLONE_TIMEOUT_SECONDS
+        for volume, _ in CLONE_VOLUMES:
+            name = source_snapshot_name(ctx["store_id"], volume)
+            snapshot = self.k8s_for(ctx).get_volume_snapshot(source_namespace, name)
+            while snapshot and not snapshot["ready"] and not snapshot["error"] and time.monotonic() < deadline:
+                time.sleep(_CLONE_POLL_SECONDS)
+                snapshot = self.k8s_for(ctx).get_volume_snapshot(source_namespace, name)
+            if not snapshot or not snapshot["ready"]:
+                logger.error(f"Snapshot {name} is not ready: {(snapshot or {}).get('error') or 'missing or timed out'}")
+                return False
+            content = self.k8s_for(ctx).get_volume_snapshot_content(snapshot["content_name"])
+            if not content or not content["snapshot_handle"]:
+                logger.error(f"Snapshot {name} has no snapshot handle")
+                return False
+            imported = get_imported_snapshot_content(
+                ctx["store_id"], volume, content["driver"], content["snapshot_handle"], snapshot_class
+            )
+            if not (self.k8s_for(ctx).create_volume_snapshot_content(imported)
+                    and self.k8s_for(ctx).create_volume_snapshot(ctx["namespace"],
+                                                        get_imported_snapshot(ctx["store_id"], volume, snapshot_class))):
+                return False
+        return True
+
+    def _run_clone_fixup(self, ctx):
+        """Run the URL/credential rewrite Job against the restored volumes and wait for it"""
+        source = database.get_store(ctx["cloned_from"])
+        if not source:
+            logger.error(f"Source store {ctx['cloned_from']} no longer exists")
+            return False
+        source_url = source.get("store_url") or f"store-{source['id']}.local"
+        job = self.k8s_for(ctx).get_latest_job(ctx["namespace"], "app=clone-fixup")
+        if job and job["state"] == "failed":
+            # Resumed after a failed run: start over with a fresh Job
+            self.k8s_for(ctx).delete_job(ctx["namespace"], job["name"])
+            job = None
+        if job is None:
+            if not (self.k8s_for(ctx).create_configmap(ctx["namespace"], get_clone_fixup_config(ctx["store_id"], source_url))
+                    and self.k8s_for(ctx).create_job(ctx["namespace"], get_clone_fixup_job(ctx["store_id"], self._db_port(ctx)))):
+                return False
+
+        deadline = time.monotonic() + config.CLONE_TIMEOUT_SECONDS
+        job = self.k8s_for(ctx).get_latest_job(ctx["namespace"], "app=clone-fixup")
+        while job and job["state"] == "running" and time.monotonic() < deadline:
+            time.sleep(_CLONE_POLL_SECONDS)
+            job = self.k8s_for(ctx).get_latest_job(ctx["namespace"], "app=clone-fixup")
+        if not job or job["state"] != "succeeded":
+            tail = (job or {}).get("log") or ""
+            logger.error(f"Clone fixup did not succeed ({(job or {}).get('state', 'missing')}): {tail[-500:]}")
+            return False
+        return True
+
+    def _delete_clone_snapshots(self, ctx):
+        """Both volumes are restored and in use by now; the snapshots are no longer needed"""
+        return self._release_clone_snapshots(ctx["store_id"], ctx["cloned_from"], self.k8s_for(ctx))
+
+    def _release_clone_snapshots(self, store_id, source_id, k8s):
+        ok = True
+        for volume, _ in CLONE_VOLUMES:
+            ok = k8s.delete_volume_snapshot(f"store-{store_id}", imported_snapshot_name(volume)) and ok
+            ok = k8s.delete_volume_snapshot_content(imported_content_name(store_id, volume)) and ok
+            ok = k8s.delete_volume_snapshot(f"store-{source_id}", source_snapshot_name(store_id, volume)) and ok
+        return ok
+
+    def _create_wordpress_deployment(self, ctx):
+        build = get_wordpress_fpm_deployment if ctx["runtime"] == "fpm" else get_wordpress_deployment
+        wp_deployment = build(ctx["store_id"], ctx["db_password"], ctx["store_url"], ctx["plan"],
+                              db_port=self._db_port(ctx), autoscaled=bool(ctx["autoscaling"]))
+        return self.k8s_for(ctx).create_deployment(ctx["namespace"], wp_deployment)
+
+    def _create_wordpress_service(self, ctx):
+        wp_service = get_wordpress_service(ctx["store_id"])
+        return self.k8s_for(ctx).create_service(ctx["namespace"], wp_service)
+
+    def _create_ingress(self, ctx):
+        if ctx["ingress_mode"] == "consolidated":
+            # Host rule is written with the next batched flush of its shard
+            return self.router.add_route(ctx["store_id"])
+        ingress = get_ingress(ctx["store_id"], ctx["store_url"])
+        return self.k8s_for(ctx).create_ingress(ctx["namespace"], ingress)
+
+    def _create_autoscaler(self, ctx):
+        hpa = get_wordpress_hpa(ctx["store_id"], ctx["plan"], ctx["autoscaling"], ctx["store_url"])
+        return self.k8s_for(ctx).create_hpa(ctx["namespace"], hpa)
+
+    @traced("StoreManager.list_stores")
     def list_stores(self, user_id=None):
         """List all stores, optionally filtered by user"""
-        namespaces = self.k8s.list_store_namespaces()
+        namespaces = [
+            (cluster, k8s, ns) for cluster, k8s in self.clusters.items() for ns in k8s.list_store_namespaces()
+        ]
 
         # Use new database function that returns all stores at once
         db_stores = database.get_all_stores_with_users()
 
         stores = []
 
-        for ns in namespaces:
+        for cluster, k8s, ns in namespaces:
             store_id = ns.replace("store-", "")
+            if store_id in db_stores and clusters.cluster_of(db_stores[store_id]) != cluster:
+                continue  # Leftover namespace on a cluster the store is not on; GC reports it
 
             # Filter by user if provided
             if user_id:
@@ -194,19 +1006,13 @@ class StoreManager:
                 db_status = db_stores[store_id].get("status", "unknown")
 
                 # For stores in provisioning state, check actual k8s status
-                if db_status == "provisioning":
-                    k8s_status = self.k8s.get_namespace_status(ns)
-
-                    # Update database if pods are now ready or failed
-                    if k8s_status in ["ready", "failed"]:
-                        database.update_store_status(store_id, k8s_status)
-                        status = k8s_status
-                    else:
-                        status = db_status
+                # (unless this process is still creating its resources)
+                if db_status == "provisioning" and store_id not in self._in_flight:
+                    status = self.refresh_provisioning_status(db_stores[store_id])
                 else:
                     status = db_status
             else:
-                status = self.k8s.get_namespace_status(ns)
+                status = k8s.get_namespace_status(ns)
 
             # Build store URL - use stored URL if available, otherwise fallback
             store_url = None
@@ -224,6 +1030,7 @@ class StoreManager:
                 "admin_url": f"https://{store_url}/wp-admin",
                 "admin_user": "admin",
                 "status": status,
+                "cluster": cluster,
             }
 
             # Enrich with DB data
@@ -232,11 +1039,58 @@ class StoreManager:
                 store_data["storage_gi"] = db_stores[store_id]["storage_size_gi"]
                 store_data["admin_password"] = db_stores[store_id].get("admin_password")
                 store_data["created_at"] = db_stores[store_id].get("created_at")
+                store_data["trace_id"] = db_stores[store_id].get("trace_id")
+                store_data["admission_wait_seconds"] = db_stores[store_id].get("admission_wait_seconds")
+                store_data["failure_reason"] = db_stores[store_id].get("failure_reason")
+                store_data["plan"] = db_stores[store_id].get("plan") or plans.DEFAULT_PLAN
+                store_data["db_mode"] = db_stores[store_id].get("db_mode")
+                store_data["object_cache"] = db_stores[store_id].get("object_cache")
+                store_data["runtime"] = db_stores[store_id].get("runtime")
+                store_data["autoscaling"] = db_stores[store_id].get("autoscaling")
+                store_data["hibernated_at"] = db_stores[store_id].get("hibernated_at")
+                store_data["last_request_at"] = db_stores[store_id].get("last_request_at")
+                store_data["cloned_from"] = db_stores[store_id].get("cloned_from")
+                store_data["quota_utilization"] = db_stores[store_id].get("quota_utilization")
 
             stores.append(store_data)
 
         return stores
 
+    def refresh_provisioning_status(self, store):
+        """Move a provisioning store to ready or failed based on its pods, events and stall deadline"""
+        store_id = store["id"]
+        evaluation = self.k8s_for(store).evaluate_namespace(f"store-{store_id}")
+
+        if evaluation["status"] == "ready":
+            database.update_store_status(store_id, "ready")
+            self._observe_time_to_ready(store)
+            return "ready"
+
+        if evaluation["status"] == "failed":
+            reason = f"{evaluation['reason']}: {evaluation['message']}"
+            database.update_store_status(store_id, "failed", reason=reason)
+            logger.warning(f"Store {store_id} failed: {reason}", extra={"store_id": store_id, "status": "failed"})
+            return "failed"
+
+        since = store.get("status_changed_at") or store.get("created_at")
+        if since and evaluation["status"] == "provisioning":
+            waited = (datetime.utcnow() - datetime.fromisoformat(since)).total_seconds()
+            if waited > config.STORE_STALL_DEADLINE_SECONDS:
+                cause = evaluation["reason"] or "timeout"
+                detail = evaluation["message"] or "not ready"
+                reason = f"stalled ({cause}): {detail} after {waited:.0f}s"
+                database.update_store_status(store_id, "failed", reason=reason)
+                logger.warning(f"Store {store_id} failed: {reason}", extra={"store_id": store_id, "status": "failed"})
+                return "failed"
+        return "provisioning"
+
+    def _observe_time_to_ready(self, store):
+        created_at = store.get("created_at")
+        if created_at:
+            elapsed = datetime.utcnow() - datetime.fromisoformat(created_at)
+            STORE_TIME_TO_READY_SECONDS.observe(elapsed.total_seconds())
+
+    @traced("StoreManager.delete_store")
     def delete_store(self, store_id, user_id=None):
         """Delete a store"""
         # Ownership check
@@ -250,21 +1104,85 @@ class StoreManager:
                     return {"error": "Unauthorized: You do not own this store"}
 
         namespace = f"store-{store_id}"
+        k8s = self.k8s_for(database.get_store(store_id))
 
-        if not self.k8s.namespace_exists(namespace):
+        if not k8s.namespace_exists(namespace):
             return {"error": "Store not found"}
 
-        print(f"\n=== Deleting store: {store_id} ===")
+        logger.info(f"Deleting store {store_id}", extra={"store_id": store_id, "user_id": user_id})
 
         # Update status to "deleted" before removing
         database.update_store_status(store_id, "deleted")
-        print(f"🗑️  Status: deleted")
+        logger.info("Status: deleted", extra={"store_id": store_id, "status": "deleted"})
 
-        if self.k8s.delete_namespace(namespace):
+        if k8s.delete_namespace(namespace):
             # Clean up DB after successful k8s deletion
-            database.deregister_store(store_id)
-            print(f"✅ Store deleted successfully!\n")
+            if not self.deregister_store(store_id):
+                return {"error": "Store namespace deleted, but its shared database could not be dropped; it will be retried"}
+            logger.info("Store deleted successfully", extra={"store_id": store_id})
             return {"success": True}
         else:
             # If k8s deletion fails, keep the record with "deleted" status for troubleshooting
             return {"error": "Failed to delete store from Kubernetes"}
+
+    def deregister_store(self, store_id):
+        """
+        Release what a store holds outside its namespace (its database on a
+        shared MySQL instance, its shared Redis user and keys, its
+        consolidated route), then remove its record. Returns False and keeps
+        the record in "deleted" when that fails, so garbage collection retries.
+        """
+        store = database.get_store(store_id)
+        if store and store.get("db_mode") == "shared" and store.get("db_instance"):
+            try:
+                shared_mysql.drop_store_database(store["db_instance"], store_id)
+            except shared_mysql.SharedMySQLError as e:
+                logger.error(f"Could not drop shared database: {e}", extra={"store_id": store_id})
+                return False
+        if store and store.get("object_cache") == "shared":
+            try:
+                object_cache.drop_store_user(store_id)
+            except object_cache.RedisError as e:
+                logger.error(f"Could not drop shared Redis user: {e}", extra={"store_id": store_id})
+                return False
+            # Best effort: leftover keys are evicted by LRU anyway
+            try:
+                removed = object_cache.purge_store_keys(store_id)
+                logger.info(f"Purged {removed} shared Redis keys", extra={"store_id": store_id})
+            except object_cache.RedisError as e:
+                logger.warning(f"Could not purge shared Redis keys: {e}", extra={"store_id": store_id})
+        if store and store.get("cloned_from"):
+            # Best effort: a clone deleted before its snapshot cleanup step leaves them behind
+            self._release_clone_snapshots(store_id, store["cloned_from"], self.k8s_for(store))
+        database.deregister_store(store_id)
+        if store and store.get("ingress_mode") == "consolidated":
+            # After the row is gone, so the shard rewrite no longer includes it
+            self.router.remove_route(store_id)
+        return True
+
+
+_AB_FIELDS = {
+    "requests_per_second": (r"Requests per second:\s+([\d.]+)", float),
+    "mean_latency_ms": (r"Time per request:\s+([\d.]+) \[ms\] \(mean\)", float),
+    "complete_requests": (r"Complete requests:\s+(\d+)", int),
+    "failed_requests": (r"Failed requests:\s+(\d+)", int),
+    "non_2xx_responses": (r"Non-2xx responses:\s+(\d+)", int),
+}
+
+
+def _parse_ab_output(log):
+    """Pull the headline numbers out of ApacheBench output"""
+    result = {}
+    for field, (pattern, cast) in _AB_FIELDS.items():
+        match = re.search(pattern, log)
+        result[field] = cast(match.group(1)) if match else None
+    if result["non_2xx_responses"] is None and result["complete_requests"] is not None:
+        result["non_2xx_responses"] = 0
+    return result
+
+
+def _ingress_mode(cluster):
+    """Consolidated routing shards live on the backend's own cluster; stores elsewhere get their own Ingress"""
+    if config.INGRESS_MODE == "consolidated" and cluster == clusters.DEFAULT_CLUSTER:
+        return "consolidated"
+    return "per_store"
@@ -0,0 +1,142 @@
+"""
+Non-blocking structured logging
+Log calls only put the record on a bounded in-memory queue; a listener thread
+formats it as one JSON line and writes it to stdout. When the queue is full
+(e.g. stdout is a slow pipe) records are dropped and counted instead of
+stalling the provisioning threads.
+
+Records carry store_id / user_id / step from the surrounding log_context()
+plus the active trace id, so interleaved output from parallel provisions can
+be split back apart.
+
+    LOG_LEVEL=INFO
+    LOG_LEVELS=k8s_client=WARNING,store_manager=DEBUG   # per-module overrides
+    LOG_FORMAT=json|text
+    LOG_QUEUE_SIZE=10000
+"""
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from metrics import LOG_RECORDS_DROPPED
+from tracing import current_trace_id
+
+# Fields copied from `extra=` / log_context() into the JSON output
+CONTEXT_FIELDS = ("store_id", "user_id", "step", "duration_ms", "namespace", "status")
+
+_log_context = contextvars.ContextVar("log_context", default={})
+_configured = False
+_configure_lock = threading.Lock()
+_listener = None
+
+
+@contextmanager
+def log_context(**fields):
+    """Attach fields (store_id, user_id, step, ...) to every record logged inside the block"""
+    token = _log_context.set({**_log_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _log_context.reset(token)
+
+
+class _ContextFilter(logging.Filter):
+    """Captures log context and trace id on the producing thread, before the record is queued"""
+
+    def filter(self, record):
+        for key, value in _log_context.get().items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+        if not hasattr(record, "trace_id"):
+            record.trace_id = current_trace_id()
+        return True
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks: a full queue drops the record"""
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.labels(record.levelname).inc()
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key in CONTEXT_FIELDS + ("trace_id",):
+            value = getattr(record, key, None)
+            if value is not None:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record):
+        context = " ".join(
+            f"{key}={getattr(record, key)}" for key in CONTEXT_FIELDS if getattr(record, key, None) is not None
+        )
+        line = f"{record.levelname:<7} {record.name}: {record.getMessage()}"
+        if context:
+            line = f"{line} [{context}]"
+        if record.exc_info:
+            line = f"{line}\n{self.formatException(record.exc_info)}"
+        return line
+
+
+def _parse_levels(spec):
+    levels = {}
+    for item in (spec or "").split(","):
+        name, _, level = item.partition("=")
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def configure_logging():
+    """Route all logging through the bounded queue (safe to call more than once)"""
+    global _configured, _listener
+    with _configure_lock:
+        if _configured:
+            return
+        _configured = True
+
+    formatter = TextFormatter() if os.environ.get("LOG_FORMAT", "json").lower() == "text" else JsonFormatter()
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(formatter)
+
+    records = queue.Queue(maxsize=int(os.environ.get("LOG_QUEUE_SIZE", 10000)))
+    queue_handler = _DroppingQueueHandler(records)
+    queue_handler.addFilter(_ContextFilter())
+
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(os.environ.get("LOG_LEVEL", "INFO").upper())
+    for name, level in _parse_levels(os.environ.get("LOG_LEVELS")).items():
+        logging.getLogger(name).setLevel(level)
+
+    _listener = logging.handlers.QueueListener(records, stream_handler, respect_handler_level=True)
+    _listener.start()
+
+
+def flush_logging():
+    """Drain queued records (used on shutdown and by tools that exit quickly)"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener.start()
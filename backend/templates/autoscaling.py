@@ -0,0 +1,55 @@
+from kubernetes import client
+
+import config
+
+
+def get_wordpress_hpa(store_id, plan, metric, store_url):
+    """
+    HorizontalPodAutoscaler for an autoscaled store's WordPress Deployment,
+    targeting CPU utilization or requests per second per replica (an
+    external metric selected by the store's host)
+    """
+    namespace = f"store-{store_id}"
+    autoscaling = plan["autoscaling"]
+    if metric == "requests":
+        target = client.V2MetricSpec(
+            type="External",
+            external=client.V2ExternalMetricSource(
+                metric=client.V2MetricIdentifier(
+                    name=config.AUTOSCALING_REQUESTS_METRIC,
+                    selector=client.V1LabelSelector(match_labels={"host": store_url}),
+                ),
+                target=client.V2MetricTarget(
+                    type="AverageValue", average_value=str(autoscaling["target_requests_per_second"])
+                ),
+            ),
+        )
+    else:
+        target = client.V2MetricSpec(
+            type="Resource",
+            resource=client.V2ResourceMetricSource(
+                name="cpu",
+                target=client.V2MetricTarget(
+                    type="Utilization", average_utilization=autoscaling["target_cpu_percent"]
+                ),
+            ),
+        )
+    return client.V2HorizontalPodAutoscaler(
+        metadata=client.V1ObjectMeta(name="wordpress", namespace=namespace, labels={"app": "wordpress"}),
+        spec=client.V2HorizontalPodAutoscalerSpec(
+            scale_target_ref=client.V2CrossVersionObjectReference(
+                api_version="apps/v1", kind="Deployment", name="wordpress"
+            ),
+            min_replicas=autoscaling["min_replicas"],
+            max_replicas=autoscaling["max_replicas"],
+            metrics=[target],
+            behavior=client.V2HorizontalPodAutoscalerBehavior(
+                # Scale out at once on a spike, scale in only after five quiet minutes
+                scale_up=client.V2HPAScalingRules(
+                    stabilization_window_seconds=0,
+                    policies=[client.V2HPAScalingPolicy(type="Percent", value=100, period_seconds=30)],
+                ),
+                scale_down=client.V2HPAScalingRules(stabilization_window_seconds=300),
+            ),
+        ),
+    )
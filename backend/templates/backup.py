@@ -0,0 +1,249 @@
+from kubernetes import client
+
+from images import image, pull_policy
+
+# rclone remote defined through RCLONE_CONFIG_BACKUP_* environment variables
+REMOTE = "backup"
+CREDENTIALS_SECRET = "backup-credentials"
+
+_DUMP_RESOURCES = {"requests": {"cpu": "100m", "memory": "128Mi"}, "limits": {"cpu": "500m", "memory": "256Mi"}}
+_TRANSFER_RESOURCES = {"requests": {"cpu": "100m", "memory": "64Mi"}, "limits": {"cpu": "1", "memory": "256Mi"}}
+
+# The dump is gzipped by mysqldump's container into a FIFO and read straight
+# into the upload, so it is never written to disk or held in memory whole.
+# pipefail makes a failed mysqldump fail the container rather than upload a
+# truncated dump.
+_DUMP_SCRIPT = (
+    "set -o pipefail\n"
+    'mysqldump -h "${DB_HOST%:*}" -P "${DB_HOST#*:}" -u"$DB_USER" -p"$DB_PASSWORD" '
+    '--single-transaction --quick --no-tablespaces "$DB_NAME" | gzip -c > /stream/db.sql.gz'
+)
+
+# The three transfers run in parallel. Uploads are synced to one tree per
+# store, so only new or changed files are sent; files a backup replaces or
+# deletes move to uploads-history/<backup>.
+_UPLOAD_SCRIPT = (
+    "rclone rcat \"$REMOTE_PREFIX/db.sql.gz\" < /stream/db.sql.gz & db=$!\n"
+    "tar -C /var/www/html -cz --exclude=wp-content/uploads wp-content"
+    " | rclone rcat \"$REMOTE_PREFIX/wp-content.tar.gz\" & files=$!\n"
+    "rclone sync /var/www/html/wp-content/uploads \"$REMOTE_UPLOADS\""
+    " --backup-dir \"$REMOTE_HISTORY\" --transfers 8 --fast-list & uploads=$!\n"
+    "wait $db && wait $files && wait $uploads"
+)
+
+_IMPORT_SCRIPT = (
+    "set -o pipefail\n"
+    'gunzip -c < /stream/db.sql.gz | mysql -h "${DB_HOST%:*}" -P "${DB_HOST#*:}" -u"$DB_USER" -p"$DB_PASSWORD" "$DB_NAME"'
+)
+
+_DOWNLOAD_SCRIPT = (
+    "rclone cat \"$REMOTE_PREFIX/db.sql.gz\" > /stream/db.sql.gz & db=$!\n"
+    "rclone cat \"$REMOTE_PREFIX/wp-content.tar.gz\" | tar -C /var/www/html -xz & files=$!\n"
+    "rclone copy \"$REMOTE_UPLOADS\" /var/www/html/wp-content/uploads --transfers 16 --fast-list & uploads=$!\n"
+    "wait $db && wait $files && wait $uploads\n"
+    # rclone writes as root; WordPress runs as www-data
+    "chown -R 33:33 /var/www/html/wp-content"
+)
+
+_URL_REWRITE_SCRIPT = (
+    "until nc -z ${WORDPRESS_DB_HOST%:*} ${WORDPRESS_DB_HOST#*:} 2>/dev/null; do sleep 3; done\n"
+    "cd /var/www/html\n"
+    'wp search-replace "//${SOURCE_HOST}" "//${TARGET_HOST}" '
+    "--all-tables --skip-columns=guid --precise --report-changed-only --allow-root\n"
+    "wp transient delete --all --allow-root"
+)
+
+
+def backup_prefix(store_id, backup_id):
+    return f"stores/{store_id}/backups/{backup_id}"
+
+
+def get_backup_credentials_secret(store_id, access_key, secret_key):
+    return client.V1Secret(
+        metadata=client.V1ObjectMeta(name=CREDENTIALS_SECRET, namespace=f"store-{store_id}"),
+        type="Opaque",
+        string_data={"access-key": access_key, "secret-key": secret_key},
+    )
+
+
+def _secret_env(name, secret, key):
+    return client.V1EnvVar(
+        name=name,
+        value_from=client.V1EnvVarSource(secret_key_ref=client.V1SecretKeySelector(name=secret, key=key)),
+    )
+
+
+def _db_env(db_port):
+    return [
+        client.V1EnvVar(name="DB_HOST", value=f"mysql:{db_port}"),
+        _secret_env("DB_NAME", "mysql-secret", "mysql-database"),
+        _secret_env("DB_USER", "mysql-secret", "mysql-user"),
+        _secret_env("DB_PASSWORD", "mysql-secret", "mysql-password"),
+    ]
+
+
+def _rclone_env(s3, bucket, store_id, prefix, backup_id=None):
+    remote = f"{REMOTE}:{bucket}/stores/{store_id}"
+    env = [
+        client.V1EnvVar(name="RCLONE_CONFIG_BACKUP_TYPE", value="s3"),
+        client.V1EnvVar(name="RCLONE_CONFIG_BACKUP_PROVIDER", value=s3["provider"]),
+        client.V1EnvVar(name="RCLONE_CONFIG_BACKUP_REGION", value=s3["region"]),
+        _secret_env("RCLONE_CONFIG_BACKUP_ACCESS_KEY_ID", CREDENTIALS_SECRET, "access-key"),
+        _secret_env("RCLONE_CONFIG_BACKUP_SECRET_ACCESS_KEY", CREDENTIALS_SECRET, "secret-key"),
+        client.V1EnvVar(name="REMOTE_PREFIX", value=f"{REMOTE}:{bucket}/{prefix}"),
+        client.V1EnvVar(name="REMOTE_UPLOADS", value=f"{remote}/uploads"),
+    ]
+    if s3.get("endpoint"):
+        env.append(client.V1EnvVar(name="RCLONE_CONFIG_BACKUP_ENDPOINT", value=s3["endpoint"]))
+    if backup_id is not None:
+        env.append(client.V1EnvVar(name="REMOTE_HISTORY", value=f"{remote}/uploads-history/{backup_id}"))
+    return env
+
+
+def _stream_job(store_id, job_name, labels, db_container, transfer_container, timeout_seconds, read_only):
+    """
+    Pod with a database container and a transfer container joined by a FIFO
+    on a shared emptyDir, so the dump streams between them
+    """
+    affinity = None
+    if read_only:
+        # A ReadWriteOnce volume can only be mounted on the node running WordPress
+        affinity = client.V1Affinity(pod_affinity=client.V1PodAffinity(
+            required_during_scheduling_ignored_during_execution=[client.V1PodAffinityTerm(
+                label_selector=client.V1LabelSelector(match_labels={"app": "wordpress"}),
+                topology_key="kubernetes.io/hostname",
+            )]
+        ))
+    return client.V1Job(
+        metadata=client.V1ObjectMeta(name=job_name, namespace=f"store-{store_id}", labels=labels),
+        spec=client.V1JobSpec(
+            backoff_limit=1,
+            active_deadline_seconds=timeout_seconds,
+            ttl_seconds_after_finished=24 * 60 * 60,
+            template=client.V1PodTemplateSpec(
+                metadata=client.V1ObjectMeta(labels={**labels, "job-name": job_name}),
+                spec=client.V1PodSpec(
+                    restart_policy="Never",
+                    affinity=affinity,
+                    init_containers=[
+                        client.V1Container(
+                            name="fifo",
+                            image=image("mysql"),
+                            image_pull_policy=pull_policy("mysql"),
+                            command=["mkfifo", "/stream/db.sql.gz"],
+                            volume_mounts=[client.V1VolumeMount(name="stream", mount_path="/stream")],
+                        )
+                    ],
+                    containers=[db_container, transfer_container],
+                    volumes=[
+                        client.V1Volume(name="stream", empty_dir=client.V1EmptyDirVolumeSource()),
+                        client.V1Volume(
+                            name="wordpress-storage",
+                            persistent_volume_claim=client.V1PersistentVolumeClaimVolumeSource(
+                                claim_name="wordpress-pvc", read_only=read_only
+                            ),
+                        ),
+                    ],
+                ),
+            ),
+        ),
+    )
+
+
+def get_backup_job(store_id, backup_id, job_name, s3, bucket, db_port=3306, timeout_seconds=3600):
+    """Streams the compressed dump, the wp-content tarball and the uploads to the bucket"""
+    prefix = backup_prefix(store_id, backup_id)
+    labels = {"app": "store-backup", "backup-id": str(backup_id)}
+    dump = client.V1Container(
+        name="mysqldump",
+        image=image("mysql"),
+        image_pull_policy=pull_policy("mysql"),
+        command=["bash", "-c", _DUMP_SCRIPT],
+        env=_db_env(db_port),
+        resources=client.V1ResourceRequirements(**_DUMP_RESOURCES),
+        volume_mounts=[client.V1VolumeMount(name="stream", mount_path="/stream")],
+    )
+    upload = client.V1Container(
+        name="upload",
+        image=image("rclone"),
+        image_pull_policy=pull_policy("rclone"),
+        command=["sh", "-c", _UPLOAD_SCRIPT],
+        env=_rclone_env(s3, bucket, store_id, prefix, backup_id=backup_id),
+        resources=client.V1ResourceRequirements(**_TRANSFER_RESOURCES),
+        volume_mounts=[
+            client.V1VolumeMount(name="stream", mount_path="/stream"),
+            client.V1VolumeMount(name="wordpress-storage", mount_path="/var/www/html", read_only=True),
+        ],
+    )
+    return _stream_job(store_id, job_name, labels, dump, upload, timeout_seconds, read_only=True)
+
+
+def get_restore_job(store_id, source_store_id, backup_id, job_name, s3, bucket, db_port=3306, timeout_seconds=3600):
+    """Imports the dump while wp-content and the uploads download in parallel"""
+    prefix = backup_prefix(source_store_id, backup_id)
+    labels = {"app": "store-restore", "backup-id": str(backup_id)}
+    load = client.V1Container(
+        name="mysql-import",
+        image=image("mysql"),
+        image_pull_policy=pull_policy("mysql"),
+        command=["bash", "-c", _IMPORT_SCRIPT],
+        env=_db_env(db_port),
+        resources=client.V1ResourceRequirements(**_DUMP_RESOURCES),
+        volume_mounts=[client.V1VolumeMount(name="stream", mount_path="/stream")],
+    )
+    download = client.V1Container(
+        name="download",
+        image=image("rclone"),
+        image_pull_policy=pull_policy("rclone"),
+        command=["sh", "-c", _DOWNLOAD_SCRIPT],
+        env=_rclone_env(s3, bucket, source_store_id, prefix),
+        resources=client.V1ResourceRequirements(**_TRANSFER_RESOURCES),
+        volume_mounts=[
+            client.V1VolumeMount(name="stream", mount_path="/stream"),
+            client.V1VolumeMount(name="wordpress-storage", mount_path="/var/www/html"),
+        ],
+    )
+    return _stream_job(store_id, job_name, labels, load, download, timeout_seconds, read_only=False)
+
+
+def get_url_rewrite_job(store_id, job_name, source_host, target_host, db_port=3306):
+    """Points a database restored from another store at this store's host"""
+    labels = {"app": "store-restore-rewrite"}
+    return client.V1Job(
+        metadata=client.V1ObjectMeta(name=job_name, namespace=f"store-{store_id}", labels=labels),
+        spec=client.V1JobSpec(
+            backoff_limit=2,
+            ttl_seconds_after_finished=24 * 60 * 60,
+            template=client.V1PodTemplateSpec(
+                metadata=client.V1ObjectMeta(labels={**labels, "job-name": job_name}),
+                spec=client.V1PodSpec(
+                    restart_policy="Never",
+                    containers=[
+                        client.V1Container(
+                            name="search-replace",
+                            image=image("wp_cli"),
+                            image_pull_policy=pull_policy("wp_cli"),
+                            command=["/bin/bash", "-c", _URL_REWRITE_SCRIPT],
+                            env=[
+                                client.V1EnvVar(name="WORDPRESS_DB_HOST", value=f"mysql:{db_port}"),
+                                client.V1EnvVar(name="SOURCE_HOST", value=source_host),
+                                client.V1EnvVar(name="TARGET_HOST", value=target_host),
+                            ],
+                            resources=client.V1ResourceRequirements(**_DUMP_RESOURCES),
+                            volume_mounts=[
+                                client.V1VolumeMount(name="wordpress-storage", mount_path="/var/www/html")
+                            ],
+                        )
+                    ],
+                    volumes=[
+                        client.V1Volume(
+                            name="wordpress-storage",
+                            persistent_volume_claim=client.V1PersistentVolumeClaimVolumeSource(
+                                claim_name="wordpress-pvc"
+                            ),
+                        )
+                    ],
+                ),
+            ),
+        ),
+    )
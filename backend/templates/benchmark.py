@@ -0,0 +1,47 @@
+from kubernetes import client
+
+from images import image, pull_policy
+
+
+def get_benchmark_job(store_id, job_name, store_url, requests=500, concurrency=10, path="/"):
+    """
+    One-off ApacheBench run against the store's WordPress service from inside
+    the cluster. The Host header matches the store URL so WordPress renders
+    the page instead of redirecting to its canonical host.
+    """
+    namespace = f"store-{store_id}"
+    target = f"http://wordpress.{namespace}.svc.cluster.local{path}"
+    return client.V1Job(
+        metadata=client.V1ObjectMeta(
+            name=job_name, namespace=namespace, labels={"app": "benchmark"}
+        ),
+        spec=client.V1JobSpec(
+            backoff_limit=0,
+            ttl_seconds_after_finished=24 * 60 * 60,
+            template=client.V1PodTemplateSpec(
+                metadata=client.V1ObjectMeta(labels={"app": "benchmark", "job-name": job_name}),
+                spec=client.V1PodSpec(
+                    restart_policy="Never",
+                    containers=[
+                        client.V1Container(
+                            name="ab",
+                            image=image("benchmark"),
+                            image_pull_policy=pull_policy("benchmark"),
+                            command=[
+                                "ab", "-k",
+                                "-n", str(requests),
+                                "-c", str(concurrency),
+                                "-H", f"Host: {store_url}",
+                                "-H", "X-Forwarded-Proto: https",
+                                target,
+                            ],
+                            resources=client.V1ResourceRequirements(
+                                requests={"cpu": "100m", "memory": "32Mi"},
+                                limits={"cpu": "500m", "memory": "64Mi"},
+                            ),
+                        )
+                    ],
+                ),
+            ),
+        ),
+    )
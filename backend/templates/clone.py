@@ -0,0 +1,182 @@
+from kubernetes import client
+
+from images import image, pull_policy
+from plans import SETUP_RESOURCES
+
+# Store volumes a clone is restored from: (volume, PVC name in the source namespace)
+CLONE_VOLUMES = (("wordpress", "wordpress-pvc"), ("mysql", "mysql-storage-mysql-0"))
+
+_SNAPSHOT_API = "snapshot.storage.k8s.io/v1"
+
+# Runs against the restored volumes before WordPress starts. The database
+# still holds the source's credentials and URLs; MySQL's root password is
+# the same for every store, so it can reset the WordPress user's password.
+CLONE_FIXUP_SCRIPT = r"""#!/bin/bash
+set -e
+
+until nc -z ${WORDPRESS_DB_HOST%:*} ${WORDPRESS_DB_HOST#*:} 2>/dev/null; do sleep 3; done
+cd /var/www/html
+
+echo "Rotating database credentials..."
+mysql -h "${WORDPRESS_DB_HOST%:*}" -P "${WORDPRESS_DB_HOST#*:}" -uroot -p"${MYSQL_ROOT_PASSWORD}" \
+  -e "ALTER USER '${WORDPRESS_DB_USER}'@'%' IDENTIFIED BY '${WORDPRESS_DB_PASSWORD}'; FLUSH PRIVILEGES;"
+wp config set DB_PASSWORD "${WORDPRESS_DB_PASSWORD}" --allow-root
+wp config shuffle-salts --allow-root
+
+echo "Rewriting ${SOURCE_SITE_URL} -> ${WP_SITE_URL}"
+wp config set WP_HOME "${WP_SITE_URL}" --type=constant --allow-root
+wp config set WP_SITEURL "${WP_SITE_URL}" --type=constant --allow-root
+# Protocol-relative, so http://, https:// and //host links are all covered
+wp search-replace "//${SOURCE_SITE_URL#https://}" "//${WP_SITE_URL#https://}" \
+  --all-tables --skip-columns=guid --precise --report-changed-only --allow-root
+
+wp user update "${WP_ADMIN_USER}" --user_pass="${WP_ADMIN_PASSWORD}" --skip-email --allow-root
+wp transient delete --all --allow-root
+echo "=== CLONE FIXUP COMPLETE ==="
+"""
+
+
+def source_snapshot_name(store_id, volume):
+    """VolumeSnapshot taken in the source store's namespace for clone store_id"""
+    return f"clone-{store_id}-{volume}"
+
+
+def imported_snapshot_name(volume):
+    return f"{volume}-source"
+
+
+def imported_content_name(store_id, volume):
+    return f"store-{store_id}-{volume}-source"
+
+
+def get_volume_snapshot(namespace, name, pvc_name, snapshot_class=None):
+    spec = {"source": {"persistentVolumeClaimName": pvc_name}}
+    if snapshot_class:
+        spec["volumeSnapshotClassName"] = snapshot_class
+    return {
+        "apiVersion": _SNAPSHOT_API,
+        "kind": "VolumeSnapshot",
+        "metadata": {"name": name, "namespace": namespace, "labels": {"app": "store-clone"}},
+        "spec": spec,
+    }
+
+
+def get_imported_snapshot_content(store_id, volume, driver, snapshot_handle, snapshot_class=None):
+    """
+    Pre-provisioned content pointing at the source snapshot's handle, so the
+    clone's namespace gets its own VolumeSnapshot of the same data. Retain:
+    the source-side snapshot owns the underlying storage snapshot.
+    """
+    spec = {
+        "deletionPolicy": "Retain",
+        "driver": driver,
+        "source": {"snapshotHandle": snapshot_handle},
+        "volumeSnapshotRef": {"name": imported_snapshot_name(volume), "namespace": f"store-{store_id}"},
+    }
+    if snapshot_class:
+        spec["volumeSnapshotClassName"] = snapshot_class
+    return {
+        "apiVersion": _SNAPSHOT_API,
+        "kind": "VolumeSnapshotContent",
+        "metadata": {"name": imported_content_name(store_id, volume), "labels": {"app": "store-clone"}},
+        "spec": spec,
+    }
+
+
+def get_imported_snapshot(store_id, volume, snapshot_class=None):
+    spec = {"source": {"volumeSnapshotContentName": imported_content_name(store_id, volume)}}
+    if snapshot_class:
+        spec["volumeSnapshotClassName"] = snapshot_class
+    return {
+        "apiVersion": _SNAPSHOT_API,
+        "kind": "VolumeSnapshot",
+        "metadata": {
+            "name": imported_snapshot_name(volume),
+            "namespace": f"store-{store_id}",
+            "labels": {"app": "store-clone"},
+        },
+        "spec": spec,
+    }
+
+
+def snapshot_data_source(volume):
+    """PVC dataSource restoring a volume from the clone's imported snapshot"""
+    return client.V1TypedLocalObjectReference(
+        api_group="snapshot.storage.k8s.io", kind="VolumeSnapshot", name=imported_snapshot_name(volume)
+    )
+
+
+def get_clone_fixup_config(store_id, source_url):
+    namespace = f"store-{store_id}"
+    return client.V1ConfigMap(
+        metadata=client.V1ObjectMeta(name="clone-fixup-script", namespace=namespace),
+        data={"clone-fixup.sh": CLONE_FIXUP_SCRIPT, "SOURCE_SITE_URL": f"https://{source_url}"},
+    )
+
+
+def _secret_env(name, key):
+    return client.V1EnvVar(
+        name=name,
+        value_from=client.V1EnvVarSource(secret_key_ref=client.V1SecretKeySelector(name="mysql-secret", key=key)),
+    )
+
+
+def get_clone_fixup_job(store_id, db_port=3306):
+    """Rotates credentials and rewrites the site URL in the restored database and wp-config.php"""
+    namespace = f"store-{store_id}"
+    return client.V1Job(
+        metadata=client.V1ObjectMeta(name="clone-fixup", namespace=namespace, labels={"app": "clone-fixup"}),
+        spec=client.V1JobSpec(
+            backoff_limit=2,
+            template=client.V1PodTemplateSpec(
+                metadata=client.V1ObjectMeta(labels={"app": "clone-fixup"}),
+                spec=client.V1PodSpec(
+                    restart_policy="Never",
+                    containers=[
+                        client.V1Container(
+                            name="clone-fixup",
+                            image=image("wp_cli"),
+                            image_pull_policy=pull_policy("wp_cli"),
+                            command=["/bin/bash", "/scripts/clone-fixup.sh"],
+                            resources=client.V1ResourceRequirements(**SETUP_RESOURCES),
+                            env_from=[
+                                client.V1EnvFromSource(
+                                    config_map_ref=client.V1ConfigMapEnvSource(name="wordpress-config")
+                                )
+                            ],
+                            env=[
+                                client.V1EnvVar(name="WORDPRESS_DB_HOST", value=f"mysql:{db_port}"),
+                                client.V1EnvVar(
+                                    name="SOURCE_SITE_URL",
+                                    value_from=client.V1EnvVarSource(
+                                        config_map_key_ref=client.V1ConfigMapKeySelector(
+                                            name="clone-fixup-script", key="SOURCE_SITE_URL"
+                                        )
+                                    ),
+                                ),
+                                _secret_env("MYSQL_ROOT_PASSWORD", "mysql-root-password"),
+                                _secret_env("WORDPRESS_DB_USER", "mysql-user"),
+                                _secret_env("WORDPRESS_DB_PASSWORD", "mysql-password"),
+                            ],
+                            volume_mounts=[
+                                client.V1VolumeMount(name="wordpress-storage", mount_path="/var/www/html"),
+                                client.V1VolumeMount(name="fixup-script", mount_path="/scripts"),
+                            ],
+                        )
+                    ],
+                    volumes=[
+                        client.V1Volume(
+                            name="wordpress-storage",
+                            persistent_volume_claim=client.V1PersistentVolumeClaimVolumeSource(
+                                claim_name="wordpress-pvc"
+                            ),
+                        ),
+                        client.V1Volume(
+                            name="fixup-script",
+                            config_map=client.V1ConfigMapVolumeSource(name="clone-fixup-script"),
+                        ),
+                    ],
+                ),
+            ),
+        ),
+    )
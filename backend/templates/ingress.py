@@ -1,39 +1,116 @@
 from kubernetes import client
 
+_ANNOTATIONS = {
+    "nginx.ingress.kubernetes.io/proxy-body-size": "50m",
+    "nginx.ingress.kubernetes.io/ssl-redirect": "true",
+    "nginx.ingress.kubernetes.io/backend-protocol": "HTTP",
+    # REMOVED: configuration-snippet (it's blocked by your admin)
+}
 
-def get_ingress(store_id, store_url):
+
+def _host_rule(host, service_name):
+    return client.V1IngressRule(
+        host=host,
+        http=client.V1HTTPIngressRuleValue(
+            paths=[
+                client.V1HTTPIngressPath(
+                    path="/",
+                    path_type="Prefix",
+                    backend=client.V1IngressBackend(
+                        service=client.V1IngressServiceBackend(
+                            name=service_name,
+                            port=client.V1ServiceBackendPort(number=80),
+                        )
+                    ),
+                )
+            ]
+        ),
+    )
+
+
+def get_ingress(store_id, store_url, service_name="wordpress"):
     namespace = f"store-{store_id}"
     return client.V1Ingress(
         metadata=client.V1ObjectMeta(
             name="store-ingress",
             namespace=namespace,
+            annotations=dict(_ANNOTATIONS),
+        ),
+        spec=client.V1IngressSpec(
+            ingress_class_name="nginx",
+            rules=[_host_rule(store_url, service_name)],
+        ),
+    )
+
+
+def get_activator_service(store_id, activator_host):
+    """`activator` service in a hibernated store's namespace; its Ingress points here instead of WordPress"""
+    namespace = f"store-{store_id}"
+    return client.V1Service(
+        metadata=client.V1ObjectMeta(
+            name="activator", namespace=namespace, labels={"app": "activator"}
+        ),
+        spec=client.V1ServiceSpec(
+            type="ExternalName",
+            external_name=activator_host,
+            ports=[client.V1ServicePort(port=80, target_port=80, protocol="TCP", name="http")],
+        ),
+    )
+
+
+def route_service_name(store_id):
+    return f"store-{store_id}"
+
+
+def get_route_service(store_id, routing_namespace):
+    """
+    ExternalName service in the routing namespace that forwards to the store's
+    WordPress service, since an Ingress can only reference services in its own
+    namespace
+    """
+    return client.V1Service(
+        metadata=client.V1ObjectMeta(
+            name=route_service_name(store_id),
+            namespace=routing_namespace,
+            labels={"app": "store-route", "store-id": store_id},
+        ),
+        spec=client.V1ServiceSpec(
+            type="ExternalName",
+            external_name=f"wordpress.store-{store_id}.svc.cluster.local",
+            ports=[client.V1ServicePort(port=80, target_port=80, protocol="TCP", name="http")],
+        ),
+    )
+
+
+def route_shard_name(shard):
+    return f"store-routes-{shard}"
+
+
+def get_route_shard_ingress(shard, routing_namespace, routes, tls_secret=None):
+    """
+    One shard of the consolidated routing table: a rule per (store_id, host),
+    sorted so an unchanged shard renders identically. All shards share the
+    wildcard certificate of the store domain(s).
+    """
+    routes = sorted(routes, key=lambda route: route[1])
+    tls = None
+    if tls_secret:
+        wildcards = sorted({f"*.{host.split('.', 1)[1]}" for _, host in routes if "." in host})
+        tls = [client.V1IngressTLS(hosts=wildcards, secret_name=tls_secret)]
+    return client.V1Ingress(
+        metadata=client.V1ObjectMeta(
+            name=route_shard_name(shard),
+            namespace=routing_namespace,
+            labels={"app": "store-routes", "shard": str(shard)},
             annotations={
-                "nginx.ingress.kubernetes.io/proxy-body-size": "50m",
-                "nginx.ingress.kubernetes.io/ssl-redirect": "true",
-                "nginx.ingress.kubernetes.io/backend-protocol": "HTTP",
-                # REMOVED: configuration-snippet (it's blocked by your admin)
+                **_ANNOTATIONS,
+                # ExternalName backends have no Endpoints; route to the service address
+                "nginx.ingress.kubernetes.io/service-upstream": "true",
             },
         ),
         spec=client.V1IngressSpec(
             ingress_class_name="nginx",
-            rules=[
-                client.V1IngressRule(
-                    host=store_url,
-                    http=client.V1HTTPIngressRuleValue(
-                        paths=[
-                            client.V1HTTPIngressPath(
-                                path="/",
-                                path_type="Prefix",
-                                backend=client.V1IngressBackend(
-                                    service=client.V1IngressServiceBackend(
-                                        name="wordpress",
-                                        port=client.V1ServiceBackendPort(number=80),
-                                    )
-                                ),
-                            )
-                        ]
-                    ),
-                )
-            ],
+            tls=tls,
+            rules=[_host_rule(host, route_service_name(store_id)) for store_id, host in routes],
         ),
     )
@@ -1,6 +1,8 @@
 from kubernetes import client
 
-def get_mysql_secret(store_id, password):
+from images import image, pull_policy
+
+def get_mysql_secret(store_id, password, database="wordpress", user="wordpress"):
     namespace = f"store-{store_id}"
     return client.V1Secret(
         metadata=client.V1ObjectMeta(
@@ -10,8 +12,8 @@ def get_mysql_secret(store_id, password):
         type="Opaque",
         string_data={
             "mysql-root-password": "rootpassword",
-            "mysql-database": "wordpress",
-            "mysql-user": "wordpress",
+            "mysql-database": database,
+            "mysql-user": user,
             "mysql-password": password
         }
     )
@@ -41,8 +43,27 @@ def get_mysql_service(store_id):
         )
     )
 
-def get_mysql_statefulset(store_id):
+def get_shared_mysql_service(store_id, host):
+    """`mysql` service that resolves to the store's shared MySQL instance"""
+    namespace = f"store-{store_id}"
+    return client.V1Service(
+        metadata=client.V1ObjectMeta(
+            name="mysql",
+            namespace=namespace,
+            labels={
+                "app": "mysql",
+                "db-mode": "shared"
+            }
+        ),
+        spec=client.V1ServiceSpec(
+            type="ExternalName",
+            external_name=host
+        )
+    )
+
+def get_mysql_statefulset(store_id, plan, storage_gi=1, data_source=None):
     namespace = f"store-{store_id}"
+    mysql = plan["mysql"]
     return client.V1StatefulSet(
         metadata=client.V1ObjectMeta(
             name="mysql",
@@ -66,13 +87,25 @@ def get_mysql_statefulset(store_id):
                     containers=[
                         client.V1Container(
                             name="mysql",
-                            image="mysql:8.0",
+                            image=image("mysql"),
+                            image_pull_policy=pull_policy("mysql"),
+                            args=[
+                                f"--innodb-buffer-pool-size={mysql['innodb_buffer_pool_size']}",
+                                f"--max-connections={mysql['max_connections']}"
+                            ],
+                            resources=client.V1ResourceRequirements(**mysql["resources"]),
                             ports=[
                                 client.V1ContainerPort(
                                     container_port=3306,
                                     name="mysql"
                                 )
                             ],
+                            # The entrypoint's init server skips networking, so an open port means MySQL is up
+                            readiness_probe=client.V1Probe(
+                                tcp_socket=client.V1TCPSocketAction(port=3306),
+                                initial_delay_seconds=5,
+                                period_seconds=3,
+                            ),
                             env=[
                                 client.V1EnvVar(
                                     name="MYSQL_ROOT_PASSWORD",
@@ -128,9 +161,11 @@ def get_mysql_statefulset(store_id):
                     ),
                     spec=client.V1PersistentVolumeClaimSpec(
                         access_modes=["ReadWriteOnce"],
+                        storage_class_name=plan["storage"]["mysql_class"],
+                        data_source=data_source,
                         resources=client.V1ResourceRequirements(
                             requests={
-                                "storage": "1Gi"
+                                "storage": f"{storage_gi}Gi"
                             }
                         )
                     )
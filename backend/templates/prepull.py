@@ -0,0 +1,62 @@
+from kubernetes import client
+
+from images import image, pull_policy
+
+PREPULL_NAME = "store-image-prepull"
+
+
+def get_prepull_daemonset(namespace, image_names, version):
+    """
+    DaemonSet whose init containers each start one store image and exit, so
+    every node has the images before a store is scheduled there. The pod then
+    idles in a pause container; version changes roll it to pull the new set.
+    """
+    labels = {"app": PREPULL_NAME}
+    return client.V1DaemonSet(
+        metadata=client.V1ObjectMeta(
+            name=PREPULL_NAME,
+            namespace=namespace,
+            labels={**labels, "managed-by": "store-platform"},
+            annotations={"store-platform/template-version": version},
+        ),
+        spec=client.V1DaemonSetSpec(
+            selector=client.V1LabelSelector(match_labels=labels),
+            update_strategy=client.V1DaemonSetUpdateStrategy(
+                type="RollingUpdate",
+                # Pull on a quarter of the nodes at a time instead of all at once
+                rolling_update=client.V1RollingUpdateDaemonSet(max_unavailable="25%"),
+            ),
+            template=client.V1PodTemplateSpec(
+                metadata=client.V1ObjectMeta(
+                    labels=labels, annotations={"store-platform/template-version": version}
+                ),
+                spec=client.V1PodSpec(
+                    init_containers=[
+                        client.V1Container(
+                            name=name.replace("_", "-"),
+                            image=image(name),
+                            image_pull_policy=pull_policy(name),
+                            command=["sh", "-c", "true"],
+                            resources=client.V1ResourceRequirements(
+                                requests={"cpu": "1m", "memory": "8Mi"},
+                                limits={"cpu": "50m", "memory": "32Mi"},
+                            ),
+                        )
+                        for name in image_names
+                    ],
+                    containers=[
+                        client.V1Container(
+                            name="pause",
+                            image=image("pause"),
+                            image_pull_policy=pull_policy("pause"),
+                            resources=client.V1ResourceRequirements(
+                                requests={"cpu": "1m", "memory": "8Mi"},
+                                limits={"cpu": "10m", "memory": "16Mi"},
+                            ),
+                        )
+                    ],
+                    termination_grace_period_seconds=0,
+                ),
+            ),
+        ),
+    )
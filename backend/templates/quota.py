@@ -0,0 +1,34 @@
+from kubernetes import client
+
+QUOTA_NAME = "store-quota"
+LIMIT_RANGE_NAME = "store-limits"
+
+# For containers that set no resources of their own (e.g. short init containers)
+DEFAULT_CONTAINER_REQUESTS = {"cpu": "25m", "memory": "32Mi"}
+DEFAULT_CONTAINER_LIMITS = {"cpu": "250m", "memory": "128Mi"}
+
+_LABELS = {"app": "store-quota", "managed-by": "store-platform"}
+
+
+def get_resource_quota(store_id, hard):
+    return client.V1ResourceQuota(
+        metadata=client.V1ObjectMeta(name=QUOTA_NAME, namespace=f"store-{store_id}", labels=_LABELS),
+        spec=client.V1ResourceQuotaSpec(hard=hard),
+    )
+
+
+def get_limit_range(store_id, container_max, max_volume_gi):
+    return client.V1LimitRange(
+        metadata=client.V1ObjectMeta(name=LIMIT_RANGE_NAME, namespace=f"store-{store_id}", labels=_LABELS),
+        spec=client.V1LimitRangeSpec(
+            limits=[
+                client.V1LimitRangeItem(
+                    type="Container",
+                    default=DEFAULT_CONTAINER_LIMITS,
+                    default_request=DEFAULT_CONTAINER_REQUESTS,
+                    max=container_max,
+                ),
+                client.V1LimitRangeItem(type="PersistentVolumeClaim", max={"storage": f"{max_volume_gi}Gi"}),
+            ]
+        ),
+    )
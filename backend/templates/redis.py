@@ -0,0 +1,83 @@
+from kubernetes import client
+
+from images import image, pull_policy
+
+
+def get_redis_deployment(store_id, plan):
+    namespace = f"store-{store_id}"
+    redis = plan["redis"]
+    return client.V1Deployment(
+        metadata=client.V1ObjectMeta(
+            name="redis", namespace=namespace, labels={"app": "redis"}
+        ),
+        spec=client.V1DeploymentSpec(
+            replicas=1,
+            selector=client.V1LabelSelector(match_labels={"app": "redis"}),
+            template=client.V1PodTemplateSpec(
+                metadata=client.V1ObjectMeta(labels={"app": "redis"}),
+                spec=client.V1PodSpec(
+                    containers=[
+                        client.V1Container(
+                            name="redis",
+                            image=image("redis"),
+                            image_pull_policy=pull_policy("redis"),
+                            # Pure cache: bounded memory, LRU eviction, no persistence
+                            args=[
+                                "--maxmemory", redis["maxmemory"],
+                                "--maxmemory-policy", "allkeys-lru",
+                                "--save", "",
+                                "--appendonly", "no",
+                            ],
+                            ports=[
+                                client.V1ContainerPort(container_port=6379, name="redis")
+                            ],
+                            resources=client.V1ResourceRequirements(**redis["resources"]),
+                            readiness_probe=client.V1Probe(
+                                tcp_socket=client.V1TCPSocketAction(port=6379),
+                                period_seconds=5,
+                            ),
+                        )
+                    ],
+                ),
+            ),
+        ),
+    )
+
+
+def get_redis_service(store_id):
+    namespace = f"store-{store_id}"
+    return client.V1Service(
+        metadata=client.V1ObjectMeta(
+            name="redis", namespace=namespace, labels={"app": "redis"}
+        ),
+        spec=client.V1ServiceSpec(
+            selector={"app": "redis"},
+            ports=[
+                client.V1ServicePort(
+                    port=6379, target_port=6379, protocol="TCP", name="redis"
+                )
+            ],
+            type="ClusterIP",
+        ),
+    )
+
+
+def get_redis_credentials_secret(store_id, username, password):
+    """Shared Redis ACL user of a store, read by the setup script"""
+    namespace = f"store-{store_id}"
+    return client.V1Secret(
+        metadata=client.V1ObjectMeta(name="redis-credentials", namespace=namespace),
+        type="Opaque",
+        string_data={"username": username, "password": password},
+    )
+
+
+def get_shared_redis_service(store_id, host):
+    """`redis` service that resolves to the shared Redis instance"""
+    namespace = f"store-{store_id}"
+    return client.V1Service(
+        metadata=client.V1ObjectMeta(
+            name="redis", namespace=namespace, labels={"app": "redis", "cache-mode": "shared"}
+        ),
+        spec=client.V1ServiceSpec(type="ExternalName", external_name=host),
+    )
@@ -1,9 +1,58 @@
 from kubernetes import client
 
+from images import image, pull_policy
+from plans import SETUP_RESOURCES
 
-def get_wordpress_config(store_id, db_password, store_url, sample_products):
+# Typical PHP-FPM worker footprint for WooCommerce, and memory kept back for the FPM master
+FPM_WORKER_MI = 48
+FPM_RESERVED_MI = 32
+
+# nginx in front of PHP-FPM: static files straight from the volume with
+# long-lived cache headers (WordPress versions asset URLs with ?ver=), PHP over FastCGI
+NGINX_SERVER_CONFIG = r"""server {
+    listen 80;
+    root /var/www/html;
+    index index.php;
+    client_max_body_size 50m;
+
+    location ~* \.(?:css|js|mjs|png|jpe?g|gif|ico|svg|webp|avif|woff2?|ttf|eot)$ {
+        expires 1y;
+        add_header Cache-Control "public, max-age=31536000, immutable";
+        access_log off;
+        try_files $uri /index.php?$args;
+    }
+
+    location / {
+        try_files $uri $uri/ /index.php?$args;
+    }
+
+    location ~ \.php$ {
+        try_files $uri =404;
+        fastcgi_pass 127.0.0.1:9000;
+        fastcgi_index index.php;
+        include fastcgi_params;
+        fastcgi_param SCRIPT_FILENAME $document_root$fastcgi_script_name;
+        fastcgi_param HTTPS on;
+        fastcgi_buffer_size 32k;
+        fastcgi_buffers 16 16k;
+        fastcgi_read_timeout 120s;
+    }
+
+    location ~ /\.(?!well-known) {
+        deny all;
+    }
+}
+"""
+
+# Written by the setup script when it finishes; replicas of autoscaled stores wait for it
+SETUP_MARKER = ".store-setup-complete"
+
+NGINX_RESOURCES = {"requests": {"cpu": "25m", "memory": "32Mi"}, "limits": {"cpu": "250m", "memory": "64Mi"}}
+
+
+def get_wordpress_config(store_id, db_password, store_url, sample_products, object_cache=None):
     namespace = f"store-{store_id}"
-    return client.V1ConfigMap(
+    config_map = client.V1ConfigMap(
         metadata=client.V1ObjectMeta(name="wordpress-config", namespace=namespace),
         data={
             "WP_ADMIN_USER": "admin",
@@ -22,14 +71,87 @@ def get_wordpress_config(store_id, db_password, store_url, sample_products):
             "SAMPLE_PRODUCTS": sample_products,
         },
     )
+    if object_cache:
+        # Read by wp-setup.sh to configure the redis-cache plugin
+        config_map.data.update({
+            "WP_REDIS_HOST": object_cache["host"],
+            "WP_REDIS_PORT": str(object_cache["port"]),
+            "WP_REDIS_PREFIX": object_cache["prefix"],
+        })
+    return config_map
 
 
-def get_wordpress_pvc(store_id, storage_size_gi=2):
+def get_php_config(store_id, plan, runtime="apache"):
+    namespace = f"store-{store_id}"
+    wordpress = plan["wordpress"]
+    config_map = client.V1ConfigMap(
+        metadata=client.V1ObjectMeta(name="php-config", namespace=namespace),
+        data={
+            "zz-store-plan.ini": (
+                f"memory_limit = {wordpress['php_memory_limit']}\n"
+                "opcache.enable = 1\n"
+                f"opcache.memory_consumption = {wordpress['opcache_memory_mb']}\n"
+                "opcache.interned_strings_buffer = 16\n"
+                f"opcache.max_accelerated_files = {wordpress['opcache_max_files']}\n"
+                "opcache.revalidate_freq = 60\n"
+                "opcache.enable_file_override = 1\n"
+                # WordPress includes hundreds of files per request
+                "realpath_cache_size = 4096K\n"
+                "realpath_cache_ttl = 600\n"
+            ),
+        },
+    )
+    if runtime == "fpm":
+        config_map.data["zz-store-pool.conf"] = get_fpm_pool_config(plan)
+        config_map.data["nginx.conf"] = NGINX_SERVER_CONFIG
+    return config_map
+
+
+def fpm_pool_settings(plan):
+    """
+    Size the FPM pool from the container's memory: what is left after OPcache
+    and a fixed reserve, divided by the typical footprint of a WooCommerce
+    worker. Workers that hit php_memory_limit are rare, so sizing by the
+    limit would leave most of the allocation idle.
+    """
+    wordpress = plan["wordpress"]
+    memory_mi = _mebibytes(wordpress["resources"]["limits"]["memory"])
+    max_children = max(2, (memory_mi - wordpress["opcache_memory_mb"] - FPM_RESERVED_MI) // FPM_WORKER_MI)
+    start = max(1, max_children // 4)
+    return {
+        "pm": "dynamic",
+        "pm.max_children": max_children,
+        "pm.start_servers": start,
+        "pm.min_spare_servers": start,
+        "pm.max_spare_servers": max(start + 1, max_children // 2),
+        "pm.max_requests": 500,
+        "request_terminate_timeout": "120s",
+    }
+
+
+def get_fpm_pool_config(plan):
+    # Loaded after the image's zz-docker.conf, so these override the default [www] pool
+    settings = "".join(f"{key} = {value}\n" for key, value in fpm_pool_settings(plan).items())
+    return f"[www]\n{settings}"
+
+
+def _mebibytes(quantity):
+    units = {"Mi": 1, "Gi": 1024}
+    for suffix, factor in units.items():
+        if quantity.endswith(suffix):
+            return int(float(quantity[:-len(suffix)]) * factor)
+    raise ValueError(f"Unsupported memory quantity: {quantity}")
+
+
+def get_wordpress_pvc(store_id, storage_size_gi=2, shared=False, storage_class=None, data_source=None):
+    """WordPress volume; shared (ReadWriteMany) when several replicas mount it, restored from data_source for clones"""
     namespace = f"store-{store_id}"
     return client.V1PersistentVolumeClaim(
         metadata=client.V1ObjectMeta(name="wordpress-pvc", namespace=namespace),
         spec=client.V1PersistentVolumeClaimSpec(
-            access_modes=["ReadWriteOnce"],
+            access_modes=["ReadWriteMany" if shared else "ReadWriteOnce"],
+            storage_class_name=storage_class,
+            data_source=data_source,
             resources=client.V1ResourceRequirements(
                 requests={"storage": f"{storage_size_gi}Gi"}
             ),
@@ -68,6 +190,22 @@ fi
 wp theme install storefront --activate --allow-root --force
 wp plugin install woocommerce --activate --allow-root --force
 
+# 3.1 Persistent object cache (only for stores with Redis)
+if [ -n "${WP_REDIS_HOST}" ]; then
+  wp config set WP_REDIS_HOST "${WP_REDIS_HOST}" --type=constant --allow-root
+  wp config set WP_REDIS_PORT "${WP_REDIS_PORT}" --raw --type=constant --allow-root
+  wp config set WP_REDIS_PREFIX "${WP_REDIS_PREFIX}" --type=constant --allow-root
+  # The wordpress image has no phpredis extension; the plugin bundles Predis
+  wp config set WP_REDIS_CLIENT "predis" --type=constant --allow-root
+  if [ -n "${WP_REDIS_PASSWORD}" ]; then
+    # Shared Redis: the store's own ACL user, which may not FLUSHDB, so flushes only remove its prefix
+    wp config set WP_REDIS_PASSWORD "['${WP_REDIS_USERNAME}', '${WP_REDIS_PASSWORD}']" --raw --type=constant --allow-root
+    wp config set WP_REDIS_SELECTIVE_FLUSH true --raw --type=constant --allow-root
+  fi
+  wp plugin install redis-cache --activate --allow-root --force
+  wp redis enable --force --allow-root || echo "Object cache not enabled (Redis unreachable?)"
+fi
+
 # 4. --- CLEANUP & STYLING ---
 
 # A. Delete Sample Page
@@ -173,6 +311,8 @@ fi
 wp transient delete --all --allow-root
 wp eval 'if (function_exists("wc_delete_product_transients")) { wc_delete_product_transients(); }' --allow-root 2>/dev/null || true
 
+# Marker for replicas waiting on the one-time setup
+""" + f"""touch /var/www/html/{SETUP_MARKER}
 echo "=== SETUP COMPLETE ==="
 """
     return client.V1ConfigMap(
@@ -181,88 +321,167 @@ echo "=== SETUP COMPLETE ==="
     )
 
 
-def get_wordpress_deployment(store_id, db_password, store_url):
+def _setup_container(db_port):
+    """wp-cli container that runs the setup script against the WordPress volume"""
+    return client.V1Container(
+        name="wp-init",
+        image=image("wp_cli"),
+        image_pull_policy=pull_policy("wp_cli"),
+        command=[
+            "/bin/bash",
+            "-c",
+            "mkdir -p /tmp/conf.d\n"
+            'echo "memory_limit = 512M" > /tmp/conf.d/custom.ini\n'
+            "export PHP_INI_SCAN_DIR=:$PHP_INI_SCAN_DIR:/tmp/conf.d\n\n"
+            "# --- FIX: Filter Logs ---\n"
+            "# We redirect stderr to stdout (2>&1) and filter out the noisy warnings\n"
+            '/scripts/wp-setup.sh 2>&1 | grep -v "already loaded"',
+        ],
+        resources=client.V1ResourceRequirements(**SETUP_RESOURCES),
+        env_from=[
+            client.V1EnvFromSource(
+                config_map_ref=client.V1ConfigMapEnvSource(
+                    name="wordpress-config"
+                )
+            )
+        ],
+        env=[
+            client.V1EnvVar(
+                name="WORDPRESS_DB_HOST", value=f"mysql:{db_port}"
+            ),
+            client.V1EnvVar(
+                name="WORDPRESS_DB_NAME",
+                value_from=client.V1EnvVarSource(
+                    secret_key_ref=client.V1SecretKeySelector(
+                        name="mysql-secret", key="mysql-database"
+                    )
+                ),
+            ),
+            client.V1EnvVar(
+                name="WORDPRESS_DB_USER",
+                value_from=client.V1EnvVarSource(
+                    secret_key_ref=client.V1SecretKeySelector(
+                        name="mysql-secret", key="mysql-user"
+                    )
+                ),
+            ),
+            client.V1EnvVar(
+                name="WORDPRESS_DB_PASSWORD",
+                value_from=client.V1EnvVarSource(
+                    secret_key_ref=client.V1SecretKeySelector(
+                        name="mysql-secret", key="mysql-password"
+                    )
+                ),
+            ),
+            # Only stores on the shared Redis have this Secret
+            client.V1EnvVar(
+                name="WP_REDIS_USERNAME",
+                value_from=client.V1EnvVarSource(
+                    secret_key_ref=client.V1SecretKeySelector(
+                        name="redis-credentials", key="username", optional=True
+                    )
+                ),
+            ),
+            client.V1EnvVar(
+                name="WP_REDIS_PASSWORD",
+                value_from=client.V1EnvVarSource(
+                    secret_key_ref=client.V1SecretKeySelector(
+                        name="redis-credentials", key="password", optional=True
+                    )
+                ),
+            ),
+        ],
+        volume_mounts=[
+            client.V1VolumeMount(
+                name="wordpress-storage", mount_path="/var/www/html"
+            ),
+            client.V1VolumeMount(
+                name="setup-script", mount_path="/scripts"
+            ),
+        ],
+    )
+
+
+def _wait_for_setup_container():
+    """Holds a replica until the one-time setup Job has finished on the shared volume"""
+    return client.V1Container(
+        name="wait-for-setup",
+        image=image("wp_cli"),
+        image_pull_policy=pull_policy("wp_cli"),
+        command=["sh", "-c", f"until [ -f /var/www/html/{SETUP_MARKER} ]; do sleep 2; done"],
+        resources=client.V1ResourceRequirements(
+            requests={"cpu": "10m", "memory": "16Mi"}, limits={"cpu": "50m", "memory": "32Mi"}
+        ),
+        volume_mounts=[
+            client.V1VolumeMount(name="wordpress-storage", mount_path="/var/www/html", read_only=True)
+        ],
+    )
+
+
+def get_wp_setup_job(store_id, db_port=3306):
+    """
+    Setup for autoscaled stores: the script runs once as a Job instead of in
+    every replica's init container, so scaling out does not reinstall plugins
+    on the shared volume
+    """
+    namespace = f"store-{store_id}"
+    return client.V1Job(
+        metadata=client.V1ObjectMeta(name="wp-setup", namespace=namespace, labels={"app": "wp-setup"}),
+        spec=client.V1JobSpec(
+            backoff_limit=2,
+            template=client.V1PodTemplateSpec(
+                metadata=client.V1ObjectMeta(labels={"app": "wp-setup"}),
+                spec=client.V1PodSpec(
+                    restart_policy="Never",
+                    containers=[_setup_container(db_port)],
+                    volumes=[
+                        client.V1Volume(
+                            name="wordpress-storage",
+                            persistent_volume_claim=client.V1PersistentVolumeClaimVolumeSource(
+                                claim_name="wordpress-pvc"
+                            ),
+                        ),
+                        client.V1Volume(
+                            name="setup-script",
+                            config_map=client.V1ConfigMapVolumeSource(
+                                name="wp-setup-script", default_mode=0o755
+                            ),
+                        ),
+                    ],
+                ),
+            ),
+        ),
+    )
+
+
+def get_wordpress_deployment(store_id, db_password, store_url, plan, db_port=3306, autoscaled=False):
     namespace = f"store-{store_id}"
     return client.V1Deployment(
         metadata=client.V1ObjectMeta(
             name="wordpress", namespace=namespace, labels={"app": "wordpress"}
         ),
         spec=client.V1DeploymentSpec(
-            replicas=1,
+            # Autoscaled stores start at the plan minimum; the HPA owns the count from then on
+            replicas=plan["autoscaling"]["min_replicas"] if autoscaled else 1,
             selector=client.V1LabelSelector(match_labels={"app": "wordpress"}),
             template=client.V1PodTemplateSpec(
                 metadata=client.V1ObjectMeta(labels={"app": "wordpress"}),
                 spec=client.V1PodSpec(
                     init_containers=[
-                        client.V1Container(
-                            name="wp-init",
-                            image="wordpress:cli-php8.1",
-                            command=[
-                                "/bin/bash",
-                                "-c",
-                                "mkdir -p /tmp/conf.d\n"
-                                'echo "memory_limit = 512M" > /tmp/conf.d/custom.ini\n'
-                                "export PHP_INI_SCAN_DIR=:$PHP_INI_SCAN_DIR:/tmp/conf.d\n\n"
-                                "# --- FIX: Filter Logs ---\n"
-                                "# We redirect stderr to stdout (2>&1) and filter out the noisy warnings\n"
-                                '/scripts/wp-setup.sh 2>&1 | grep -v "already loaded"',
-                            ],
-                            env_from=[
-                                client.V1EnvFromSource(
-                                    config_map_ref=client.V1ConfigMapEnvSource(
-                                        name="wordpress-config"
-                                    )
-                                )
-                            ],
-                            env=[
-                                client.V1EnvVar(
-                                    name="WORDPRESS_DB_HOST", value="mysql:3306"
-                                ),
-                                client.V1EnvVar(
-                                    name="WORDPRESS_DB_NAME",
-                                    value_from=client.V1EnvVarSource(
-                                        secret_key_ref=client.V1SecretKeySelector(
-                                            name="mysql-secret", key="mysql-database"
-                                        )
-                                    ),
-                                ),
-                                client.V1EnvVar(
-                                    name="WORDPRESS_DB_USER",
-                                    value_from=client.V1EnvVarSource(
-                                        secret_key_ref=client.V1SecretKeySelector(
-                                            name="mysql-secret", key="mysql-user"
-                                        )
-                                    ),
-                                ),
-                                client.V1EnvVar(
-                                    name="WORDPRESS_DB_PASSWORD",
-                                    value_from=client.V1EnvVarSource(
-                                        secret_key_ref=client.V1SecretKeySelector(
-                                            name="mysql-secret", key="mysql-password"
-                                        )
-                                    ),
-                                ),
-                            ],
-                            volume_mounts=[
-                                client.V1VolumeMount(
-                                    name="wordpress-storage", mount_path="/var/www/html"
-                                ),
-                                client.V1VolumeMount(
-                                    name="setup-script", mount_path="/scripts"
-                                ),
-                            ],
-                        )
+                        _wait_for_setup_container() if autoscaled else _setup_container(db_port)
                     ],
                     containers=[
                         client.V1Container(
                             name="wordpress",
-                            image="wordpress:latest",
+                            image=image("wordpress_apache"),
+                            image_pull_policy=pull_policy("wordpress_apache"),
+                            resources=client.V1ResourceRequirements(**plan["wordpress"]["resources"]),
                             ports=[
                                 client.V1ContainerPort(container_port=80, name="http")
                             ],
                             env=[
                                 client.V1EnvVar(
-                                    name="WORDPRESS_DB_HOST", value="mysql:3306"
+                                    name="WORDPRESS_DB_HOST", value=f"mysql:{db_port}"
                                 ),
                                 client.V1EnvVar(
                                     name="WORDPRESS_DB_NAME",
@@ -309,7 +528,12 @@ def get_wordpress_deployment(store_id, db_password, store_url):
                             volume_mounts=[
                                 client.V1VolumeMount(
                                     name="wordpress-storage", mount_path="/var/www/html"
-                                )
+                                ),
+                                client.V1VolumeMount(
+                                    name="php-config",
+                                    mount_path="/usr/local/etc/php/conf.d/zz-store-plan.ini",
+                                    sub_path="zz-store-plan.ini",
+                                ),
                             ],
                         )
                     ],
@@ -320,6 +544,10 @@ def get_wordpress_deployment(store_id, db_password, store_url):
                                 claim_name="wordpress-pvc"
                             ),
                         ),
+                        client.V1Volume(
+                            name="php-config",
+                            config_map=client.V1ConfigMapVolumeSource(name="php-config"),
+                        ),
                         client.V1Volume(
                             name="setup-script",
                             config_map=client.V1ConfigMapVolumeSource(
@@ -333,6 +561,51 @@ def get_wordpress_deployment(store_id, db_password, store_url):
     )
 
 
+def get_wordpress_fpm_deployment(store_id, db_password, store_url, plan, db_port=3306, autoscaled=False):
+    """
+    Same pod as get_wordpress_deployment, but PHP runs in PHP-FPM and an
+    nginx sidecar serves HTTP: static files directly from the shared volume,
+    PHP over FastCGI on localhost. The plan's resources go to PHP-FPM.
+    """
+    deployment = get_wordpress_deployment(store_id, db_password, store_url, plan, db_port=db_port, autoscaled=autoscaled)
+    deployment.metadata.labels["runtime"] = "fpm"
+    pod = deployment.spec.template.spec
+
+    php = pod.containers[0]
+    php.name = "php-fpm"
+    php.image = image("wordpress_fpm")
+    php.image_pull_policy = pull_policy("wordpress_fpm")
+    php.ports = [client.V1ContainerPort(container_port=9000, name="fastcgi")]
+    php.volume_mounts.append(
+        client.V1VolumeMount(
+            name="php-config",
+            mount_path="/usr/local/etc/php-fpm.d/zz-store-pool.conf",
+            sub_path="zz-store-pool.conf",
+        )
+    )
+
+    pod.containers.append(
+        client.V1Container(
+            name="nginx",
+            image=image("nginx"),
+            image_pull_policy=pull_policy("nginx"),
+            ports=[client.V1ContainerPort(container_port=80, name="http")],
+            resources=client.V1ResourceRequirements(**NGINX_RESOURCES),
+            volume_mounts=[
+                client.V1VolumeMount(
+                    name="wordpress-storage", mount_path="/var/www/html", read_only=True
+                ),
+                client.V1VolumeMount(
+                    name="php-config",
+                    mount_path="/etc/nginx/conf.d/default.conf",
+                    sub_path="nginx.conf",
+                ),
+            ],
+        )
+    )
+    return deployment
+
+
 def get_wordpress_service(store_id):
     namespace = f"store-{store_id}"
     return client.V1Service(
@@ -0,0 +1,271 @@
+"""
+Span-based tracing
+A small tracer with W3C trace ids. Spans nest through a context variable, so a
+store creation shows up as one trace: HTTP route -> StoreManager -> each
+provisioning step -> each Kubernetes API call and database function.
+
+Finished spans are exported off the request path by a background thread,
+either as JSON lines to a local file or to an OTLP/HTTP collector:
+
+    TRACING_EXPORTER=file  TRACING_FILE=traces.jsonl
+    TRACING_EXPORTER=otlp  OTEL_EXPORTER_OTLP_ENDPOINT=http://otel-collector:4318
+"""
+import contextvars
+import functools
+import json
+import logging
+import os
+import queue
+import secrets
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+
+SERVICE_NAME = os.environ.get("OTEL_SERVICE_NAME", "store-factory-backend")
+EXPORTER = os.environ.get("TRACING_EXPORTER", "none").strip().lower()
+TRACE_FILE = os.environ.get("TRACING_FILE", "traces.jsonl")
+OTLP_ENDPOINT = os.environ.get("OTEL_EXPORTER_OTLP_ENDPOINT", "http://localhost:4318").rstrip("/")
+
+_BATCH_SIZE = 256
+_FLUSH_INTERVAL_SECONDS = 2.0
+_QUEUE_SIZE = 8192
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+logger = logging.getLogger(__name__)
+
+
+class Span:
+    def __init__(self, name, trace_id, parent_id=None, attributes=None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.attributes = dict(attributes or {})
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.error = None
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def record_error(self, error):
+        self.error = str(error)
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": round((self.end_ns - self.start_ns) / 1e6, 3) if self.end_ns else None,
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+def current_span():
+    return _current_span.get()
+
+
+def current_trace_id():
+    """Trace id of the active span, or None outside a trace"""
+    span = _current_span.get()
+    return span.trace_id if span else None
+
+
+def begin_span(name, trace_id=None, parent_id=None, **attributes):
+    """
+    Start a span and make it current; returns (span, token) for end_span.
+    Prefer start_span() unless the start and end happen in different callbacks.
+    """
+    parent = _current_span.get()
+    if trace_id is None:
+        trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        parent_id = parent.span_id if parent else None
+    span = Span(name, trace_id, parent_id, attributes)
+    return span, _current_span.set(span)
+
+
+def end_span(span, token):
+    span.end_ns = time.time_ns()
+    _current_span.reset(token)
+    _exporter.submit(span)
+
+
+@contextmanager
+def start_span(name, **attributes):
+    """Run the block inside a child span of the current one (or a new trace)"""
+    span, token = begin_span(name, **attributes)
+    try:
+        yield span
+    except Exception as e:
+        span.record_error(e)
+        raise
+    finally:
+        end_span(span, token)
+
+
+def traced(name=None):
+    """Decorator that wraps every call of the function in a span"""
+    def decorator(fn):
+        span_name = name or f"{fn.__module__}.{fn.__qualname__}"
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with start_span(span_name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def parse_traceparent(header):
+    """Extract (trace_id, parent span id) from a W3C traceparent header"""
+    parts = (header or "").split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None, None
+    return parts[1], parts[2]
+
+
+def init_tracing(app):
+    """Open a span for every Flask request, continuing an incoming traceparent"""
+    from flask import g, request
+
+    @app.before_request
+    def _start_request_span():
+        trace_id, parent_id = parse_traceparent(request.headers.get("traceparent"))
+        g._trace_span, g._trace_token = begin_span(
+            f"{request.method} {request.url_rule.rule if request.url_rule else request.path}",
+            trace_id=trace_id,
+            parent_id=parent_id,
+            **{"http.method": request.method, "http.target": request.path},
+        )
+
+    @app.after_request
+    def _tag_response(response):
+        span = getattr(g, "_trace_span", None)
+        if span:
+            span.set_attribute("http.status_code", response.status_code)
+            response.headers["traceparent"] = f"00-{span.trace_id}-{span.span_id}-01"
+        return response
+
+    @app.teardown_request
+    def _end_request_span(error=None):
+        span = g.pop("_trace_span", None)
+        token = g.pop("_trace_token", None)
+        if span:
+            if error is not None:
+                span.record_error(error)
+            end_span(span, token)
+
+
+class _BatchExporter:
+    """Ships finished spans from a bounded queue on a background thread"""
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=_QUEUE_SIZE)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, span):
+        if self.kind == "none":
+            return
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            # Never block the caller on telemetry
+            self.dropped += 1
+
+    def _ensure_thread(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + _FLUSH_INTERVAL_SECONDS
+            while len(batch) < _BATCH_SIZE:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                if self.kind == "file":
+                    self._write_file(batch)
+                elif self.kind == "otlp":
+                    self._post_otlp(batch)
+            except Exception as e:
+                logger.warning(f"Trace export failed ({len(batch)} spans): {e}")
+
+    def _write_file(self, batch):
+        with open(TRACE_FILE, "a") as f:
+            for span in batch:
+                f.write(json.dumps(span.to_dict(), default=str) + "\n")
+
+    def _post_otlp(self, batch):
+        payload = {
+            "resourceSpans": [{
+                "resource": {"attributes": _otlp_attributes({"service.name": SERVICE_NAME})},
+                "scopeSpans": [{
+                    "scope": {"name": "store-factory"},
+                    "spans": [_otlp_span(span) for span in batch],
+                }],
+            }]
+        }
+        req = urllib.request.Request(
+            f"{OTLP_ENDPOINT}/v1/traces",
+            data=json.dumps(payload).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        urllib.request.urlopen(req, timeout=5).close()
+
+
+def _otlp_attributes(attributes):
+    result = []
+    for key, value in attributes.items():
+        if isinstance(value, bool):
+            encoded = {"boolValue": value}
+        elif isinstance(value, int):
+            encoded = {"intValue": str(value)}
+        elif isinstance(value, float):
+            encoded = {"doubleValue": value}
+        else:
+            encoded = {"stringValue": str(value)}
+        result.append({"key": key, "value": encoded})
+    return result
+
+
+def _otlp_span(span):
+    encoded = {
+        "traceId": span.trace_id,
+        "spanId": span.span_id,
+        "name": span.name,
+        "kind": 1,
+        "startTimeUnixNano": str(span.start_ns),
+        "endTimeUnixNano": str(span.end_ns),
+        "attributes": _otlp_attributes(span.attributes),
+        "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+    }
+    if span.parent_id:
+        encoded["parentSpanId"] = span.parent_id
+    return encoded
+
+
+_exporter = _BatchExporter(EXPORTER)
+
+
+def dropped_spans():
+    return _exporter.dropped
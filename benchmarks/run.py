@@ -0,0 +1,355 @@
+"""
+Backend microbenchmarks
+Times the backend's hot paths in-process, with the Kubernetes API stubbed at
+the HTTP layer (responses still go through the client's deserialization and
+the backend's metrics and tracing wrappers):
+
+    list_stores[N]            StoreManager.list_stores for a fleet of N ready stores
+    db.all_stores[N]          database.get_all_stores_with_users with N stores
+    db.user_usage[N]          database.get_user_usage for one of the 10 users sharing N stores
+    templates.<module>        rendering the manifests of templates/<module>.py
+    templates.store           every manifest of a default store, serialized as sent
+    k8s.namespace_status[N]   K8sClient.get_namespace_status on a namespace of N pods
+    http.<route>              a request through Flask: /health (no auth) against
+                              JWT-authenticated routes, for the per-request overhead
+
+Each benchmark is run in rounds of enough calls to take --min-time; the
+fastest round is the result (as with timeit, slower rounds are noise from
+the machine rather than the code), the median is reported alongside.
+
+    python benchmarks/run.py                      # run and print
+    python benchmarks/run.py --save               # store as benchmarks/baseline.json
+    python benchmarks/run.py --compare            # fail if anything is >25% slower
+    python benchmarks/run.py --compare --threshold 0.1 --filter list_stores
+
+Baselines are only comparable on the same machine: record one on the
+commit before a change, then compare on the change.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlsplit
+
+import urllib3
+
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+FLEET_SIZES = (10, 100, 1000)
+POD_COUNTS = (10, 100, 1000)
+BENCH_USERS = 10
+
+
+# --- Stubbed Kubernetes API ---
+
+class StubPoolManager:
+    """Stands in for the API client's urllib3 pool: canned JSON per path, 404 for the rest"""
+
+    def __init__(self):
+        self.routes = {}
+        self.unmatched = set()
+
+    def request(self, method, url, **kwargs):
+        path = urlsplit(url).path
+        body = self.routes.get((method, path))
+        if body is None:
+            self.unmatched.add((method, path))
+            status = {"kind": "Status", "apiVersion": "v1", "status": "Failure", "reason": "NotFound", "code": 404}
+            return urllib3.HTTPResponse(body=json.dumps(status).encode(), status=404, reason="Not Found",
+                                        headers={"Content-Type": "application/json"})
+        return urllib3.HTTPResponse(body=body, status=200, reason="OK", headers={"Content-Type": "application/json"})
+
+
+def _namespace_list(names):
+    return json.dumps({
+        "kind": "NamespaceList", "apiVersion": "v1", "metadata": {"resourceVersion": "1"},
+        "items": [{"metadata": {"name": name, "labels": {"app": "store", "managed-by": "store-platform"},
+                                "creationTimestamp": "2026-01-01T00:00:00Z"},
+                   "status": {"phase": "Active"}} for name in names],
+    }).encode()
+
+
+def _pod(namespace, name, owner):
+    ready = {"name": owner, "ready": True, "restartCount": 0, "image": f"{owner}:latest", "imageID": "",
+             "state": {"running": {"startedAt": "2026-01-01T00:00:00Z"}}}
+    init = {"name": "wp-init", "ready": True, "restartCount": 0, "image": "busybox", "imageID": "",
+            "state": {"terminated": {"exitCode": 0, "reason": "Completed"}}}
+    return {
+        "metadata": {"name": name, "namespace": namespace, "labels": {"app": owner},
+                     "ownerReferences": [{"apiVersion": "apps/v1", "kind": "ReplicaSet", "name": owner, "uid": "u"}]},
+        "spec": {"nodeName": "node-1", "containers": [{"name": owner, "image": f"{owner}:latest",
+                                                       "resources": {"requests": {"cpu": "100m", "memory": "256Mi"}}}]},
+        "status": {"phase": "Running", "startTime": "2026-01-01T00:00:00Z",
+                   "conditions": [{"type": "Ready", "status": "True"}],
+                   "initContainerStatuses": [init] if owner == "wordpress" else [],
+                   "containerStatuses": [ready]},
+    }
+
+
+def _pod_list(namespace, count):
+    """count pods, WordPress last so the whole list is walked"""
+    pods = [_pod(namespace, f"worker-{i}", "worker") for i in range(count - 1)]
+    pods.append(_pod(namespace, "wordpress-0", "wordpress"))
+    return json.dumps({"kind": "PodList", "apiVersion": "v1", "metadata": {}, "items": pods}).encode()
+
+
+# --- Setup ---
+
+def load_backend(workdir):
+    """Import the backend app with a throwaway database and a stubbed cluster"""
+    kubeconfig = os.path.join(workdir, "kubeconfig")
+    with open(kubeconfig, "w") as f:
+        json.dump({
+            "apiVersion": "v1", "kind": "Config", "current-context": "bench",
+            "clusters": [{"name": "bench", "cluster": {"server": "http://127.0.0.1:9"}}],
+            "users": [{"name": "bench", "user": {"token": "bench"}}],
+            "contexts": [{"name": "bench", "context": {"cluster": "bench", "user": "bench"}}],
+        }, f)
+    os.environ.update({
+        "CLUSTERS": json.dumps([{"name": "default", "kubeconfig": kubeconfig}]),
+        "DATABASE_URL": "sqlite:///" + os.path.join(workdir, "store_factory.db"),
+        "LOG_LEVEL": "ERROR",
+        "TRACING_EXPORTER": "none",
+    })
+    sys.path.insert(0, BACKEND)
+    with contextlib.redirect_stdout(io.StringIO()):  # seed data summary
+        import app as backend
+
+    pool = StubPoolManager()
+    for _, k8s in backend.store_manager.clusters.items():
+        k8s.core_v1._api.api_client.rest_client.pool_manager = pool
+    return backend, pool
+
+
+def populate_fleet(backend, size):
+    """Replace the stores table with `size` ready stores spread over the bench users; returns (store ids, owner id)"""
+    from models import Store, User, db
+
+    with backend.app.app_context():
+        users = []
+        for i in range(BENCH_USERS):
+            user = User.query.filter_by(username=f"bench-{i}").first()
+            if user is None:
+                user = User(username=f"bench-{i}", max_stores=size, max_storage_gi=size * 10)
+                user.set_password("bench")
+                db.session.add(user)
+            users.append(user)
+        Store.query.delete()
+        db.session.flush()
+        created = datetime(2026, 1, 1)
+        ids = [f"{i:08x}" for i in range(size)]
+        db.session.add_all([
+            Store(id=store_id, user_id=users[i % BENCH_USERS].id, name=store_id, storage_size_gi=2, status="ready",
+                  store_url=f"store-{store_id}.bench.local", admin_password="bench", plan="small",
+                  db_mode="dedicated", created_at=created + timedelta(seconds=i), cluster="default")
+            for i, store_id in enumerate(ids)
+        ])
+        db.session.commit()
+        return ids, users[0].id
+
+
+# --- Timing ---
+
+def _time(fn, number):
+    started = time.perf_counter()
+    for _ in range(number):
+        fn()
+    return time.perf_counter() - started
+
+
+def measure(fn, min_time, repeat):
+    """(fastest, median) seconds per call over `repeat` rounds of at least min_time each, and calls per round"""
+    fn()
+    # 1, 2, 5, 10, 20, 50, ... calls until a round is long enough
+    number, steps = 1, (2, 2.5, 2)
+    while True:
+        elapsed = _time(fn, number)
+        if elapsed >= min_time:
+            break
+        number = int(number * steps[0])
+        steps = steps[1:] + steps[:1]
+    rounds = [elapsed / number] + [_time(fn, number) / number for _ in range(repeat - 1)]
+    return min(rounds), statistics.median(rounds), number
+
+
+# --- Benchmarks ---
+
+def fleet_benchmarks(backend, pool):
+    """(name, setup, fn) for the paths whose cost grows with the fleet"""
+    import database
+
+    manager = backend.store_manager
+    for size in FLEET_SIZES:
+        def setup(size=size):
+            ids, owner = populate_fleet(backend, size)
+            pool.routes[("GET", "/api/v1/namespaces")] = _namespace_list([f"store-{i}" for i in ids])
+            return owner
+
+        yield f"list_stores[{size}]", setup, lambda owner: manager.list_stores(user_id=owner)
+        yield f"db.all_stores[{size}]", None, lambda owner: database.get_all_stores_with_users()
+        yield f"db.user_usage[{size}]", None, lambda owner: database.get_user_usage(owner)
+
+
+def template_benchmarks():
+    import plans
+    from kubernetes.client import ApiClient
+    from templates import autoscaling, backup, benchmark, clone, ingress, mysql, quota, redis, wordpress
+
+    plan = plans.get_plan("small")
+    store_id, url, password = "bench0001", "store-bench0001.bench.local", "bench-password"
+    products = "\n".join(f"Sample Product {i}|{100 + i}|A sample product" for i in range(20))
+    s3 = {"provider": "Other", "region": "us-east-1", "endpoint": "http://s3.local"}
+    renders = {
+        "mysql": lambda: [mysql.get_mysql_secret(store_id, password), mysql.get_mysql_service(store_id),
+                          mysql.get_mysql_statefulset(store_id, plan, storage_gi=2)],
+        "wordpress": lambda: [
+            wordpress.get_wordpress_config(store_id, password, url, products,
+                                           object_cache={"host": "redis", "port": 6379, "prefix": store_id}),
+            wordpress.get_php_config(store_id, plan), wordpress.get_wordpress_pvc(store_id),
+            wordpress.get_wp_setup_script(store_id, password, url, products), wordpress.get_wp_setup_job(store_id),
+            wordpress.get_wordpress_deployment(store_id, password, url, plan), wordpress.get_wordpress_service(store_id),
+        ],
+        "redis": lambda: [redis.get_redis_deployment(store_id, plan), redis.get_redis_service(store_id)],
+        "ingress": lambda: [ingress.get_ingress(store_id, url)],
+        "autoscaling": lambda: [autoscaling.get_wordpress_hpa(store_id, plan, "cpu", url)],
+        "quota": lambda: [quota.get_resource_quota(store_id, {"pods": "10"}),
+                          quota.get_limit_range(store_id, {"cpu": "1", "memory": "1Gi"}, 10)],
+        "backup": lambda: [backup.get_backup_job(store_id, 1, "backup-1", s3, "bucket"),
+                           backup.get_restore_job(store_id, store_id, 1, "restore-1", s3, "bucket")],
+        "clone": lambda: [clone.get_volume_snapshot(f"store-{store_id}", "mysql-snap", "mysql-data-mysql-0"),
+                          clone.get_clone_fixup_job(store_id)],
+        "benchmark": lambda: [benchmark.get_benchmark_job(store_id, "benchmark-1", url)],
+    }
+    for module, render in renders.items():
+        yield f"templates.{module}", None, lambda _, render=render: render()
+
+    serializer = ApiClient()
+    store_modules = ("mysql", "wordpress", "redis", "ingress", "autoscaling", "quota")
+    yield "templates.store", None, lambda _: [serializer.sanitize_for_serialization(obj)
+                                              for module in store_modules for obj in renders[module]()]
+
+
+def k8s_benchmarks(backend, pool):
+    k8s = backend.store_manager.k8s
+    for count in POD_COUNTS:
+        namespace = f"store-pods{count}"
+        pool.routes[("GET", f"/api/v1/namespaces/{namespace}/pods")] = _pod_list(namespace, count)
+        yield f"k8s.namespace_status[{count}]", None, lambda _, namespace=namespace: k8s.get_namespace_status(namespace)
+
+
+def http_benchmarks(backend):
+    from flask_jwt_extended import create_access_token
+
+    client = backend.app.test_client()
+    with backend.app.app_context():
+        from models import User
+        user = User.query.filter_by(username="bench-0").first()
+        headers = {"Authorization": f"Bearer {create_access_token(identity=str(user.id))}"}
+
+    def get(path, **kwargs):
+        response = client.get(path, **kwargs)
+        assert response.status_code == 200, (path, response.status_code)
+
+    yield "http.health", None, lambda _: get("/health")
+    yield "http.plans_jwt", None, lambda _: get("/api/plans", headers=headers)
+    yield "http.users_me_jwt", None, lambda _: get("/api/users/me", headers=headers)
+
+
+def run(args):
+    workdir = tempfile.mkdtemp(prefix="store-bench-")
+    backend, pool = load_backend(workdir)
+    results = {}
+
+    def bench(name, fn, state):
+        if args.filter and not any(f in name for f in args.filter):
+            return
+        with backend.app.app_context():
+            fastest, median, number = measure(lambda: fn(state), args.min_time, args.repeat)
+        results[name] = {"seconds": fastest, "median_seconds": median, "calls": number}
+        print(f"{name:<32}{_format(fastest):>12}{_format(median):>12}  ({number} calls x {args.repeat})")
+
+    print(f"{'benchmark':<32}{'fastest':>12}{'median':>12}")
+    state = None
+    for name, setup, fn in fleet_benchmarks(backend, pool):
+        if setup is not None:
+            state = setup()
+        bench(name, fn, state)
+    # The remaining benchmarks run against the largest fleet
+    for name, _, fn in [*template_benchmarks(), *k8s_benchmarks(backend, pool), *http_benchmarks(backend)]:
+        bench(name, fn, state)
+    if pool.unmatched:
+        print(f"warning: unstubbed Kubernetes calls: {sorted(pool.unmatched)}", file=sys.stderr)
+    return results
+
+
+def _format(seconds):
+    if seconds >= 1:
+        return f"{seconds:.2f} s"
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:.2f} ms"
+    return f"{seconds * 1e6:.1f} us"
+
+
+# --- Baselines ---
+
+def save(results, path):
+    with open(path, "w") as f:
+        json.dump({
+            "recorded_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "machine": platform.platform(),
+            "results": results,
+        }, f, indent=2, sort_keys=True)
+    print(f"\nSaved baseline to {path}")
+
+
+def compare(results, path, threshold):
+    """Print current against the baseline; returns the names that got slower by more than threshold"""
+    with open(path) as f:
+        baseline = json.load(f)
+    print(f"\nAgainst {path} (recorded {baseline.get('recorded_at')}, threshold +{threshold:.0%}):")
+    regressions = []
+    for name, result in results.items():
+        before = baseline["results"].get(name)
+        if before is None:
+            print(f"  {name:<32}{'new':>12}")
+            continue
+        change = result["seconds"] / before["seconds"] - 1
+        verdict = ""
+        if change > threshold:
+            verdict = "REGRESSION"
+            regressions.append(name)
+        elif change < -threshold:
+            verdict = "faster"
+        print(f"  {name:<32}{_format(before['seconds']):>12} ->{_format(result['seconds']):>12}{change:>+9.1%}  {verdict}".rstrip())
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backend microbenchmarks with baselines")
+    parser.add_argument("--filter", action="append", help="Only benchmarks whose name contains this (repeatable)")
+    parser.add_argument("--min-time", type=float, default=0.2, help="Seconds each round should take")
+    parser.add_argument("--repeat", type=int, default=5, help="Rounds per benchmark")
+    parser.add_argument("--save", nargs="?", const=DEFAULT_BASELINE, metavar="PATH", help="Store the results as a baseline")
+    parser.add_argument("--compare", nargs="?", const=DEFAULT_BASELINE, metavar="PATH", help="Compare with a baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Slowdown that counts as a regression (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    results = run(args)
+    regressions = compare(results, args.compare, args.threshold) if args.compare else []
+    if args.save:
+        save(results, args.save)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
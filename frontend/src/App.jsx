@@ -1,5 +1,5 @@
 import { useState, useEffect } from 'react';
-import { getStores, createStore, deleteStore, getCurrentUser, logout } from './api';
+import { getStores, getPlans, createStore, deleteStore, cloneStore, getCurrentUser, logout } from './api';
 import { ExternalLink, Trash2, RefreshCw, ShoppingBag, Lock, Plus, X, Copy, Check, LogOut, Database, HardDrive } from 'lucide-react';
 import Login from './Login';
 import './App.css';
@@ -24,6 +24,9 @@ function App() {
   // Form State
   const [adminPassword, setAdminPassword] = useState("");
   const [storageSize, setStorageSize] = useState(2);
+  const [plans, setPlans] = useState([]);
+  const [plan, setPlan] = useState("small");
+  const [autoscaling, setAutoscaling] = useState("");
   const [products, setProducts] = useState(DEFAULT_PRODUCTS);
   const [copied, setCopied] = useState(false);
 
@@ -71,8 +74,20 @@ function App() {
     }
   }, []);
 
+  const fetchPlans = async () => {
+    try {
+      const data = await getPlans();
+      setPlans(data);
+      const defaultPlan = data.find(p => p.default);
+      if (defaultPlan) setPlan(defaultPlan.name);
+    } catch (err) {
+      console.error("Failed to fetch plans", err);
+    }
+  };
+
   useEffect(() => {
     if (isAuthenticated) {
+      fetchPlans();
       fetchStores();
       const interval = setInterval(fetchStores, 10000); // Poll every 10s
       return () => clearInterval(interval);
@@ -134,7 +149,9 @@ function App() {
       await createStore({
         sample_products: formattedProducts,
         admin_password: adminPassword,
-        storage_size_gi: storageSize
+        storage_size_gi: storageSize,
+        plan,
+        autoscaling: autoscaling || null
       });
       await fetchStores();
       await loadUserProfile(); // Refresh quota
@@ -162,6 +179,19 @@ function App() {
     }
   };
 
+  const handleClone = async (id) => {
+    if (!window.confirm("Create a copy of this store from snapshots of its volumes?")) return;
+    try {
+      await cloneStore(id);
+      await fetchStores();
+      await loadUserProfile(); // Refresh quota
+    } catch (err) {
+      const msg = err.response?.data?.error || "Failed to clone store.";
+      setError(msg);
+      console.error(err);
+    }
+  };
+
   if (!isAuthenticated) {
     return <Login onLogin={handleLogin} />;
   }
@@ -184,6 +214,10 @@ function App() {
                 <HardDrive size={16} />
                 <span>{userProfile.current_storage || 0} / {userProfile.max_storage} Gi</span>
               </div>
+              <div className="quota-badge">
+                <Database size={16} />
+                <span>{userProfile.current_plan_units || 0} / {userProfile.max_plan_units} Plan units</span>
+              </div>
               <div className="user-name">{userProfile.username}</div>
               <button onClick={handleLogout} className="btn-icon" title="Logout">
                 <LogOut size={18} />
@@ -263,6 +297,11 @@ function App() {
                 </div>
 
                 <div className="card-footer">
+                  {['ready', 'hibernated'].includes(store.status) && store.db_mode !== 'shared' && !store.autoscaling && (
+                    <button onClick={() => handleClone(store.id)} className="btn-secondary">
+                      <Copy size={16} /> Clone
+                    </button>
+                  )}
                   <button onClick={() => handleDelete(store.id)} className="btn-danger">
                     <Trash2 size={16} /> Delete Store
                   </button>
@@ -302,6 +341,30 @@ function App() {
                   <small className="help-text">This will be the password for the 'admin' user.</small>
                 </div>
 
+                {/* Plan Section */}
+                <div className="form-group">
+                  <label>Plan</label>
+                  <select value={plan} onChange={(e) => setPlan(e.target.value)} className="input-text">
+                    {plans.map(p => (
+                      <option key={p.name} value={p.name}>
+                        {p.name.charAt(0).toUpperCase() + p.name.slice(1)} - {p.units} unit{p.units === 1 ? "" : "s"} (WordPress {p.wordpress.memory}, MySQL {p.mysql.memory})
+                      </option>
+                    ))}
+                  </select>
+                  <small className="help-text">Sets CPU/memory, MySQL buffer pool and PHP memory/OPcache for the store.</small>
+                </div>
+
+                {/* Autoscaling Section */}
+                <div className="form-group">
+                  <label>Autoscaling</label>
+                  <select value={autoscaling} onChange={(e) => setAutoscaling(e.target.value)} className="input-text">
+                    <option value="">Off - single WordPress replica</option>
+                    <option value="cpu">On - scale on CPU usage</option>
+                    <option value="requests">On - scale on requests per second</option>
+                  </select>
+                  <small className="help-text">Adds WordPress replicas during traffic spikes, up to the plan's maximum.</small>
+                </div>
+
                 {/* Storage Size Section */}
                 <div className="form-group">
                   <label>WordPress Storage Size (Gi)</label>
@@ -29,9 +29,21 @@ export const getStores = async () => {
   return response.data.stores;
 };
 
-export const createStore = async (data) => {
-  const response = await axios.post(`${API_URL}/stores`, data);
-  return response.data;
+const newIdempotencyKey = () =>
+  window.crypto?.randomUUID?.() || `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+
+export const createStore = async (data, retries = 2) => {
+  // One key per create, reused on retries so the backend provisions the store only once
+  const headers = { 'Idempotency-Key': newIdempotencyKey() };
+  for (let attempt = 0; ; attempt++) {
+    try {
+      const response = await axios.post(`${API_URL}/stores`, data, { headers });
+      return response.data;
+    } catch (err) {
+      // Only retry when the request may not have reached the backend
+      if (err.response || attempt >= retries) throw err;
+    }
+  }
 };
 
 export const deleteStore = async (storeId) => {
@@ -39,7 +51,17 @@ export const deleteStore = async (storeId) => {
   return response.data;
 };
 
+export const cloneStore = async (storeId) => {
+  const response = await axios.post(`${API_URL}/stores/${storeId}/clone`, {});
+  return response.data;
+};
+
 export const getCurrentUser = async () => {
     const response = await axios.get(`${API_URL}/users/me`);
     return response.data;
 };
+
+export const getPlans = async () => {
+  const response = await axios.get(`${API_URL}/plans`);
+  return response.data.plans;
+};
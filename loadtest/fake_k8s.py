@@ -0,0 +1,828 @@
+"""
+Fake Kubernetes API server
+A local stand-in for the part of the Kubernetes REST API the backend's
+K8sClient uses, so the backend can be driven end to end without a cluster:
+
+    core        namespaces, pods (+ log), secrets, services, configmaps,
+                persistentvolumeclaims, events, nodes, resourcequotas,
+                limitranges
+    apps        deployments, statefulsets, daemonsets (+ scale)
+    batch       jobs
+    others      ingresses, horizontalpodautoscalers, storageclasses,
+                csistoragecapacities, volume snapshots (any other group
+                and resource is stored generically)
+
+Objects are kept in memory as JSON. Lists honour labelSelector and
+fieldSelector, and `?watch=true` streams ADDED/MODIFIED/DELETED events.
+A controller thread plays the part of the cluster: Deployments,
+StatefulSets and Jobs get pods that turn Running and Ready (or Succeeded)
+after --ready-after seconds, PVCs bind, ResourceQuotas report usage and
+deleted namespaces take their objects with them.
+
+    python loadtest/fake_k8s.py --port 8001 --latency-ms 5 --jitter-ms 10 \\
+        --error-rate 0.01 --ready-after 2 --pod-failure-rate 0.05
+
+Every request waits --latency-ms plus up to --jitter-ms, and a share
+(--error-rate) fails with --error-status before touching any state.
+A share of pods (--pod-failure-rate) never starts and reports
+ImagePullBackOff instead.
+"""
+import argparse
+import collections
+import copy
+import itertools
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from kubernetes.utils import parse_quantity
+
+KINDS = {
+    "namespaces": "Namespace",
+    "pods": "Pod",
+    "secrets": "Secret",
+    "services": "Service",
+    "configmaps": "ConfigMap",
+    "persistentvolumeclaims": "PersistentVolumeClaim",
+    "events": "Event",
+    "nodes": "Node",
+    "resourcequotas": "ResourceQuota",
+    "limitranges": "LimitRange",
+    "deployments": "Deployment",
+    "statefulsets": "StatefulSet",
+    "daemonsets": "DaemonSet",
+    "jobs": "Job",
+    "ingresses": "Ingress",
+    "horizontalpodautoscalers": "HorizontalPodAutoscaler",
+    "storageclasses": "StorageClass",
+    "csistoragecapacities": "CSIStorageCapacity",
+    "volumesnapshots": "VolumeSnapshot",
+    "volumesnapshotcontents": "VolumeSnapshotContent",
+}
+
+# Workloads whose pods the controller manages
+_WORKLOADS = ("deployments", "statefulsets", "jobs", "daemonsets")
+# Events kept for watches that resume from a resourceVersion
+_EVENT_HISTORY = 10000
+_BENCHMARK_LOG = (
+    "Complete requests:      500\nFailed requests:        0\n"
+    "Requests per second:    250.00 [#/sec] (mean)\nTime per request:       40.000 [ms] (mean)\n"
+)
+
+
+def _now():
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _status(code, reason, message):
+    return {"kind": "Status", "apiVersion": "v1", "metadata": {}, "status": "Failure",
+            "reason": reason, "message": message, "code": code}
+
+
+class ApiError(Exception):
+    def __init__(self, code, reason, message):
+        super().__init__(message)
+        self.code = code
+        self.body = _status(code, reason, message)
+
+
+# --- Selectors ---
+
+_REQUIREMENT = re.compile(r"\s*(!?)([\w./-]+)\s*(?:(==|=|!=)\s*([\w./-]*)|\s+(in|notin)\s*\(([^)]*)\))?\s*$")
+
+
+def _split_selector(selector):
+    """Split on commas outside parentheses"""
+    parts, depth, current = [], 0, ""
+    for char in selector:
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        if char == "," and depth == 0:
+            parts.append(current)
+            current = ""
+        else:
+            current += char
+    if current.strip():
+        parts.append(current)
+    return parts
+
+
+def label_matcher(selector):
+    """Predicate on a labels dict for a label selector string"""
+    checks = []
+    for part in _split_selector(selector or ""):
+        match = _REQUIREMENT.match(part)
+        if not match:
+            raise ApiError(400, "BadRequest", f"unable to parse requirement: {part}")
+        negate, key, op, value, set_op, values = match.groups()
+        if op in ("=", "=="):
+            checks.append(lambda labels, k=key, v=value: labels.get(k) == v)
+        elif op == "!=":
+            checks.append(lambda labels, k=key, v=value: labels.get(k) != v)
+        elif set_op:
+            members = {v.strip() for v in values.split(",")}
+            if set_op == "in":
+                checks.append(lambda labels, k=key, m=members: labels.get(k) in m)
+            else:
+                checks.append(lambda labels, k=key, m=members: labels.get(k) not in m)
+        elif negate:
+            checks.append(lambda labels, k=key: k not in labels)
+        else:
+            checks.append(lambda labels, k=key: k in labels)
+    return lambda labels: all(check(labels or {}) for check in checks)
+
+
+def field_matcher(selector):
+    """Predicate on an object for a field selector such as status.phase!=Failed,metadata.name=x"""
+    checks = []
+    for part in _split_selector(selector or ""):
+        negate = "!=" in part
+        path, _, value = part.partition("!=" if negate else "=")
+        value = value.lstrip("=")
+        keys = path.strip().split(".")
+
+        def check(obj, keys=keys, value=value.strip(), negate=negate):
+            for key in keys:
+                obj = obj.get(key) if isinstance(obj, dict) else None
+            actual = "" if obj is None else str(obj)
+            return (actual != value) if negate else (actual == value)
+        checks.append(check)
+    return lambda obj: all(check(obj) for check in checks)
+
+
+def merge_patch(target, patch):
+    """JSON merge patch (RFC 7386); also used for strategic merge patches"""
+    if not isinstance(patch, dict):
+        return copy.deepcopy(patch)
+    result = dict(target) if isinstance(target, dict) else {}
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        else:
+            result[key] = merge_patch(result.get(key), value)
+    return result
+
+
+def json_patch(target, operations):
+    """The add, replace and remove operations of a JSON patch (RFC 6902)"""
+    result = copy.deepcopy(target)
+    for operation in operations:
+        keys = [k.replace("~1", "/").replace("~0", "~") for k in operation["path"].lstrip("/").split("/")]
+        parent = result
+        for key in keys[:-1]:
+            parent = parent[int(key)] if isinstance(parent, list) else parent.setdefault(key, {})
+        last = keys[-1]
+        if operation["op"] == "remove":
+            if isinstance(parent, list):
+                parent.pop(int(last))
+            else:
+                parent.pop(last, None)
+        elif isinstance(parent, list):
+            if last == "-":
+                parent.append(operation["value"])
+            elif operation["op"] == "add":
+                parent.insert(int(last), operation["value"])
+            else:
+                parent[int(last)] = operation["value"]
+        else:
+            parent[last] = operation["value"]
+    return result
+
+
+# --- Cluster state ---
+
+class FakeCluster:
+    def __init__(self, ready_after=1.0, pod_failure_rate=0.0, nodes=3, node_cpu="16", node_memory="64Gi",
+                 node_pods=250, seed=None):
+        self.ready_after = ready_after
+        self.pod_failure_rate = pod_failure_rate
+        self.random = random.Random(seed)
+        self.objects = collections.defaultdict(dict)  # (group, plural) -> {(namespace, name): object}
+        self.lock = threading.RLock()
+        self.changed = threading.Condition(self.lock)
+        self.events = collections.deque(maxlen=_EVENT_HISTORY)  # (resource version, group, plural, type, object)
+        self._versions = itertools.count(1)
+        self._timers = []  # (due, action) handled by the controller thread
+        self._node_names = [f"fake-node-{i}" for i in range(nodes)]
+        self._next_node = itertools.cycle(self._node_names)
+        self._stopped = threading.Event()
+        with self.lock:
+            self._seed(node_cpu, node_memory, node_pods)
+
+    def _seed(self, node_cpu, node_memory, node_pods):
+        """Nodes, a default StorageClass and the built-in namespaces"""
+        for name in self._node_names:
+            self._put("", "nodes", None, {
+                "apiVersion": "v1", "kind": "Node", "metadata": {"name": name, "labels": {"kubernetes.io/hostname": name}},
+                "spec": {},
+                "status": {
+                    "allocatable": {"cpu": node_cpu, "memory": node_memory, "pods": str(node_pods)},
+                    "capacity": {"cpu": node_cpu, "memory": node_memory, "pods": str(node_pods)},
+                    "conditions": [{"type": "Ready", "status": "True"}],
+                    "images": [],
+                },
+            }, "ADDED")
+        self._put("storage.k8s.io", "storageclasses", None, {
+            "apiVersion": "storage.k8s.io/v1", "kind": "StorageClass",
+            "metadata": {"name": "standard", "annotations": {"storageclass.kubernetes.io/is-default-class": "true"}},
+            "provisioner": "fake.csi.local", "allowVolumeExpansion": True,
+        }, "ADDED")
+        for namespace in ("default", "kube-system"):
+            self._put("", "namespaces", None, {"apiVersion": "v1", "kind": "Namespace", "metadata": {"name": namespace},
+                                              "status": {"phase": "Active"}}, "ADDED")
+
+    # --- Storage ---
+
+    def _put(self, group, plural, namespace, obj, event_type):
+        meta = obj.setdefault("metadata", {})
+        meta["resourceVersion"] = str(next(self._versions))
+        meta.setdefault("uid", str(uuid.uuid4()))
+        meta.setdefault("creationTimestamp", _now())
+        if namespace is not None:
+            meta["namespace"] = namespace
+        self.objects[(group, plural)][(namespace, meta["name"])] = obj
+        self._emit(group, plural, event_type, obj)
+        return obj
+
+    def _remove(self, group, plural, namespace, name):
+        obj = self.objects[(group, plural)].pop((namespace, name), None)
+        if obj is not None:
+            obj["metadata"]["resourceVersion"] = str(next(self._versions))
+            self._emit(group, plural, "DELETED", obj)
+        return obj
+
+    def _emit(self, group, plural, event_type, obj):
+        self.events.append((int(obj["metadata"]["resourceVersion"]), group, plural, event_type, copy.deepcopy(obj)))
+        self.changed.notify_all()
+
+    def _get(self, group, plural, namespace, name):
+        obj = self.objects[(group, plural)].get((namespace, name))
+        if obj is None:
+            raise ApiError(404, "NotFound", f'{plural} "{name}" not found')
+        return obj
+
+    def _require_namespace(self, namespace):
+        if namespace is None:
+            return
+        ns = self.objects[("", "namespaces")].get((None, namespace))
+        if ns is None:
+            raise ApiError(404, "NotFound", f'namespaces "{namespace}" not found')
+        if ns["status"].get("phase") == "Terminating":
+            raise ApiError(403, "Forbidden", f"namespace {namespace} is being terminated")
+
+    # --- Verbs ---
+
+    def create(self, group, plural, namespace, body):
+        with self.lock:
+            self._require_namespace(namespace)
+            meta = body.setdefault("metadata", {})
+            if not meta.get("name"):
+                if not meta.get("generateName"):
+                    raise ApiError(422, "Invalid", "metadata.name: Required value")
+                meta["name"] = meta["generateName"] + uuid.uuid4().hex[:5]
+            if (namespace, meta["name"]) in self.objects[(group, plural)]:
+                raise ApiError(409, "AlreadyExists", f'{plural} "{meta["name"]}" already exists')
+            body.setdefault("kind", KINDS.get(plural, plural.rstrip("s").capitalize()))
+            meta["generation"] = 1
+            self._initialize(group, plural, namespace, body)
+            obj = self._put(group, plural, namespace, body, "ADDED")
+            if plural in _WORKLOADS:
+                self._reconcile(group, plural, namespace, meta["name"])
+            return obj
+
+    def read(self, group, plural, namespace, name):
+        with self.lock:
+            obj = self._get(group, plural, namespace, name)
+            if plural == "resourcequotas":
+                self._quota_usage(obj)
+            return copy.deepcopy(obj)
+
+    def list(self, group, plural, namespace, label_selector=None, field_selector=None):
+        with self.lock:
+            items = self._select(group, plural, namespace, label_selector, field_selector)
+            if plural == "resourcequotas":
+                for item in items:
+                    self._quota_usage(item)
+            return {
+                "kind": KINDS.get(plural, "Object") + "List",
+                "apiVersion": "v1",
+                "metadata": {"resourceVersion": str(self._version())},
+                "items": [copy.deepcopy(item) for item in items],
+            }
+
+    def _select(self, group, plural, namespace, label_selector, field_selector):
+        labels = label_matcher(label_selector)
+        fields = field_matcher(field_selector)
+        return [
+            obj for (ns, _), obj in sorted(self.objects[(group, plural)].items(), key=lambda kv: kv[0][1])
+            if (namespace is None or ns == namespace) and labels(obj["metadata"].get("labels")) and fields(obj)
+        ]
+
+    def replace(self, group, plural, namespace, name, body):
+        with self.lock:
+            current = self._get(group, plural, namespace, name)
+            meta = body.setdefault("metadata", {})
+            meta.update(name=name, uid=current["metadata"]["uid"],
+                        creationTimestamp=current["metadata"]["creationTimestamp"],
+                        generation=current["metadata"].get("generation", 1) + 1)
+            body.setdefault("kind", current.get("kind"))
+            if "status" not in body and "status" in current:
+                body["status"] = current["status"]
+            obj = self._put(group, plural, namespace, body, "MODIFIED")
+            if plural in _WORKLOADS:
+                self._reconcile(group, plural, namespace, name)
+            return obj
+
+    def patch(self, group, plural, namespace, name, patch, subresource=None):
+        with self.lock:
+            current = self._get(group, plural, namespace, name)
+            if subresource == "scale":
+                replicas = (patch.get("spec") or {}).get("replicas") if isinstance(patch, dict) else None
+                if replicas is not None:
+                    current = merge_patch(current, {"spec": {"replicas": replicas}})
+                    current["metadata"]["generation"] = current["metadata"].get("generation", 1) + 1
+                    self._put(group, plural, namespace, current, "MODIFIED")
+                    self._reconcile(group, plural, namespace, name)
+                return self._scale(current)
+            patched = json_patch(current, patch) if isinstance(patch, list) else merge_patch(current, patch)
+            patched["metadata"]["generation"] = current["metadata"].get("generation", 1) + 1
+            if plural == "persistentvolumeclaims":
+                # Volumes "expand" at once
+                size = patched["spec"].get("resources", {}).get("requests", {}).get("storage")
+                patched.setdefault("status", {}).setdefault("capacity", {})["storage"] = size
+            obj = self._put(group, plural, namespace, patched, "MODIFIED")
+            if plural in _WORKLOADS:
+                self._reconcile(group, plural, namespace, name)
+            return obj
+
+    def delete(self, group, plural, namespace, name):
+        with self.lock:
+            obj = self._get(group, plural, namespace, name)
+            if plural == "namespaces":
+                if obj["status"].get("phase") != "Terminating":
+                    obj["status"]["phase"] = "Terminating"
+                    obj["metadata"]["deletionTimestamp"] = _now()
+                    self._put(group, plural, None, obj, "MODIFIED")
+                    self._after(min(self.ready_after, 1.0), lambda: self._finalize_namespace(name))
+                return obj
+            self._remove(group, plural, namespace, name)
+            if plural in _WORKLOADS:
+                self._delete_owned(namespace, obj)
+            return _status(200, "", "") | {"status": "Success", "details": {"name": name, "kind": plural}}
+
+    def scale(self, group, plural, namespace, name):
+        with self.lock:
+            return self._scale(self._get(group, plural, namespace, name))
+
+    def _scale(self, obj):
+        replicas = obj["spec"].get("replicas", 1)
+        return {"apiVersion": "autoscaling/v1", "kind": "Scale",
+                "metadata": {k: obj["metadata"].get(k) for k in ("name", "namespace", "uid", "resourceVersion")},
+                "spec": {"replicas": replicas}, "status": {"replicas": obj.get("status", {}).get("replicas", 0)}}
+
+    def _version(self):
+        return self.events[-1][0] if self.events else 0
+
+    # --- Watches ---
+
+    def watch(self, group, plural, namespace, label_selector, field_selector, resource_version, timeout, write):
+        """Stream events to write(event) until timeout; returns when it expires or write fails"""
+        labels = label_matcher(label_selector)
+        fields = field_matcher(field_selector)
+
+        def wanted(obj):
+            meta = obj["metadata"]
+            return ((namespace is None or meta.get("namespace") == namespace)
+                    and labels(meta.get("labels")) and fields(obj))
+
+        deadline = time.monotonic() + timeout
+        with self.lock:
+            if resource_version:
+                since = int(resource_version)
+                if self.events and since < self.events[0][0] - 1:
+                    write({"type": "ERROR", "object": _status(410, "Expired", "too old resource version")})
+                    return
+                pending = []
+            else:
+                # Without a resourceVersion a watch starts with the current objects
+                pending = [{"type": "ADDED", "object": copy.deepcopy(obj)}
+                           for obj in self._select(group, plural, namespace, label_selector, field_selector)]
+                since = self._version()
+        while True:
+            for event in pending:
+                if not write(event):
+                    return
+            with self.lock:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                if self._version() <= since:
+                    self.changed.wait(min(remaining, 1.0))
+                pending = []
+                for version, g, p, event_type, obj in list(self.events):
+                    if version > since and g == group and p == plural and wanted(obj):
+                        pending.append({"type": event_type, "object": obj})
+                since = self._version()
+
+    # --- Controller ---
+
+    def _after(self, delay, action):
+        self._timers.append((time.monotonic() + delay, action))
+
+    def run_controller(self):
+        while not self._stopped.is_set():
+            with self.lock:
+                now = time.monotonic()
+                due = [action for at, action in self._timers if at <= now]
+                self._timers = [(at, action) for at, action in self._timers if at > now]
+                for action in due:
+                    action()
+            self._stopped.wait(0.05)
+
+    def stop(self):
+        self._stopped.set()
+
+    def _initialize(self, group, plural, namespace, obj):
+        """Status a new object starts with"""
+        if plural == "namespaces":
+            obj["status"] = {"phase": "Active"}
+        elif plural == "persistentvolumeclaims":
+            size = obj["spec"].get("resources", {}).get("requests", {}).get("storage", "1Gi")
+            obj["spec"].setdefault("storageClassName", "standard")
+            obj["status"] = {"phase": "Bound", "capacity": {"storage": size}, "accessModes": obj["spec"].get("accessModes")}
+        elif plural == "services":
+            if obj["spec"].get("type") != "ExternalName":
+                obj["spec"].setdefault("clusterIP", f"10.96.{self.random.randint(0, 255)}.{self.random.randint(1, 254)}")
+        elif plural in ("deployments", "statefulsets"):
+            obj["status"] = {"replicas": 0, "readyReplicas": 0, "availableReplicas": 0}
+        elif plural == "jobs":
+            obj["status"] = {"active": 0}
+        elif plural == "daemonsets":
+            obj["status"] = {"desiredNumberScheduled": len(self._node_names), "numberReady": 0}
+        elif plural == "resourcequotas":
+            obj["status"] = {"hard": dict(obj["spec"].get("hard", {})), "used": {}}
+        elif plural == "volumesnapshots":
+            obj["status"] = {"readyToUse": True, "restoreSize": "1Gi",
+                             "boundVolumeSnapshotContentName": f"snapcontent-{uuid.uuid4().hex[:8]}"}
+        elif plural == "volumesnapshotcontents":
+            obj["status"] = {"readyToUse": True, "snapshotHandle": f"snap-{uuid.uuid4().hex[:12]}"}
+
+    def _owned_pods(self, namespace, owner):
+        uid = owner["metadata"]["uid"]
+        return [obj for (ns, _), obj in self.objects[("", "pods")].items()
+                if ns == namespace and any(ref.get("uid") == uid for ref in obj["metadata"].get("ownerReferences", []))]
+
+    def _reconcile(self, group, plural, namespace, name):
+        """Create or remove pods so a workload has the pods it asks for"""
+        owner = self.objects[(group, plural)].get((namespace, name))
+        if owner is None:
+            return
+        pods = self._owned_pods(namespace, owner)
+        if plural == "jobs":
+            desired = 0 if owner["status"].get("succeeded") else 1
+        elif plural == "daemonsets":
+            desired = len(self._node_names)
+        else:
+            desired = owner["spec"].get("replicas", 1)
+        for pod in pods[desired:]:
+            self._remove("", "pods", namespace, pod["metadata"]["name"])
+        for index in range(len(pods), desired):
+            self._start_pod(group, plural, namespace, owner, index)
+        self._update_workload_status(group, plural, namespace, name)
+
+    def _start_pod(self, group, plural, namespace, owner, index):
+        template = owner["spec"]["template"]
+        owner_name = owner["metadata"]["name"]
+        if plural == "statefulsets":
+            name = f"{owner_name}-{index}"
+        else:
+            name = f"{owner_name}-{uuid.uuid4().hex[:10]}"
+        labels = dict(template.get("metadata", {}).get("labels") or {})
+        if plural == "jobs":
+            labels.setdefault("job-name", owner_name)
+        pod = {
+            "apiVersion": "v1", "kind": "Pod",
+            "metadata": {
+                "name": name, "labels": labels,
+                "ownerReferences": [{"apiVersion": owner.get("apiVersion"), "kind": owner.get("kind"),
+                                     "name": owner_name, "uid": owner["metadata"]["uid"], "controller": True}],
+            },
+            "spec": copy.deepcopy(template.get("spec", {})),
+            "status": {"phase": "Pending", "conditions": [{"type": "PodScheduled", "status": "False"}]},
+        }
+        self._put("", "pods", namespace, pod, "ADDED")
+        fails = self.random.random() < self.pod_failure_rate
+        self._after(self.ready_after * (0.5 + self.random.random()),
+                    lambda: self._progress_pod(group, plural, namespace, owner_name, name, fails))
+
+    def _progress_pod(self, group, plural, namespace, owner_name, name, fails):
+        pod = self.objects[("", "pods")].get((namespace, name))
+        if pod is None:
+            return
+        spec = pod["spec"]
+        pod["spec"]["nodeName"] = next(self._next_node)
+        containers = [c["name"] for c in spec.get("containers", [])]
+        inits = [c["name"] for c in spec.get("initContainers", [])]
+        status = pod["status"]
+        status["startTime"] = _now()
+        if fails:
+            status["containerStatuses"] = [
+                {"name": c, "ready": False, "restartCount": 0, "image": "", "imageID": "",
+                 "state": {"waiting": {"reason": "ImagePullBackOff", "message": "Back-off pulling image"}}}
+                for c in containers
+            ]
+        elif plural == "jobs":
+            status["phase"] = "Succeeded"
+            status["containerStatuses"] = [
+                {"name": c, "ready": False, "restartCount": 0, "image": "", "imageID": "",
+                 "state": {"terminated": {"exitCode": 0, "reason": "Completed"}}}
+                for c in containers
+            ]
+        else:
+            status["phase"] = "Running"
+            status["conditions"] = [{"type": "PodScheduled", "status": "True"}, {"type": "Ready", "status": "True"}]
+            status["containerStatuses"] = [
+                {"name": c, "ready": True, "restartCount": 0, "image": "", "imageID": "",
+                 "state": {"running": {"startedAt": _now()}}}
+                for c in containers
+            ]
+        status["initContainerStatuses"] = [
+            {"name": c, "ready": True, "restartCount": 0, "image": "", "imageID": "",
+             "state": {"terminated": {"exitCode": 0, "reason": "Completed"}}}
+            for c in inits
+        ]
+        self._put("", "pods", namespace, pod, "MODIFIED")
+        self._update_workload_status(group, plural, namespace, owner_name)
+
+    def _update_workload_status(self, group, plural, namespace, name):
+        owner = self.objects[(group, plural)].get((namespace, name))
+        if owner is None:
+            return
+        pods = self._owned_pods(namespace, owner)
+        ready = sum(1 for pod in pods if pod["status"].get("phase") == "Running"
+                    and all(c.get("ready") for c in pod["status"].get("containerStatuses", [])))
+        status = dict(owner.get("status") or {})
+        if plural == "jobs":
+            succeeded = sum(1 for pod in pods if pod["status"].get("phase") == "Succeeded")
+            status.update(active=len(pods) - succeeded, startTime=status.get("startTime") or _now())
+            if succeeded:
+                status.update(succeeded=succeeded, completionTime=_now(),
+                              conditions=[{"type": "Complete", "status": "True"}])
+        elif plural == "daemonsets":
+            status.update(desiredNumberScheduled=len(self._node_names), numberReady=ready,
+                          updatedNumberScheduled=len(pods), numberAvailable=ready)
+        else:
+            status.update(replicas=len(pods), readyReplicas=ready, availableReplicas=ready,
+                          updatedReplicas=len(pods), observedGeneration=owner["metadata"].get("generation", 1))
+        if status != owner.get("status"):
+            owner["status"] = status
+            self._put(group, plural, namespace, owner, "MODIFIED")
+
+    def _delete_owned(self, namespace, owner):
+        for pod in self._owned_pods(namespace, owner):
+            self._remove("", "pods", namespace, pod["metadata"]["name"])
+
+    def _finalize_namespace(self, name):
+        for (group, plural), objects in list(self.objects.items()):
+            for (namespace, object_name) in [key for key in objects if key[0] == name]:
+                self._remove(group, plural, namespace, object_name)
+        self._remove("", "namespaces", None, name)
+
+    def _quota_usage(self, quota):
+        """Usage of a ResourceQuota from the pods and PVCs in its namespace"""
+        namespace = quota["metadata"]["namespace"]
+        totals = collections.Counter()
+        for (ns, _), pod in self.objects[("", "pods")].items():
+            if ns != namespace or pod["status"].get("phase") in ("Succeeded", "Failed"):
+                continue
+            totals["pods"] += 1
+            for field in ("requests", "limits"):
+                for resource in ("cpu", "memory"):
+                    containers = sum(float(parse_quantity((c.get("resources") or {}).get(field, {}).get(resource, 0)))
+                                     for c in pod["spec"].get("containers", []))
+                    totals[f"{field}.{resource}"] += containers
+        for (ns, _), pvc in self.objects[("", "persistentvolumeclaims")].items():
+            if ns == namespace:
+                totals["persistentvolumeclaims"] += 1
+                totals["requests.storage"] += float(parse_quantity(pvc["spec"]["resources"]["requests"]["storage"]))
+        hard = quota["spec"].get("hard", {})
+        quota["status"] = {"hard": dict(hard), "used": {key: _quantity(key, totals[key]) for key in hard}}
+
+
+def _quantity(resource, amount):
+    if resource.endswith("cpu"):
+        return f"{round(amount * 1000)}m"
+    return str(int(amount))
+
+
+# --- HTTP ---
+
+def parse_path(path):
+    """(group, plural, namespace, name, subresource) of an API path"""
+    parts = [p for p in path.split("/") if p]
+    if parts[:2] == ["api", "v1"]:
+        group, rest = "", parts[2:]
+    elif parts[:1] == ["apis"] and len(parts) >= 3:
+        group, rest = parts[1], parts[3:]
+    else:
+        raise ApiError(404, "NotFound", f"the server could not find the requested resource ({path})")
+    namespace = None
+    if len(rest) >= 3 and rest[0] == "namespaces":
+        namespace, rest = rest[1], rest[2:]
+    if not rest:
+        raise ApiError(404, "NotFound", f"the server could not find the requested resource ({path})")
+    plural = rest[0]
+    name = rest[1] if len(rest) > 1 else None
+    subresource = rest[2] if len(rest) > 2 else None
+    return group, plural, namespace, name, subresource
+
+
+def api_version(path):
+    """apiVersion of the objects served under an API path"""
+    parts = [p for p in path.split("/") if p]
+    return "v1" if parts[:1] == ["api"] else f"{parts[1]}/{parts[2]}"
+
+
+def make_handler(cluster, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, error_status=500, stats=None):
+    stats = stats if stats is not None else collections.Counter()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, code, body, content_type="application/json"):
+            data = body.encode() if isinstance(body, str) else json.dumps(body).encode()
+            self.send_response(code)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _body(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            return json.loads(self.rfile.read(length) or b"null") if length else None
+
+        def _handle(self, verb):
+            body = self._body() if verb in ("POST", "PUT", "PATCH", "DELETE") else None
+            delay = latency_ms + (random.random() * jitter_ms if jitter_ms else 0)
+            if delay:
+                time.sleep(delay / 1000)
+            stats[verb] += 1
+            if error_rate and random.random() < error_rate:
+                stats["injected_errors"] += 1
+                self._send(error_status, _status(error_status, "InternalError", "injected failure"))
+                return
+            url = urlsplit(self.path)
+            query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            try:
+                group, plural, namespace, name, subresource = parse_path(url.path)
+                if verb in ("POST", "PUT") and isinstance(body, dict):
+                    # Clients may leave out apiVersion; objects read back must carry it (e.g. in owner references)
+                    body.setdefault("apiVersion", api_version(url.path))
+                result = self._dispatch(verb, group, plural, namespace, name, subresource, query, body)
+                if result is not None:
+                    self._send(201 if verb == "POST" else 200, result)
+            except ApiError as e:
+                self._send(e.code, e.body)
+
+        def _dispatch(self, verb, group, plural, namespace, name, subresource, query, body):
+            if verb == "GET" and name is None:
+                if query.get("watch") in ("true", "1"):
+                    self._watch(group, plural, namespace, query)
+                    return None
+                return cluster.list(group, plural, namespace, query.get("labelSelector"), query.get("fieldSelector"))
+            if name is None and verb == "POST":
+                return cluster.create(group, plural, namespace, body)
+            if name is None:
+                raise ApiError(405, "MethodNotAllowed", f"{verb} on a collection is not supported")
+            if verb == "GET":
+                if subresource == "log":
+                    cluster.read(group, plural, namespace, name)
+                    self._send(200, _BENCHMARK_LOG, "text/plain")
+                    return None
+                if subresource == "scale":
+                    return cluster.scale(group, plural, namespace, name)
+                return cluster.read(group, plural, namespace, name)
+            if verb == "PUT":
+                return cluster.replace(group, plural, namespace, name, body)
+            if verb == "PATCH":
+                return cluster.patch(group, plural, namespace, name, body, subresource)
+            if verb == "DELETE":
+                return cluster.delete(group, plural, namespace, name)
+            raise ApiError(405, "MethodNotAllowed", verb)
+
+        def _watch(self, group, plural, namespace, query):
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.close_connection = True
+
+            def write(event):
+                try:
+                    self.wfile.write(json.dumps(event).encode() + b"\n")
+                    self.wfile.flush()
+                    return True
+                except OSError:
+                    return False
+
+            timeout = min(float(query.get("timeoutSeconds") or 300), 1800)
+            cluster.watch(group, plural, namespace, query.get("labelSelector"), query.get("fieldSelector"),
+                          query.get("resourceVersion"), timeout, write)
+
+        def do_GET(self):
+            self._handle("GET")
+
+        def do_POST(self):
+            self._handle("POST")
+
+        def do_PUT(self):
+            self._handle("PUT")
+
+        def do_PATCH(self):
+            self._handle("PATCH")
+
+        def do_DELETE(self):
+            self._handle("DELETE")
+
+    return Handler
+
+
+def serve(port=0, host="127.0.0.1", latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, error_status=500, **cluster_options):
+    """Start the fake API server in background threads; returns (server, cluster, request counts)"""
+    cluster = FakeCluster(**cluster_options)
+    stats = collections.Counter()
+    server = ThreadingHTTPServer((host, port), make_handler(cluster, latency_ms, jitter_ms, error_rate, error_status, stats))
+    server.daemon_threads = True
+    threading.Thread(target=cluster.run_controller, name="fake-k8s-controller", daemon=True).start()
+    threading.Thread(target=server.serve_forever, name="fake-k8s-server", daemon=True).start()
+    return server, cluster, stats
+
+
+def write_kubeconfig(path, server_url):
+    """A kubeconfig pointing at the fake server, for KUBECONFIG"""
+    config = {
+        "apiVersion": "v1", "kind": "Config", "current-context": "fake",
+        "clusters": [{"name": "fake", "cluster": {"server": server_url}}],
+        "users": [{"name": "fake", "user": {"token": "fake"}}],
+        "contexts": [{"name": "fake", "context": {"cluster": "fake", "user": "fake"}}],
+    }
+    with open(path, "w") as f:
+        json.dump(config, f)
+    return path
+
+
+def add_arguments(parser):
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Added to every API request")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Random extra latency, up to this much")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of API requests that fail")
+    parser.add_argument("--error-status", type=int, default=500, help="HTTP status of injected failures")
+    parser.add_argument("--ready-after", type=float, default=1.0, help="Mean seconds until a pod is Running and Ready")
+    parser.add_argument("--pod-failure-rate", type=float, default=0.0, help="Share of pods stuck in ImagePullBackOff")
+    parser.add_argument("--nodes", type=int, default=3)
+    parser.add_argument("--node-cpu", default="16")
+    parser.add_argument("--node-memory", default="64Gi")
+    parser.add_argument("--seed", type=int, default=None)
+
+
+def cluster_options(args):
+    return {
+        "latency_ms": args.latency_ms, "jitter_ms": args.jitter_ms, "error_rate": args.error_rate,
+        "error_status": args.error_status, "ready_after": args.ready_after, "pod_failure_rate": args.pod_failure_rate,
+        "nodes": args.nodes, "node_cpu": args.node_cpu, "node_memory": args.node_memory, "seed": args.seed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--kubeconfig", help="Write a kubeconfig for the server to this path")
+    add_arguments(parser)
+    args = parser.parse_args()
+    server, _, stats = serve(port=args.port, host=args.host, **cluster_options(args))
+    url = f"http://{args.host}:{server.server_address[1]}"
+    if args.kubeconfig:
+        write_kubeconfig(args.kubeconfig, url)
+        print(f"Wrote {args.kubeconfig}")
+    print(f"Fake Kubernetes API on {url} (Ctrl-C to stop)")
+    try:
+        while True:
+            time.sleep(60)
+            print(f"requests: {dict(stats)}")
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,321 @@
+"""
+End-to-end load test
+Runs the real backend (app.py, in this process) against the fake Kubernetes
+API from fake_k8s.py and drives it over HTTP the way the frontend does:
+
+    create    concurrent POST /api/stores, spread across load-test users
+    ready     time from create until GET /api/stores reports the store ready
+    list      concurrent GET /api/stores once the stores exist
+    delete    concurrent DELETE /api/stores/<id>
+
+Each size in --stores is run in turn on a fresh fleet, and for each step the
+harness reports throughput and latency percentiles, so a change to the
+provisioning pipeline, the list path or the database layer can be compared
+at 10, 100 and 1000 stores before and after:
+
+    python loadtest/run.py --stores 10,100,1000 --users 20 --concurrency 32 \\
+        --latency-ms 5 --jitter-ms 10 --ready-after 2 --json results.json
+
+The backend gets a throwaway SQLite database and a kubeconfig pointing at
+the fake server; backend settings can be overridden with --env NAME=VALUE
+(e.g. --env PROVISIONING_MAX_IN_FLIGHT=16). Use --k8s-url to drive a fake
+server started separately instead.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+import fake_k8s  # noqa: E402
+
+PASSWORD = "loadtest"
+# Backend settings for a run; background sweeps that would only add noise are off
+BACKEND_ENV = {
+    "RESUME_INTERRUPTED_ON_STARTUP": "false",
+    "PREPULL_ENABLED": "false",
+    "GC_ENABLED": "false",
+    "HIBERNATION_ENABLED": "false",
+    "MYSQL_READY_POLL_SECONDS": "0.5",
+    "LOG_LEVEL": "WARNING",
+    "LOG_LEVELS": "werkzeug=WARNING",
+    "TRACING_EXPORTER": "none",
+}
+
+
+class Client:
+    """Minimal JSON client for the backend API"""
+
+    def __init__(self, base_url, timeout=120):
+        self.base_url = base_url
+        self.timeout = timeout
+
+    def request(self, method, path, body=None, token=None):
+        """(status code, parsed body, seconds taken)"""
+        data = json.dumps(body).encode() if body is not None else None
+        req = urllib.request.Request(self.base_url + path, data=data, method=method)
+        req.add_header("Content-Type", "application/json")
+        if token:
+            req.add_header("Authorization", f"Bearer {token}")
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as response:
+                code, raw = response.status, response.read()
+        except urllib.error.HTTPError as e:
+            code, raw = e.code, e.read()
+        except OSError as e:
+            return 0, {"error": str(e)}, time.perf_counter() - started
+        elapsed = time.perf_counter() - started
+        try:
+            return code, json.loads(raw or b"null"), elapsed
+        except ValueError:
+            return code, {"error": raw.decode(errors="replace")}, elapsed
+
+
+class Recorder:
+    """Latencies and failures of one step"""
+
+    def __init__(self, name):
+        self.name = name
+        self.latencies = []
+        self.errors = {}
+        self.started = None
+        self.finished = None
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.finished = time.perf_counter()
+
+    def record(self, seconds, error=None):
+        with self._lock:
+            if error:
+                self.errors[error] = self.errors.get(error, 0) + 1
+            else:
+                self.latencies.append(seconds)
+
+    def summary(self):
+        latencies = sorted(self.latencies)
+        duration = (self.finished or time.perf_counter()) - self.started
+        result = {
+            "step": self.name,
+            "ok": len(latencies),
+            "errors": sum(self.errors.values()),
+            "duration_s": round(duration, 3),
+            "throughput_per_s": round(len(latencies) / duration, 2) if duration > 0 else 0.0,
+        }
+        for label, q in (("p50", 0.50), ("p90", 0.90), ("p99", 0.99)):
+            result[f"{label}_ms"] = round(_percentile(latencies, q) * 1000, 1) if latencies else None
+        result["max_ms"] = round(latencies[-1] * 1000, 1) if latencies else None
+        if self.errors:
+            result["error_kinds"] = dict(self.errors)
+        return result
+
+
+def _percentile(ordered, q):
+    """Nearest-rank percentile of a sorted list"""
+    index = max(0, min(len(ordered) - 1, int(round(q * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def _error(code, body):
+    reason = body.get("reason") if isinstance(body, dict) else None
+    return f"{code} {reason}" if reason else str(code)
+
+
+# --- Setup ---
+
+def start_fake_cluster(args):
+    if args.k8s_url:
+        return args.k8s_url, None
+    server, cluster, stats = fake_k8s.serve(**fake_k8s.cluster_options(args))
+    return f"http://127.0.0.1:{server.server_address[1]}", stats
+
+
+def start_backend(workdir, k8s_url, overrides):
+    """Import and serve the backend app against the fake cluster; returns its base URL"""
+    os.environ.update(BACKEND_ENV)
+    kubeconfig = fake_k8s.write_kubeconfig(os.path.join(workdir, "kubeconfig"), k8s_url)
+    # An explicit cluster entry: the kubernetes package reads KUBECONFIG once, when it is first imported
+    os.environ["CLUSTERS"] = json.dumps([{"name": "default", "kubeconfig": kubeconfig}])
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(workdir, "store_factory.db")
+    os.environ.update(overrides)
+
+    import app as backend
+    from werkzeug.serving import make_server
+
+    server = make_server("127.0.0.1", 0, backend.app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="backend", daemon=True).start()
+    backend.start_background_tasks()
+    return backend, f"http://127.0.0.1:{server.server_port}"
+
+
+def create_users(backend, count, stores_per_user):
+    """Load-test users with limits high enough that only the platform's own limits apply"""
+    from models import User, db
+
+    names = [f"loadtest-{i}" for i in range(count)]
+    with backend.app.app_context():
+        for name in names:
+            if User.query.filter_by(username=name).first():
+                continue
+            user = User(username=name, max_stores=stores_per_user, max_storage_gi=stores_per_user * 10,
+                        max_plan_units=stores_per_user * 4)
+            user.set_password(PASSWORD)
+            db.session.add(user)
+        db.session.commit()
+    return names
+
+
+def log_in(client, names):
+    tokens = []
+    for name in names:
+        code, body, _ = client.request("POST", "/api/auth/login", {"username": name, "password": PASSWORD})
+        if code != 200:
+            raise SystemExit(f"Could not log in as {name}: {code} {body}")
+        tokens.append(body["access_token"])
+    return tokens
+
+
+# --- Steps ---
+
+def run_creates(client, pool, tokens, count, storage_gi):
+    recorder = Recorder("create")
+    created = {}  # store id -> (token, created at)
+
+    def create(index):
+        token = tokens[index % len(tokens)]
+        code, body, elapsed = client.request("POST", "/api/stores", {"storage_size_gi": storage_gi}, token)
+        if code == 202:
+            recorder.record(elapsed)
+            created[body["id"]] = (token, time.perf_counter())
+        else:
+            recorder.record(elapsed, _error(code, body))
+
+    with recorder:
+        list(pool.map(create, range(count)))
+    return recorder, created
+
+
+def wait_until_ready(client, created, tokens, timeout, poll_interval):
+    """Poll each user's store list until every created store is ready or failed"""
+    recorder = Recorder("ready")
+    pending = dict(created)
+    deadline = time.monotonic() + timeout
+    with recorder:
+        while pending and time.monotonic() < deadline:
+            for token in tokens:
+                code, body, _ = client.request("GET", "/api/stores", token=token)
+                if code != 200:
+                    continue
+                now = time.perf_counter()
+                for store in body["stores"]:
+                    if store["id"] not in pending or store["status"] not in ("ready", "failed"):
+                        continue
+                    _, created_at = pending.pop(store["id"])
+                    recorder.record(now - created_at, None if store["status"] == "ready" else "failed")
+            if pending:
+                time.sleep(poll_interval)
+        for _ in pending:
+            recorder.record(0, "timeout")
+    return recorder
+
+
+def run_lists(client, pool, tokens, count):
+    recorder = Recorder("list")
+
+    def list_stores(index):
+        code, body, elapsed = client.request("GET", "/api/stores", token=tokens[index % len(tokens)])
+        recorder.record(elapsed, None if code == 200 else _error(code, body))
+
+    with recorder:
+        list(pool.map(list_stores, range(count)))
+    return recorder
+
+
+def run_deletes(client, pool, created):
+    recorder = Recorder("delete")
+
+    def delete(item):
+        store_id, (token, _) = item
+        code, body, elapsed = client.request("DELETE", f"/api/stores/{store_id}", token=token)
+        recorder.record(elapsed, None if code == 200 else _error(code, body))
+
+    with recorder:
+        list(pool.map(delete, list(created.items())))
+    return recorder
+
+
+def run_scale(client, tokens, stores, args):
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        create, created = run_creates(client, pool, tokens, stores, args.storage_gi)
+        ready = wait_until_ready(client, created, tokens, args.ready_timeout, args.poll_interval)
+        lists = run_lists(client, pool, tokens, max(args.list_requests, len(tokens)))
+        delete = run_deletes(client, pool, created)
+    return [recorder.summary() for recorder in (create, ready, lists, delete)]
+
+
+def print_table(stores, rows):
+    print(f"\n== {stores} stores ==")
+    header = f"{'step':<8}{'ok':>7}{'errors':>8}{'per s':>9}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}"
+    print(header)
+    print("-" * len(header))
+    for row in rows:
+        cells = [row[key] if row[key] is not None else "-" for key in ("p50_ms", "p90_ms", "p99_ms", "max_ms")]
+        print(f"{row['step']:<8}{row['ok']:>7}{row['errors']:>8}{row['throughput_per_s']:>9}"
+              + "".join(f"{cell:>10}" for cell in cells))
+        if row.get("error_kinds"):
+            print(f"{'':<8}errors: {row['error_kinds']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end load test against a fake Kubernetes API")
+    parser.add_argument("--stores", default="10,100", help="Comma-separated fleet sizes to run, in order")
+    parser.add_argument("--users", type=int, default=10, help="Load-test users the stores are spread across")
+    parser.add_argument("--concurrency", type=int, default=16, help="Requests in flight at once")
+    parser.add_argument("--list-requests", type=int, default=200, help="GET /api/stores requests in the list step")
+    parser.add_argument("--storage-gi", type=int, default=2)
+    parser.add_argument("--ready-timeout", type=float, default=600, help="Seconds to wait for a size's stores to be ready")
+    parser.add_argument("--poll-interval", type=float, default=0.5)
+    parser.add_argument("--k8s-url", help="Use an already running fake API server instead of starting one")
+    parser.add_argument("--env", action="append", default=[], metavar="NAME=VALUE", help="Backend setting override")
+    parser.add_argument("--json", help="Also write the results to this file")
+    fake_k8s.add_arguments(parser)
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.stores.split(",") if size.strip()]
+    overrides = dict(item.split("=", 1) for item in args.env)
+    workdir = tempfile.mkdtemp(prefix="store-loadtest-")
+    k8s_url, api_stats = start_fake_cluster(args)
+    backend, base_url = start_backend(workdir, k8s_url, overrides)
+    users = create_users(backend, args.users, max(sizes) // args.users + 1)
+    client = Client(base_url)
+    tokens = log_in(client, users)
+    print(f"Backend on {base_url}, Kubernetes API on {k8s_url}, data in {workdir}")
+
+    results = {"config": {k: v for k, v in vars(args).items() if k != "env"} | {"env": overrides}, "runs": []}
+    for stores in sizes:
+        rows = run_scale(client, tokens, stores, args)
+        print_table(stores, rows)
+        results["runs"].append({"stores": stores, "steps": rows})
+    if api_stats is not None:
+        results["k8s_requests"] = dict(api_stats)
+        print(f"\nKubernetes API requests: {dict(api_stats)}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Wrote {args.json}")
+
+
+if __name__ == "__main__":
+    main()